@@ -6,491 +6,5008 @@ Update: The refactored code makes use of a class to modularise project \
 """
 
 
+import _thread
+import contextlib
+import errno
+import functools
+import importlib
 import os
 import pathlib
 from pathlib import Path
 import re
-from jinja2 import Template
+import sys
+import time
+from typing import NamedTuple
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+# Modules only some functions need (json, subprocess, shutil, jinja2, yaml,
+# argparse, ...) are imported where they are used, so that short commands
+# start quickly.
 
 
-class ProjectBuilder:
-    """The class manages the newly created project folder.
+def _optional_import(name: str):
+    """Import a module on first use, None if it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
 
-    Attributes:
-        proj_name (str): name of project entered by the user.
 
-        author_name (str): name of the author entered by the user.
+# Directory holding the '.template' files.
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
 
-        path (pathlib.PosixPath):\
-            path to a directory where the project directory is to be created.\
-            Defaults to None. If None, path to the parent directory of this\
-                 project directory will be used.
+# Number of compiled templates kept in memory per template directory.
+TEMPLATE_CACHE_SIZE = 64
 
-        proj_dir (pathlib.PosixPath): path to the project directory.
+# Bytes buffered while a rendered template is streamed to its file.
+STREAM_BUFFER_SIZE = 64 * 1024
+
+_template_envs = {}
+# The same lock as threading.Lock, without importing threading.
+_template_envs_lock = _thread.allocate_lock()
+_bytecode_cache_dir = None
+_fast_templates = {}
+
+
+def configure_template_cache(
+        cache_size: int = None,
+        bytecode_cache_dir: str or pathlib.PosixPath = None):
+    """Configure the process-wide template cache used by ProjectBuilder.
+
+    Existing Jinja environments and compiled templates are dropped, so the
+    new settings apply to every template loaded after this call.
+
+    Args:
+        cache_size (int, optional):\
+            maximum number of compiled templates kept in memory per template \
+            directory (least recently used are evicted). Defaults to None. \
+            If None, the current size is kept.
+
+        bytecode_cache_dir (str or pathlib.PosixPath, optional):\
+            directory used to store compiled template bytecode on disk, so \
+            new processes can skip compilation. Defaults to None. If None, \
+            no on-disk cache is used.
     """
+    global TEMPLATE_CACHE_SIZE, _bytecode_cache_dir
 
-    def __init__(self, path: str or pathlib.PosixPath = None):
-        """Instantiate an object.
+    if cache_size is not None:
+        TEMPLATE_CACHE_SIZE = cache_size
 
-        Args:
-            path (str or pathlib.PosixPath, optional):\
-                For class attribute 'path'.
+    if bytecode_cache_dir is not None:
+        bytecode_cache_dir = Path(bytecode_cache_dir)
+        bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+    _bytecode_cache_dir = bytecode_cache_dir
 
-        Raises:
-            TypeError: if the path provided is not an absolute path.
-            FileNotFoundError: if the path provided does not exist.
-            TypeError: if the path input is not to a directory.
-        """
-        if path is None:
-            path = Path.cwd().parent
-        else:
-            if type(path) == str:
-                path = Path(path)
+    with _template_envs_lock:
+        _template_envs.clear()
+        _fast_templates.clear()
 
-            if not path.is_absolute():
-                raise TypeError(f'Path entered is not an absolute path.\n'
-                                f'path: {path}')
-            if not path.exists():
-                raise FileNotFoundError(f'The path provided, does not exist.\n'
-                                        f'path: {path}')
-            if not path.is_dir():
-                raise TypeError(f'No directory present at {path}')
 
-        self.path = path
-        self.proj_dir = None
-        self.proj_name, self.author = self.get_names()
+def precompiled_dir(template_dir: str or pathlib.PosixPath):
+    """Return the directory the templates of a template directory are
+    precompiled to by default (see precompile_templates)."""
+    import hashlib
 
-    def get_names(self):
-        """Take input from user for the project name and author name. Print out \
-        the information provided.
+    key = hashlib.sha256(str(Path(template_dir).resolve()).encode())
+    return CACHE_DIR / 'templates' / key.hexdigest()[:32]
 
-        Returns (Tuple):
-            proj_name (str): name of project entered by the user.
-            author_name (str): name of the author entered by the user.
-        """
-        print('\n> What would you like to name your project?')
-        for attempt in range(3):
-            proj_name = input().strip()
-            is_valid = self.valid_project_name(proj_name)
-            if is_valid:
-                break
-            else:
-                print('> Please enter a valid project name.')
-        else:
-            print('\n')
-            raise UserWarning('You ran out of attempts to enter a valid '
-                              'project name.')
 
-        print('\n> Who is the author of the project? '
-              '(Enter full name of the author)')
-        author_name = input()
+def precompile_templates(template_dir: str or pathlib.PosixPath = None):
+    """Compile every Jinja template of a directory into Python modules.
 
-        print('\n### Project Details ###')
-        print(f'Project name: {proj_name}')
-        print(f'Author:       {author_name}\n')
-        return proj_name, author_name
+    Notes:
+        get_template_env loads a precompiled template instead of parsing its
+        source when the module is newer than the source, so a new process
+        skips template parsing and compilation. Modules are byte-compiled
+        too. Notebook skeletons are not Jinja templates and are skipped.
 
-    @staticmethod
-    def valid_project_name(name: str):
-        """Checks if the 'name' provided is a valid name for the project.
+    Args:
+        template_dir (str or pathlib.PosixPath, optional):\
+            directory containing the '.template' files. Defaults to None. \
+            If None, TEMPLATE_DIR is used.
 
-        Args:
-            name (str): name of the project or directory to be created.
+    Returns:
+        pathlib.PosixPath: the directory holding the modules.
+    """
+    import compileall
 
-        Raises:
-            TypeError: if the provided argument is not a string.
+    from jinja2 import Environment, FileSystemLoader
 
-        Returns:
-            bool: if the name provided is valid or no.
-        """
-        if type(name) != str:
-            raise TypeError('Argument is not a string.')
+    template_dir = TEMPLATE_DIR if template_dir is None else template_dir
+    target = precompiled_dir(template_dir)
+    target.mkdir(parents=True, exist_ok=True)
 
-        # Setup Regex expressions
-        bad_start = re.match(r'^([-_]).+$', name)
-        bad_end = re.match(r'^.+([-_])$', name)
-        bad_chars = re.findall(r'(\W)', name)
-        bad_chars = set(bad_chars)
-        if '-' in bad_chars:
-            bad_chars.remove('-')
+    env = Environment(loader=FileSystemLoader(str(template_dir)))
+    env.compile_templates(str(target), zip=None, ignore_errors=False,
+                          filter_func=lambda name: not name.endswith('.ipynb'))
+    compileall.compile_dir(str(target), quiet=1)
 
-        # Create space.
-        print('')
+    with _template_envs_lock:
+        _template_envs.pop(str(template_dir), None)
+    return target
 
-        if name[0].isdigit():
-            print('> PROBLEM: The first character cannot be a number (digit).')
-            return False
-        elif name.find(' ') > -1:
-            print('> PROBLEM: No spaces allowed in the project name. '
-                  'Tip: Replace " " with "-", spaces with dashes.')
-            return False
-        elif bad_chars:
-            print(f'> PROBLEM: These special charaters cannot be used in the '
-                  f'project name: {tuple(bad_chars)}')
-            return False
-        elif bad_start:
-            print(f'PROBLEM: The project name cannot start with \''
-                  f'{bad_start.group(1)}\'.')
-            return False
-        elif bad_end:
-            print(f'PROBLEM: The project name cannot end with \''
-                  f'{bad_end.group(1)}\'.')
-            return False
 
-        return True
+def _precompiled_loader(template_dir: str, compiled_dir: str):
+    """Return a Jinja loader preferring the precompiled templates that are
+    newer than their sources."""
+    from jinja2 import ChoiceLoader, FileSystemLoader, ModuleLoader
+    from jinja2 import TemplateNotFound
 
-    def valid_path(self, path: str or pathlib.PosixPath = None,
-                   filename: str = None):
-        """The method does all the error checks to ensure file creation is
-           possible.
+    class FreshModuleLoader(ModuleLoader):
 
-        Args:
-            path (str or pathlib.PosixPath):\
-                Path where the file/directory is to be created.
+        def load(self, environment, name, globals=None):
+            source = os.path.join(template_dir, name)
+            module = os.path.join(compiled_dir,
+                                  self.get_module_filename(name))
+            try:
+                mtime = os.stat(source).st_mtime_ns
+                if os.stat(module).st_mtime_ns < mtime:
+                    raise TemplateNotFound(name)
+            except FileNotFoundError:
+                raise TemplateNotFound(name)
 
-            filename (str): name of the file/directory to be created.
+            template = super().load(environment, name, globals)
+            template.filename = source
 
-        Raises:
-            FileNotFoundError: if no project directory exists.
-            FileNotFoundError: if the path input does not exist.
-            TypeError: if the path input is not a directory.
-            FileExistsError: if the file to be created exists at the path
-                             provided.
+            def uptodate():
+                try:
+                    return os.stat(source).st_mtime_ns == mtime
+                except OSError:
+                    return False
+            template._uptodate = uptodate
+            return template
 
-        Returns:
-            pathlib.PosixPath: path with the filename (without if if None).
-        """
-        if self.proj_dir is None or not self.proj_dir.exists():
-            raise FileNotFoundError(f'Please create a project directory before'
-                                    f' creating a {filename} file.')
+    return ChoiceLoader([FreshModuleLoader(compiled_dir),
+                         FileSystemLoader(template_dir)])
 
-        if path is None:
-            path = self.proj_dir
-        elif type(path) == str:
-            path = Path(path)
 
-        if not path.exists():
-            raise FileNotFoundError(f'The path provided, does not exist.\n \
-                                    path: {path}')
-        if not path.is_dir():
-            raise TypeError(f'No directory present at {path}')
+def get_template_env(template_dir: str or pathlib.PosixPath):
+    """Return the shared Jinja environment for a template directory.
 
-        if filename is None:
-            return path
+    The environment keeps an LRU-bounded cache of compiled templates. Cached
+    templates are reloaded when the source file's modification time changes,
+    and the optional bytecode cache is keyed on a checksum of the source.
+    Templates precompiled to precompiled_dir are loaded from their modules
+    while these are newer than the sources (see precompile_templates).
 
-        file_path = path / filename
+    Args:
+        template_dir (str or pathlib.PosixPath):\
+            directory containing the '.template' files.
 
-        if file_path.exists():
-            raise FileExistsError(f'File {filename} already exists at {path}.')
+    Returns:
+        jinja2.Environment: environment shared by every ProjectBuilder.
+    """
+    key = str(template_dir)
+    env = _template_envs.get(key)
+    if env is not None:
+        return env
 
-        return file_path
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
-    def create_proj_dir(self):
-        """The function creates a directory at the path specified and with the
-        name input.
+    with _template_envs_lock:
+        env = _template_envs.get(key)
+        if env is None:
+            bytecode_cache = None
+            if _bytecode_cache_dir is not None:
+                bytecode_cache = FileSystemBytecodeCache(
+                    str(_bytecode_cache_dir))
 
-        Returns:
-            pathlib.Posix object: This is the path to the directory created.
-        """
-        proj_dir = self.path / self.proj_name
+            loader = FileSystemLoader(key)
+            compiled_dir = precompiled_dir(key)
+            if compiled_dir.is_dir():
+                loader = _precompiled_loader(key, str(compiled_dir))
 
-        if proj_dir.exists():
-            self.proj_dir = proj_dir
-            print(f'Directory exists: {proj_dir}\n\n')
-            return proj_dir
+            env = Environment(loader=loader,
+                              cache_size=TEMPLATE_CACHE_SIZE,
+                              auto_reload=True,
+                              bytecode_cache=bytecode_cache)
+            _template_envs[key] = env
+    return env
 
-        proj_dir.mkdir(exist_ok=True)
-        self.proj_dir = proj_dir
-        print(f'Created directory: {proj_dir}\n\n')
-        return proj_dir
 
-    def create_dir(self, dir_name: str, path: str or pathlib.PosixPath = None):
-        """The function creates a directory at the path specified and with the
-        name input.
+# Variable names Jinja resolves without a context: its literals and globals.
+_JINJA_NAMES = {'true', 'false', 'none', 'True', 'False', 'None', 'range',
+                'dict', 'lipsum', 'cycler', 'joiner', 'namespace'}
 
-        Args:
-            dir_name (str): name of the directory to be created.
-            path (pathlib.PosixPath or str, optional):\
-                path or directory name inside the project directory where the \
-                file needs to be created. Defaults to None.
+_NEWLINE = re.compile(r'\r\n|\r|\n')
+_COMMENT = re.compile(r'\{#(?![-+])(.*?)(?<![-+])#\}', re.DOTALL)
+_VARIABLE = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
 
-        Returns:
-            pathlib.Posix object: This is the path to the directory created.
-        """
-        new_dir = self.valid_path(path, dir_name)
-        new_dir.mkdir(exist_ok=True)
-        print(f'Created directory \'{dir_name}\': {new_dir}\n')
-        return new_dir
 
-    def create_file(self, filename: str, template: bool = False,
-                    temp_dict: dict = None, temp_name: str = None,
-                    path: str or pathlib.PosixPath = None):
-        """Creates a file at a given path and a given name.
+class FastTemplate:
+    """Template made only of text, comments and '{{ name }}' substitutions.
 
-        Args:
-            filename (str): name of the file to be created.
+    Notes:
+        Renders the same text Jinja would (with the default Environment
+        settings) without importing Jinja: newlines are normalised to '\\n',
+        a single trailing newline is dropped, comments are removed and an
+        undefined name renders as an empty string.
 
-            template (bool, optional):\
-                True if there if the file needs to contain data contained in \
-                its template. Defaults to False.
+    Attributes:
+        filename (str): path to the template file.
+    """
 
-            temp_dict (dict, optional):\
-                used to customise parts of the template. The variable names \
-                matching a key in the dict will be replaced with the \
-                respective value. Defaults to None. If None, the project and \
-                author names are added to the dictionary.
+    def __init__(self, filename: str, parts: tuple):
+        """Instantiate an object.
 
-            temp_name (str, optional):\
-                name of the template file in the templates directory.\
-                Defaults to None. Uses the filename argument followed \
-                by '.template' to create a name. A file of this name \
-                is looked for in the templates directory.
+        Args:
+            filename (str): For class attribute 'filename'.
+            parts (tuple): text and variable names, alternating.
+        """
+        self.filename = filename
+        self._parts = parts
 
-            path (pathlib.PosixPath or str, optional):\
-                path or directory name inside the project directory where the \
-                file needs to be created. Defaults to None. If None, the \
-                project directory is used as path.
+    @classmethod
+    def compile(cls, source: str, filename: str = None):
+        """Compile a template source.
 
         Returns:
-            pathlib.PosixPath: path to the file created.
+            FastTemplate: the template, None if the source needs Jinja.
         """
-        file_path = self.valid_path(path, filename)
-        file_path.touch()
-        print(f'Created {filename}: {file_path}')
+        lines = _NEWLINE.split(source)
+        if lines[-1] == '':
+            del lines[-1]
+        source = _COMMENT.sub('', '\n'.join(lines))
 
-        if temp_dict is None:
-            temp_dict = {'project_name': self.proj_name,
-                         'author_name': self.author,
-                         'git_username': 'radroid'}
+        parts = _VARIABLE.split(source)
+        for index, part in enumerate(parts):
+            if index % 2:
+                if part in _JINJA_NAMES:
+                    return None
+            elif '{{' in part or '{%' in part or '{#' in part:
+                return None
+        return cls(filename, tuple(parts))
 
-        if template:
-            self.__add_to_file(path_to_file=file_path, template_dict=temp_dict,
-                               template_name=temp_name)
-            print(f'Text added to {filename}')
-        print('')
+    def generate(self, *args, **kwargs):
+        """Render the template piece by piece, like jinja2.Template.generate.
 
-        return file_path
+        Yields:
+            str: the next piece of the rendered text.
+        """
+        context = dict(*args, **kwargs)
+        for index, part in enumerate(self._parts):
+            if index % 2:
+                yield str(context[part]) if part in context else ''
+            else:
+                yield part
 
-    def __add_to_file(self, path_to_file: pathlib.PosixPath,
-                      template_dict: dict, template_name: str):
-        """Add to a file from a template stored in the templates directory.
+    def render(self, *args, **kwargs):
+        """Render the template with the variables of a dict or keywords."""
+        return ''.join(self.generate(*args, **kwargs))
 
-        Args:
-            path_to_file (pathlib.PosixPath):\
-                path to the file that needs to be updated.
-            template_dict (dict):\
-                used to customise parts of the template. The variable names \
-                matching a key in the dict will be replaced with the \
-                respective value.
-            template_name (str):\
-                template_name of the template file in the templates directory.
 
-        Raises:
-            TypeError: if the path input is not to a file.
-            FileNotFoundError: if the path input does not exist.
-            FileNotFoundError: if the project directory does not exist.
-            FileNotFoundError: if the template file does not exist.
-        """
-        if not path_to_file.is_file():
-            raise TypeError('Please input path to a file.')
-        elif not path_to_file.exists():
-            raise FileNotFoundError(f'{path_to_file} does not exist.')
-        elif self.proj_dir is None or not self.proj_dir.exists():
-            raise FileNotFoundError('You need to create a project directory.')
+# Cell types a notebook cell spec can have.
+CELL_TYPES = ('markdown', 'code', 'raw')
 
-        if template_name is None:
-            template_name = path_to_file.name + '.template'
+# Skeleton notebooks are built from when a layout names none.
+NOTEBOOK_SKELETON = 'skeleton.ipynb'
 
-        path_temp = Path.cwd() / 'templates' / template_name
 
-        if not path_temp.exists():
-            raise FileNotFoundError(f'No {template_name} file template was'
-                                    ' found in the current directory.')
+class NotebookTemplate:
+    """Builds notebooks from a parsed skeleton and a list of cell specs.
 
-        template_str = path_temp.open('r').read()
-        template = Template(template_str)
+    Notes:
+        The skeleton is a notebook file holding the metadata and format
+        version. The cells come from the 'cells' variable, a list of
+        (cell type, source) pairs whose sources are templates rendered with
+        the other variables. The notebook is serialised in one pass, the way
+        Jupyter writes it, so the output is valid JSON by construction.
 
-        write_to_file = template.render(template_dict)
+    Attributes:
+        filename (str): path to the skeleton file.
 
-        with path_to_file.open('w') as main:
-            main.write(write_to_file)
+        skeleton (dict): the parsed skeleton, without its cells.
+    """
 
-    def create_conda_env(self, yml_file_path: str or pathlib.PosixPath = None):
-        """Creates a conda environment from a .yml file for a project.
+    def __init__(self, filename: str, skeleton: dict,
+                 template_dir: str or pathlib.PosixPath):
+        """Instantiate an object.
 
         Args:
-            yml_file_path (strorpathlib.PosixPath, optional):\
-                [description]. Defaults to None. If None a new .yml file is \
-                created using a environment.yml.template file from the \
-                templates directory.
-
-        Raises:
-            TypeError: if the path provided is not an absolute path.
-            TypeError: the path input is not to a .yml file.
-            FileNotFoundError: if the path provided does not exist.
+            filename (str): For class attribute 'filename'.
+            skeleton (dict): For class attribute 'skeleton'.
+            template_dir (str or pathlib.PosixPath):\
+                directory whose Jinja environment renders the cell sources \
+                FastTemplate cannot.
         """
-        command = 'conda env create -f {} --prefix {}'
-        create_loc = self.proj_dir / 'env'
-        template_path = Path.cwd() / 'other-files'
-
-        if yml_file_path is None:
-            yml_file_path = template_path / 'environment.yml'
-
-            if yml_file_path.exists():
-                yml_file_path.unlink()
+        self.filename = filename
+        self.skeleton = {key: value for key, value in skeleton.items()
+                         if key != 'cells'}
+        self._template_dir = template_dir
+        # Compiled cell sources, by source.
+        self._cells = {}
 
-            self.create_file('environment.yml', template=True,
-                             temp_dict={'env_name': str(create_loc)},
-                             path=template_path)
-        else:
-            if not yml_file_path.is_absolute():
-                raise TypeError(f'Path entered is not an absolute path.\n'
-                                f'path: {yml_file_path}')
-            if not yml_file_path.suffix == '.yml':
-                raise TypeError(f'Path input is not to a .yml file.\n'
-                                f'{yml_file_path}')
+    def _cell_template(self, source: str):
+        """Return a cell source compiled as a template."""
+        template = self._cells.get(source)
+        if template is None:
+            template = FastTemplate.compile(source, self.filename) or \
+                get_template_env(self._template_dir).from_string(source)
+            self._cells[source] = template
+        return template
 
-        if not yml_file_path.exists():
-            raise FileNotFoundError(f'No .yml file found at {yml_file_path}')
+    def generate(self, *args, **kwargs):
+        """Render the notebook, like jinja2.Template.generate.
 
-        print(f'Creating conda environment at {create_loc}\n\n')
-        os.system(command.format(yml_file_path, create_loc))
+        Yields:
+            str: the notebook JSON.
+        """
+        import json
 
-    def create_pipenv(self):
-        command = 'python3 -m venv {}'
-        create_loc = self.proj_dir / 'venv'
+        context = dict(*args, **kwargs)
+        cells = []
+        for cell_type, source in context.get('cells', ()):
+            text = self._cell_template(source).render(context)
+            cell = {'cell_type': cell_type, 'metadata': {},
+                    'source': text.splitlines(True)}
+            if cell_type == 'code':
+                cell.update(execution_count=None, outputs=[])
+            cells.append(cell)
+        notebook = dict(self.skeleton, cells=cells)
+        yield json.dumps(notebook, indent=1, sort_keys=True,
+                         ensure_ascii=False) + '\n'
 
-        print(f'Creating Pipenv environment at {create_loc}\n\n')
-        os.system(command.format(create_loc))
+    def render(self, *args, **kwargs):
+        """Render the notebook with the variables of a dict or keywords."""
+        return ''.join(self.generate(*args, **kwargs))
 
 
-def create_simple_project(path: str or pathlib.PosixPath = None):
-    """Creates a simple project using the ProjectBuilder class.
+def get_template(template_dir: str or pathlib.PosixPath, template_name: str):
+    """Return a compiled template.
 
     Notes:
-        Creates the following files in the project directory:
-        - {{ project_name }}.py : main python script
-        - README.md
-        - TODO.md
-        - LICENSE : MIT License.
-        - test_project.py : pytest python script
-        - setup.py
-        - .gitignore : basic python gitignore.
-        - venv : python 3 virtual environment directory.
+        Templates FastTemplate can render are compiled without Jinja, the
+        others are loaded from the shared Jinja environment (see
+        get_template_env). Files ending in '.ipynb' are notebook skeletons
+        (see NotebookTemplate). All are compiled again when the file
+        changes.
 
     Args:
-        path (str or pathlib.PosixPath, optional): for class attribute 'path'.
-                                                   Defaults to None.
+        template_dir (str or pathlib.PosixPath):\
+            directory containing the '.template' files.
+
+        template_name (str): name of the template file.
+
+    Raises:
+        FileNotFoundError: if the template file does not exist.
 
     Returns:
-        ProjectBuilder object: an instantiated ProjectBuilder class object
-                               whose attributes can be used to locate the
-                               project directory.
+        FastTemplate or NotebookTemplate or jinja2.Template: the template.
     """
-    pb = ProjectBuilder(path=path)
-    pb.create_proj_dir()
+    import json
 
-    files = ['README.md',
-             'TODO.md',
-             'LICENSE',
-             'setup.py',
-             '.gitignore']
+    filename = os.path.join(str(template_dir), template_name)
+    try:
+        mtime = os.stat(filename).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        raise FileNotFoundError(f'No {template_name} file template was'
+                                f' found in {template_dir}.')
 
-    for filename in files:
-        pb.create_file(filename=filename, template=True)
+    cached = _fast_templates.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(filename, encoding='utf-8') as f:
+            source = f.read()
+        if template_name.endswith('.ipynb'):
+            template = NotebookTemplate(filename, json.loads(source),
+                                        template_dir)
+        else:
+            template = FastTemplate.compile(source, filename)
+        cached = _fast_templates[filename] = (mtime, template)
+    if cached[1] is not None:
+        return cached[1]
 
-    # Create main python file
-    filename = f'{pb.proj_name.replace("-","_").lower()}.py'
-    pb.create_file(filename=filename, template=True,
-                   temp_name='main.py.template')
+    from jinja2 import TemplateNotFound
 
-    # Create test python file
-    test_filename = 'test_' + filename
-    pb.create_file(filename=test_filename, template=True,
-                   temp_name='test_project.py.template')
+    try:
+        return get_template_env(template_dir).get_template(template_name)
+    except TemplateNotFound:
+        raise FileNotFoundError(f'No {template_name} file template was'
+                                f' found in {template_dir}.')
 
-    pb.create_pipenv()
 
-    return pb
+class EnvJob:
+    """Handle to an environment being created by a background process.
 
+    Notes:
+        The output of the command goes to a temporary file rather than a
+        pipe, so a command writing more than a pipe holds never blocks while
+        nothing waits for it.
 
-def create_ml_project(path: str or pathlib.PosixPath = None,
-                      create_conda_env: bool = False):
-    """Creates a basic layout for a machine learning project using
-     ProjectBuilder class.
+    Attributes:
+        command (list): the command creating the environment.
 
-    Notes:
-        Creates the following file structure:
+        location (pathlib.PosixPath): path to the environment directory.
 
-        project_directory/
-        |
-        ├── data/
-        |
-        ├── tests/
-        |   └── test_project.py: pytest python script
-        |
-        ├── notebooks/
-        |   └── {{ project_name }}.ipynb: main jupyter notebook
-        |
-        ├── env/ : conda environment for the project
+        timeout (float):\
+            seconds the command may run for, counted from its start. None \
+            means no limit.
+
+        output (str):\
+            combined stdout and stderr of the command, None until it exits.
+    """
+
+    def __init__(self, command: list, location: pathlib.PosixPath,
+                 timeout: float = None):
+        """Start the command in the background.
+
+        Args:
+            command (list): for class attribute 'command'.
+            location (pathlib.PosixPath): for class attribute 'location'.
+            timeout (float, optional): for class attribute 'timeout'.
+        """
+        import subprocess
+        import tempfile
+
+        self.command = command
+        self.location = location
+        self.timeout = timeout
+        self.output = None
+        self._deadline = None if timeout is None \
+            else time.monotonic() + timeout
+        self._output_file = tempfile.TemporaryFile(mode='w+')
+        self._process = subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                                         stdout=self._output_file,
+                                         stderr=subprocess.STDOUT)
+
+    def done(self):
+        """Return True if the command has exited."""
+        return self.output is not None or self._process.poll() is not None
+
+    def result(self):
+        """Wait for the command to exit.
+
+        Raises:
+            subprocess.TimeoutExpired:\
+                if the command runs past its timeout. The command is killed.
+            subprocess.CalledProcessError: if the command exits with an error.
+
+        Returns:
+            pathlib.PosixPath: path to the environment created.
+        """
+        import subprocess
+
+        if self.output is None:
+            remaining = None
+            if self._deadline is not None:
+                remaining = max(self._deadline - time.monotonic(), 0)
+
+            try:
+                self._process.wait(timeout=remaining)
+            except subprocess.TimeoutExpired:
+                self.kill()
+                raise subprocess.TimeoutExpired(self.command, self.timeout,
+                                                output=self.output)
+            self._read_output()
+
+        if self._process.returncode != 0:
+            raise subprocess.CalledProcessError(self._process.returncode,
+                                                self.command,
+                                                output=self.output)
+        return self.location
+
+    def kill(self):
+        """Stop the command if it is still running and wait for it."""
+        if self.output is None:
+            self._process.kill()
+            self._process.wait()
+            self._read_output()
+
+    def _read_output(self):
+        """Read the output of the exited command into 'output'."""
+        with self._output_file:
+            self._output_file.seek(0)
+            self.output = self._output_file.read()
+
+
+# Directory holding the caches shared by every build on this machine.
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME') or
+                 Path.home() / '.cache') / 'auto_pb'
+
+# ioctl request cloning a whole file on Linux copy-on-write filesystems.
+_FICLONE = 0x40049409
+
+
+def _clone_file(src: str or pathlib.PosixPath,
+                dst: str or pathlib.PosixPath, hardlink: bool = False):
+    """Copy a file, sharing its data with the source when possible.
+
+    Notes:
+        A hard link is tried first when asked for, then a copy-on-write
+        reflink (Linux btrfs/XFS), then a plain copy. Hard linked files are
+        shared with the source, so editing one in place edits both.
+
+    Args:
+        src (str or pathlib.PosixPath): path to the file to copy.
+        dst (str or pathlib.PosixPath): path to the new file.
+        hardlink (bool): if True a hard link is tried first.
+
+    Returns:
+        str: 'hardlink', 'reflink' or 'copy'.
+    """
+    import shutil
+
+    if hardlink:
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError:
+            pass
+
+    if fcntl is not None and sys.platform.startswith('linux'):
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            cloned = _reflink(fsrc.fileno(), fdst.fileno())
+        if cloned:
+            shutil.copymode(src, dst)
+            return 'reflink'
+
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+def _reflink(src_fd: int, dst_fd: int):
+    """Share the data of an open file with another on a copy-on-write
+    filesystem (Linux btrfs/XFS).
+
+    Returns:
+        bool: True if the data was cloned.
+    """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+    except OSError:
+        return False
+    return True
+
+
+# Errors meaning a kernel copy call does not support the files given.
+_NO_KERNEL_COPY = (errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EOPNOTSUPP,
+                   errno.ENOTSUP)
+
+
+def _copy_data(fsrc, fdst, size: int):
+    """Copy the data of an open file to another inside the kernel.
+
+    Notes:
+        A reflink is tried first, then os.copy_file_range (Linux, Python
+        3.8+), then os.sendfile (Linux). Only where none of them works is
+        the data read into Python, in blocks (shutil.copyfileobj). Some
+        filesystems (FUSE, network, procfs) make a kernel copy return 0
+        before the end, the next method then carries on from where it
+        stopped.
+
+    Args:
+        fsrc (io.FileIO): unbuffered file to copy from.
+        fdst (io.FileIO): unbuffered file to copy to.
+        size (int): bytes to copy.
+
+    Raises:
+        OSError: if fewer than 'size' bytes could be copied.
+
+    Returns:
+        str: 'reflink', 'copy_file_range', 'sendfile' or 'read'.
+    """
+    import shutil
+
+    src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+    if _reflink(src_fd, dst_fd):
+        return 'reflink'
+
+    kernel_copies = []
+    if hasattr(os, 'copy_file_range'):
+        kernel_copies.append(('copy_file_range', lambda count:
+                              os.copy_file_range(src_fd, dst_fd, count)))
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        kernel_copies.append(('sendfile', lambda count:
+                              os.sendfile(dst_fd, src_fd, None, count)))
+
+    copied = 0
+    for method, kernel_copy in kernel_copies:
+        start = copied
+        try:
+            while copied < size:
+                sent = kernel_copy(size - copied)
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError as error:
+            # Only fall back when this method copied nothing yet.
+            if copied != start or error.errno not in _NO_KERNEL_COPY:
+                raise
+        if copied == size:
+            return method
+
+    # Both files' positions are where the kernel copies stopped.
+    shutil.copyfileobj(fsrc, fdst)
+    if fdst.tell() < size:
+        raise OSError(errno.EIO, f'Copied {fdst.tell()} of {size} bytes')
+    return 'read'
+
+
+def _copy_asset(src: str or pathlib.PosixPath,
+                dst: str or pathlib.PosixPath, fsync: bool = False):
+    """Copy a file to a new path without reading it into Python.
+
+    Args:
+        src (str or pathlib.PosixPath): path to the file to copy.
+        dst (str or pathlib.PosixPath): path to the new file.
+        fsync (bool): if True the new file is flushed to disk.
+
+    Raises:
+        FileNotFoundError: if the source does not exist.
+        FileExistsError: if something exists at the destination.
+
+    Returns:
+        tuple: the method used (see _copy_data) and the bytes copied.
+    """
+    import shutil
+
+    with open(str(src), 'rb', buffering=0) as fsrc:
+        size = os.fstat(fsrc.fileno()).st_size
+        fdst = open(str(dst), 'xb', buffering=0)
+        try:
+            with fdst:
+                method = _copy_data(fsrc, fdst, size)
+                if fsync:
+                    os.fsync(fdst.fileno())
+        except BaseException:
+            os.unlink(str(dst))
+            raise
+    shutil.copymode(str(src), str(dst))
+    return method, size
+
+
+def _evict_cache(cache_dir: pathlib.PosixPath, keep: str, max_age: float,
+                 max_total: int, weight):
+    """Remove the least recently used entries of a cache directory.
+
+    Notes:
+        An entry is a directory holding a 'meta.json' file whose modification
+        time is its last use. Entries unused for more than 'max_age' seconds
+        are removed, then the oldest until the total weight is 'max_total'.
+
+    Args:
+        cache_dir (pathlib.PosixPath): directory holding the entries.
+        keep (str): name of an entry never to remove.
+        max_age (float): None means no limit.
+        max_total (int): None means no limit.
+        weight (function): returns the weight of an entry from its metadata.
+
+    Returns:
+        list: names of the removed entries.
+    """
+    import json
+    import shutil
+
+    if not cache_dir.exists():
+        return []
+
+    now = time.time()
+    entries = []
+    for entry in cache_dir.iterdir():
+        meta_path = entry / 'meta.json'
+        if entry.name.startswith('.') or not meta_path.exists():
+            continue
+        meta = json.loads(meta_path.read_text())
+        entries.append((meta_path.stat().st_mtime, weight(meta), entry))
+    entries.sort()
+
+    removed = []
+    total = sum(size for _, size, _ in entries)
+    for last_used, size, entry in entries:
+        if entry.name == keep:
+            continue
+        too_old = max_age is not None and now - last_used > max_age
+        too_big = max_total is not None and total > max_total
+        if too_old or too_big:
+            shutil.rmtree(entry)
+            total -= size
+            removed.append(entry.name)
+    return removed
+
+
+class VenvCache:
+    """Local cache of prebuilt "golden" virtual environments.
+
+    Notes:
+        A golden environment is built once per interpreter and requirement
+        set and cloned into new projects. Files are shared with the golden
+        copy when the filesystem allows it (see _clone_file), except the
+        scripts and pyvenv.cfg holding the environment's own path, which are
+        rewritten for the new location.
+
+    Attributes:
+        cache_dir (pathlib.PosixPath): directory holding the environments.
+
+        requirements (tuple): pip requirements installed in the environment.
+
+        with_pip (bool): if False the environment is created without pip.
+
+        hardlink (bool):\
+            if True files are hard linked to the golden copy instead of \
+            reflinked or copied.
+
+        max_size (int):\
+            bytes the cache may hold before the least recently used \
+            environments are removed. None means no limit.
+
+        max_age (float):\
+            seconds an unused environment is kept for. None means no limit.
+    """
+
+    def __init__(self, cache_dir: str or pathlib.PosixPath = None,
+                 requirements: list = (), with_pip: bool = True,
+                 hardlink: bool = False, max_size: int = None,
+                 max_age: float = None):
+        """Instantiate an object.
+
+        Args:
+            cache_dir (str or pathlib.PosixPath, optional):\
+                For class attribute 'cache_dir'. Defaults to None. If None, \
+                a 'venvs' directory in CACHE_DIR is used.
+
+            requirements (list, optional): For class attribute 'requirements'.
+            with_pip (bool, optional): For class attribute 'with_pip'.
+            hardlink (bool, optional): For class attribute 'hardlink'.
+            max_size (int, optional): For class attribute 'max_size'.
+            max_age (float, optional): For class attribute 'max_age'.
+        """
+        self.cache_dir = Path(cache_dir or CACHE_DIR / 'venvs')
+        self.requirements = tuple(sorted(set(requirements)))
+        self.with_pip = with_pip
+        self.hardlink = hardlink
+        self.max_size = max_size
+        self.max_age = max_age
+
+    @property
+    def key(self):
+        """str: hash of the interpreter and requirement set."""
+        import hashlib
+        import json
+
+        spec = [sys.version, os.path.realpath(sys.executable),
+                self.with_pip, self.requirements]
+        return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:32]
+
+    def clone_command(self, dest: str or pathlib.PosixPath):
+        """Return the command cloning the golden environment to 'dest'."""
+        command = [sys.executable, str(Path(__file__).resolve()),
+                   'clone-venv', str(dest), '--cache-dir', str(self.cache_dir)]
+        for requirement in self.requirements:
+            command += ['--requirement', requirement]
+        if not self.with_pip:
+            command.append('--without-pip')
+        if self.hardlink:
+            command.append('--hardlink')
+        if self.max_size is not None:
+            command += ['--max-size', str(self.max_size)]
+        if self.max_age is not None:
+            command += ['--max-age', str(self.max_age)]
+        return command
+
+    def golden(self):
+        """Return the golden environment, building it if it is not cached.
+
+        Raises:
+            subprocess.CalledProcessError: if venv or pip fails.
+
+        Returns:
+            Tuple:
+                pathlib.PosixPath: path to the golden environment.
+                dict: its metadata ('prefix' it was built at and 'size').
+        """
+        import json
+        import shutil
+        import tempfile
+
+        entry = self.cache_dir / self.key
+        meta_path = entry / 'meta.json'
+
+        if not meta_path.exists():
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            build_dir = Path(tempfile.mkdtemp(prefix='.build-',
+                                              dir=str(self.cache_dir)))
+            try:
+                self._build(build_dir)
+                os.rename(build_dir, entry)
+            except OSError:
+                # Another process cached the same environment first.
+                if not meta_path.exists():
+                    raise
+            finally:
+                if build_dir.exists():
+                    shutil.rmtree(build_dir)
+            self.evict(keep=self.key)
+
+        meta = json.loads(meta_path.read_text())
+        os.utime(meta_path)
+        return entry / 'venv', meta
+
+    def _build(self, build_dir: pathlib.PosixPath):
+        """Build a golden environment and its metadata in 'build_dir'."""
+        import json
+        import subprocess
+
+        venv_dir = build_dir / 'venv'
+        command = [sys.executable, '-m', 'venv', str(venv_dir)]
+        if not self.with_pip:
+            command.append('--without-pip')
+        subprocess.run(command, check=True, stdout=subprocess.PIPE,
+                       stderr=subprocess.STDOUT)
+
+        if self.requirements:
+            subprocess.run([str(venv_dir / 'bin' / 'python'), '-m', 'pip',
+                            'install', '--disable-pip-version-check',
+                            *self.requirements],
+                           check=True, stdout=subprocess.PIPE,
+                           stderr=subprocess.STDOUT)
+
+        size = sum(entry.stat().st_size for entry in venv_dir.rglob('*')
+                   if entry.is_file() and not entry.is_symlink())
+        meta = {'prefix': str(venv_dir), 'size': size,
+                'python': sys.version,
+                'requirements': list(self.requirements)}
+        (build_dir / 'meta.json').write_text(json.dumps(meta))
+
+    def clone(self, dest: str or pathlib.PosixPath):
+        """Clone the golden environment to 'dest'.
+
+        Args:
+            dest (str or pathlib.PosixPath): path to the new environment.
+
+        Returns:
+            pathlib.PosixPath: path to the new environment.
+        """
+        import shutil
+
+        dest = Path(dest)
+        golden, meta = self.golden()
+        old_prefix = meta['prefix']
+        old_bytes, new_bytes = old_prefix.encode(), str(dest).encode()
+
+        for root, dirs, files in os.walk(golden):
+            rel = os.path.relpath(root, golden)
+            target = dest / rel
+            target.mkdir(parents=True, exist_ok=True)
+
+            for name in dirs + files:
+                src = os.path.join(root, name)
+                dst = target / name
+                if os.path.islink(src):
+                    link = os.readlink(src)
+                    if link.startswith(old_prefix):
+                        link = str(dest) + link[len(old_prefix):]
+                    os.symlink(link, dst)
+                elif name in files:
+                    if rel == 'bin' or name == 'pyvenv.cfg':
+                        with open(src, 'rb') as f:
+                            data = f.read()
+                        if old_bytes in data:
+                            dst.write_bytes(data.replace(old_bytes,
+                                                         new_bytes))
+                            shutil.copymode(src, dst)
+                            continue
+                    _clone_file(src, dst, self.hardlink)
+
+            # Symlinked directories were recreated above, do not walk them.
+            dirs[:] = [name for name in dirs
+                       if not os.path.islink(os.path.join(root, name))]
+        return dest
+
+    def evict(self, keep: str = None):
+        """Remove environments that are too old or too many.
+
+        Args:
+            keep (str, optional): key of an environment never to remove.
+
+        Returns:
+            list: keys of the removed environments.
+        """
+        return _evict_cache(self.cache_dir, keep, self.max_age,
+                            self.max_size, lambda meta: meta['size'])
+
+
+# Prints the implementation, version and platform of an interpreter.
+_PYTHON_TAG_CODE = ('import json, sys, sysconfig; print(json.dumps('
+                    '[sys.implementation.name, list(sys.version_info[:2]), '
+                    'sysconfig.get_platform()]))')
+
+
+def _python_tag(python: str = None):
+    """Return the implementation, version and platform of an interpreter,
+    by default the one running auto_pb."""
+    import json
+    import subprocess
+
+    if python is None or python == sys.executable:
+        import sysconfig
+
+        return [sys.implementation.name, list(sys.version_info[:2]),
+                sysconfig.get_platform()]
+
+    process = subprocess.run([python, '-c', _PYTHON_TAG_CODE], check=True,
+                             stdout=subprocess.PIPE,
+                             universal_newlines=True)
+    return json.loads(process.stdout)
+
+
+class Wheelhouse:
+    """Local cache of the wheels of requirement sets, for offline installs.
+
+    Notes:
+        The wheels of a requirement set are built or downloaded once by
+        'pip wheel', run by the interpreter of the target environment, into
+        a directory named by the hash of the set, that interpreter and its
+        platform. Installs only read that directory ('pip install
+        --no-index'), so they need no network access.
+
+    Attributes:
+        cache_dir (pathlib.PosixPath): directory holding the wheels.
+
+        find_links (tuple):\
+            extra directories or URLs pip looks for distributions in when \
+            the wheels of a requirement set are first fetched.
+    """
+
+    def __init__(self, cache_dir: str or pathlib.PosixPath = None,
+                 find_links: list = ()):
+        """Instantiate an object.
+
+        Args:
+            cache_dir (str or pathlib.PosixPath, optional):\
+                For class attribute 'cache_dir'. Defaults to None. If None, \
+                a 'wheels' directory in CACHE_DIR is used.
+
+            find_links (list, optional): For class attribute 'find_links'.
+        """
+        self.cache_dir = Path(cache_dir or CACHE_DIR / 'wheels')
+        self.find_links = tuple(str(link) for link in find_links)
+
+    @staticmethod
+    def key(requirements: list, python: str = None):
+        """Return the hash of a requirement set on an interpreter, by
+        default the one running auto_pb."""
+        import hashlib
+        import json
+
+        spec = _python_tag(python) + [sorted(set(requirements))]
+        return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:32]
+
+    def populate(self, requirements: list, python: str = None):
+        """Return the wheels of a requirement set, fetching them on a miss.
+
+        Args:
+            requirements (list): pip requirements to fetch.
+
+            python (str, optional):\
+                interpreter the wheels are for. Defaults to None. If None, \
+                the interpreter running auto_pb is used.
+
+        Raises:
+            subprocess.CalledProcessError: if pip fails.
+
+        Returns:
+            pathlib.PosixPath: directory holding the wheels.
+        """
+        import shutil
+        import subprocess
+        import tempfile
+
+        python = python or sys.executable
+        entry = self.cache_dir / self.key(requirements, python)
+        if entry.exists():
+            return entry
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        build_dir = Path(tempfile.mkdtemp(prefix='.build-',
+                                          dir=str(self.cache_dir)))
+        try:
+            command = [python, '-m', 'pip', 'wheel',
+                       '--disable-pip-version-check',
+                       '--wheel-dir', str(build_dir)]
+            for link in self.find_links:
+                command += ['--find-links', link]
+            subprocess.run(command + sorted(set(requirements)), check=True,
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            os.rename(build_dir, entry)
+        except OSError:
+            # Another process cached the same requirement set first.
+            if not entry.exists():
+                raise
+        finally:
+            if build_dir.exists():
+                shutil.rmtree(build_dir)
+        return entry
+
+    def install(self, env_dir: str or pathlib.PosixPath, requirements: list):
+        """Install a requirement set into an environment from the cache.
+
+        Args:
+            env_dir (str or pathlib.PosixPath): path to the environment.
+            requirements (list): pip requirements to install.
+
+        Raises:
+            subprocess.CalledProcessError: if pip fails.
+        """
+        import subprocess
+
+        python = str(Path(env_dir) / 'bin' / 'python')
+        wheel_dir = self.populate(requirements, python)
+        subprocess.run([python, '-m', 'pip',
+                        'install', '--disable-pip-version-check',
+                        '--no-index', '--find-links', str(wheel_dir),
+                        *sorted(set(requirements))],
+                       check=True, stdout=subprocess.PIPE,
+                       stderr=subprocess.STDOUT)
+
+    def install_command(self, env_dir: str or pathlib.PosixPath,
+                        requirements: list, create_command: list):
+        """Return the command running 'create_command' and then installing
+        a requirement set into the environment it creates."""
+        import json
+
+        command = [sys.executable, str(Path(__file__).resolve()),
+                   'install-wheels', str(env_dir),
+                   '--cache-dir', str(self.cache_dir)]
+        for link in self.find_links:
+            command += ['--find-links', link]
+        for requirement in requirements:
+            command += ['--requirement', requirement]
+        return command + ['--create-command', json.dumps(create_command)]
+
+
+# Conda executable used to create environments.
+CONDA = os.environ.get('CONDA_EXE') or 'conda'
+
+# Git executable used to initialise project repositories.
+GIT = 'git'
+
+# Escapes of git's C-style path quoting.
+_GIT_ESCAPES = {'"': '\\"', '\\': '\\\\', '\a': '\\a', '\b': '\\b',
+                '\f': '\\f', '\n': '\\n', '\r': '\\r', '\t': '\\t',
+                '\v': '\\v'}
+_GIT_NEEDS_QUOTING = re.compile(r'^"|[\x00-\x1f\x7f]')
+
+
+def _git_quote(path: str):
+    """Quote a path the way git does, when it needs quoting."""
+    if not _GIT_NEEDS_QUOTING.search(path):
+        return path
+    return '"' + ''.join(
+        _GIT_ESCAPES.get(char) or
+        (f'\\{ord(char):03o}' if char < ' ' or char == '\x7f' else char)
+        for char in path) + '"'
+
+
+def _git_ident(text: str):
+    """Remove the characters git does not allow in an author name or
+    email."""
+    return re.sub(r'[<>\x00-\x1f]', '', text).strip()
+
+
+def _sorted_list_items(lines: list):
+    """Sort the items of a YAML block list, and the lists nested in them,
+    keeping the lines of each item together."""
+    if not lines or not lines[0].lstrip().startswith('-'):
+        return lines
+
+    indent = len(lines[0]) - len(lines[0].lstrip())
+    items = []
+    for line in lines:
+        if len(line) - len(line.lstrip()) == indent and \
+                line.lstrip().startswith('-'):
+            items.append([line])
+        else:
+            items[-1].append(line)
+    items = sorted([item[0]] + _sorted_list_items(item[1:])
+                   for item in items)
+    return [line for item in items for line in item]
+
+
+def canonical_env_spec(spec: str):
+    """Return a conda environment spec in a canonical form.
+
+    Notes:
+        Blank and comment lines and the 'name' and 'prefix' keys are dropped
+        and the dependencies are sorted, so specs that only differ in where
+        the environment goes or in dependency order are the same. The spec
+        is handled line by line rather than parsed, so the form is the same
+        whether or not PyYAML is installed.
+
+    Args:
+        spec (str): content of an environment.yml file.
+
+    Returns:
+        str: the canonical spec.
+    """
+    sections = []
+    for line in spec.splitlines():
+        line = line.rstrip()
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if sections and (line[0].isspace() or line.startswith('-')):
+            sections[-1].append(line)
+        else:
+            sections.append([line])
+
+    lines = []
+    for section in sections:
+        key = section[0].partition(':')[0]
+        if key in ('name', 'prefix'):
+            continue
+        if key == 'dependencies':
+            section = section[:1] + _sorted_list_items(section[1:])
+        lines += section
+    return '\n'.join(lines)
+
+
+class CondaEnvCache:
+    """Local cache of solved conda environments keyed by their spec.
+
+    Notes:
+        The first project using a spec creates the environment in the cache
+        with a full solve. Later projects get a copy made with
+        'conda create --clone --offline', which relocates the environment
+        without solving or downloading anything.
+
+    Attributes:
+        cache_dir (pathlib.PosixPath): directory holding the environments.
+
+        conda_exe (str): conda executable to run.
+
+        max_entries (int):\
+            environments kept before the least recently used are removed. \
+            None means no limit.
+
+        max_age (float):\
+            seconds an unused environment is kept for. None means no limit.
+    """
+
+    def __init__(self, cache_dir: str or pathlib.PosixPath = None,
+                 conda_exe: str = None, max_entries: int = None,
+                 max_age: float = None):
+        """Instantiate an object.
+
+        Args:
+            cache_dir (str or pathlib.PosixPath, optional):\
+                For class attribute 'cache_dir'. Defaults to None. If None, \
+                a 'conda' directory in CACHE_DIR is used.
+
+            conda_exe (str, optional):\
+                For class attribute 'conda_exe'. Defaults to None. If None, \
+                CONDA is used.
+
+            max_entries (int, optional): For class attribute 'max_entries'.
+            max_age (float, optional): For class attribute 'max_age'.
+        """
+        self.cache_dir = Path(cache_dir or CACHE_DIR / 'conda')
+        self.conda_exe = conda_exe or CONDA
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    @staticmethod
+    def spec_key(spec: str):
+        """Return the cache key of an environment spec."""
+        import hashlib
+
+        canonical = canonical_env_spec(spec)
+        return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+    def clone_command(self, dest: str or pathlib.PosixPath,
+                      yml_file_path: str or pathlib.PosixPath):
+        """Return the command cloning the cached environment to 'dest'."""
+        command = [sys.executable, str(Path(__file__).resolve()),
+                   'clone-conda-env', str(dest), str(yml_file_path),
+                   '--cache-dir', str(self.cache_dir),
+                   '--conda', self.conda_exe]
+        if self.max_entries is not None:
+            command += ['--max-entries', str(self.max_entries)]
+        if self.max_age is not None:
+            command += ['--max-age', str(self.max_age)]
+        return command
+
+    def golden(self, yml_file_path: str or pathlib.PosixPath):
+        """Return the cached environment for a spec, creating it on a miss.
+
+        Raises:
+            subprocess.CalledProcessError: if conda fails.
+
+        Returns:
+            pathlib.PosixPath: path to the cached environment.
+        """
+        import json
+        import shutil
+        import subprocess
+
+        spec = Path(yml_file_path).read_text()
+        key = self.spec_key(spec)
+        entry = self.cache_dir / key
+        env_dir = entry / 'env'
+        meta_path = entry / 'meta.json'
+
+        if not meta_path.exists():
+            entry.mkdir(parents=True, exist_ok=True)
+            # The environment is built in place, as conda environments
+            # cannot be moved, so concurrent builds wait on a lock.
+            with open(entry.with_suffix('.lock'), 'w') as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                if not meta_path.exists():
+                    if env_dir.exists():
+                        shutil.rmtree(env_dir)
+                    subprocess.run([self.conda_exe, 'env', 'create', '-f',
+                                    str(yml_file_path), '--prefix',
+                                    str(env_dir)], check=True)
+                    meta = {'spec': canonical_env_spec(spec)}
+                    meta_path.write_text(json.dumps(meta))
+            self.evict(keep=key)
+
+        os.utime(meta_path)
+        return env_dir
+
+    def clone(self, dest: str or pathlib.PosixPath,
+              yml_file_path: str or pathlib.PosixPath):
+        """Copy the cached environment for a spec to 'dest'.
+
+        Args:
+            dest (str or pathlib.PosixPath): path to the new environment.
+            yml_file_path (str or pathlib.PosixPath): path to the spec.
+
+        Raises:
+            subprocess.CalledProcessError: if conda fails.
+
+        Returns:
+            pathlib.PosixPath: path to the new environment.
+        """
+        import subprocess
+
+        env_dir = self.golden(yml_file_path)
+        subprocess.run([self.conda_exe, 'create', '--clone', str(env_dir),
+                        '--prefix', str(dest), '--offline', '--yes'],
+                       check=True)
+        return Path(dest)
+
+    def evict(self, keep: str = None):
+        """Remove environments that are too old or too many.
+
+        Args:
+            keep (str, optional): key of an environment never to remove.
+
+        Returns:
+            list: keys of the removed environments.
+        """
+        removed = _evict_cache(self.cache_dir, keep, self.max_age,
+                               self.max_entries, lambda meta: 1)
+        for key in removed:
+            lock_path = self.cache_dir / f'{key}.lock'
+            if lock_path.exists():
+                lock_path.unlink()
+        return removed
+
+
+class BlobStore:
+    """Content-addressed store of generated files shared by many projects.
+
+    Notes:
+        Every rendered file is stored once under the sha256 of its content
+        and materialised in the project as a reflink (edits copy-on-write)
+        or, when 'hardlink' is set, as a hard link. A file whose blob is
+        already stored is not written again. Where the store cannot reflink
+        (ext4, tmpfs, ...) and 'hardlink' is not set, a copy of the blob
+        would write every file twice, so files are then written straight to
+        the project and not stored: reflinks() probes this once per store.
+        Hard linked files share the blob, so editing one in place edits the
+        blob too: verify() finds and removes such blobs. The project path of
+        every file is recorded so gc() can remove the blobs no project uses.
+
+    Attributes:
+        store_dir (pathlib.PosixPath): directory holding the blobs.
+
+        hardlink (bool): if True files are hard linked to their blob.
+    """
+
+    def __init__(self, store_dir: str or pathlib.PosixPath = None,
+                 hardlink: bool = False):
+        """Instantiate an object.
+
+        Args:
+            store_dir (str or pathlib.PosixPath, optional):\
+                For class attribute 'store_dir'. Defaults to None. If None, \
+                a 'blobs' directory in CACHE_DIR is used.
+
+            hardlink (bool, optional):\
+                For class attribute 'hardlink'. Defaults to False.
+        """
+        self.store_dir = Path(store_dir or CACHE_DIR / 'blobs')
+        self.hardlink = hardlink
+        self._reflinks = None
+
+    def blob_path(self, key: str):
+        """Return the path of the blob with a given hash."""
+        return self.store_dir / key[:2] / key[2:]
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool = False):
+        """Hold the store lock: shared to add files, exclusive for gc."""
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.store_dir / '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX if exclusive else
+                            fcntl.LOCK_SH)
+            yield
+
+    def _put(self, chunks, fsync: bool = False):
+        """Store the text of 'chunks' unless an identical blob exists.
+
+        Notes:
+            Output up to STREAM_BUFFER_SIZE bytes is hashed in memory, so a
+            stored file costs no write at all. Larger output is streamed to
+            a temporary file in the store.
+
+        Returns:
+            tuple: the hash, the size and the bytes written.
+        """
+        import hashlib
+
+        output_hash = hashlib.sha256()
+        size = 0
+        buffer = []
+        spill = None
+        try:
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                output_hash.update(data)
+                size += len(data)
+                if spill is not None:
+                    spill.write(data)
+                    continue
+                buffer.append(data)
+                if size > STREAM_BUFFER_SIZE:
+                    spill = self._spill_file(buffer)
+                    buffer = None
+
+            key = output_hash.hexdigest()
+            blob = self.blob_path(key)
+            if blob.exists():
+                return key, size, 0
+
+            if spill is None:
+                spill = self._spill_file(buffer)
+            spill.flush()
+            if fsync:
+                os.fsync(spill.fileno())
+            spill.close()
+
+            blob.parent.mkdir(exist_ok=True)
+            try:
+                # Never replace a blob, it may be hard linked already.
+                os.link(spill.name, str(blob))
+            except FileExistsError:
+                return key, size, 0
+            return key, size, size
+        finally:
+            if spill is not None:
+                spill.close()
+                os.unlink(spill.name)
+
+    def _spill_file(self, buffer: list):
+        """Open a new temporary file in the store holding 'buffer'."""
+        tmp_dir = self.store_dir / 'tmp'
+        tmp_dir.mkdir(exist_ok=True)
+        # Created with the umask mode, which copies of the blob inherit.
+        spill = open(str(tmp_dir / f'{os.urandom(8).hex()}.tmp'), 'xb')
+        spill.writelines(buffer)
+        return spill
+
+    def reflinks(self):
+        """Return True if files can be reflinked in the store.
+
+        Notes:
+            Probed the first time by cloning a one byte file in the store.
+        """
+        if self._reflinks is None:
+            tmp_dir = self.store_dir / 'tmp'
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            probe = str(tmp_dir / f'{os.urandom(8).hex()}.probe')
+            try:
+                with open(probe, 'xb') as src, \
+                        open(probe + '.clone', 'xb') as dst:
+                    src.write(b'\0')
+                    src.flush()
+                    self._reflinks = _reflink(src.fileno(), dst.fileno())
+            finally:
+                for path in (probe, probe + '.clone'):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(path)
+        return self._reflinks
+
+    def add(self, chunks, dst: str or pathlib.PosixPath, fsync: bool = False):
+        """Store rendered text and materialise it at a new path.
+
+        Notes:
+            Without 'hardlink' and reflinks() the text is only written to \
+            'dst' (method 'write').
+
+        Args:
+            chunks (iterable): pieces of the text, e.g. Template.generate().
+            dst (str or pathlib.PosixPath): path to the new file.
+            fsync (bool): if True new blobs and copies are flushed to disk.
+
+        Raises:
+            FileExistsError: if something exists at 'dst'.
+
+        Returns:
+            tuple: the hash, the size, the bytes written and the method \
+                ('hardlink', 'write' or see _copy_data).
+        """
+        if not self.hardlink and not self.reflinks():
+            return self._write(chunks, dst, fsync)
+
+        with self._locked():
+            key, size, written = self._put(chunks, fsync)
+            blob = self.blob_path(key)
+            method = None
+            if self.hardlink:
+                try:
+                    os.link(str(blob), str(dst))
+                    method = 'hardlink'
+                except FileExistsError:
+                    raise
+                except OSError:
+                    pass
+            if method is None:
+                method, _ = _copy_asset(blob, dst, fsync)
+
+            with open(self.store_dir / 'refs', 'a') as refs:
+                refs.write(f'{key}\t{Path(dst).resolve()}\n')
+        return key, size, written, method
+
+    def _write(self, chunks, dst: str or pathlib.PosixPath, fsync: bool):
+        """Write rendered text to a new path without storing it."""
+        import hashlib
+
+        digest = hashlib.sha256()
+        size = 0
+        f = open(str(dst), 'xb', buffering=STREAM_BUFFER_SIZE)
+        try:
+            with f:
+                for chunk in chunks:
+                    data = chunk.encode('utf-8')
+                    f.write(data)
+                    digest.update(data)
+                    size += len(data)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except BaseException:
+            os.unlink(str(dst))
+            raise
+        return digest.hexdigest(), size, size, 'write'
+
+    def _blobs(self):
+        """Yield the hash and path of every blob."""
+        for prefix in sorted(self.store_dir.glob('??')):
+            for blob in sorted(prefix.iterdir()):
+                yield prefix.name + blob.name, blob
+
+    def verify(self):
+        """Remove the blobs whose content no longer matches their hash.
+
+        Returns:
+            list: hashes of the blobs removed.
+        """
+        import hashlib
+
+        removed = []
+        with self._locked(exclusive=True):
+            for key, blob in self._blobs():
+                with blob.open('rb') as f:
+                    digest = hashlib.sha256()
+                    for block in iter(lambda: f.read(STREAM_BUFFER_SIZE), b''):
+                        digest.update(block)
+                if digest.hexdigest() != key:
+                    blob.unlink()
+                    removed.append(key)
+        return removed
+
+    def gc(self):
+        """Remove the blobs no project file uses any more.
+
+        Notes:
+            A recorded file still uses its blob if it is a hard link to it
+            or still has the blob's content. Blobs with other hard links
+            are kept even without a record. A record of a moved file, e.g.
+            one built in a staging directory, only stops the blob from being
+            shared with later builds: copies own their data.
+
+        Returns:
+            list: hashes of the blobs removed.
+        """
+        import shutil
+
+        removed = []
+        with self._locked(exclusive=True):
+            refs_path = self.store_dir / 'refs'
+            try:
+                lines = refs_path.read_text().splitlines()
+            except FileNotFoundError:
+                lines = []
+
+            live = []
+            used = set()
+            for line in dict.fromkeys(lines):
+                key, path = line.split('\t', 1)
+                if key not in used and not self._uses(path, key):
+                    continue
+                live.append(line)
+                used.add(key)
+
+            for key, blob in self._blobs():
+                if key not in used and blob.stat().st_nlink == 1:
+                    blob.unlink()
+                    removed.append(key)
+
+            tmp_refs = refs_path.with_name('refs.tmp')
+            tmp_refs.write_text(''.join(line + '\n' for line in live))
+            os.replace(str(tmp_refs), str(refs_path))
+            shutil.rmtree(str(self.store_dir / 'tmp'), ignore_errors=True)
+        return removed
+
+    def _uses(self, path: str, key: str):
+        """Return True if the file at 'path' still uses the blob 'key'."""
+        import hashlib
+
+        blob = self.blob_path(key)
+        try:
+            file_stat = os.stat(path)
+            blob_stat = blob.stat()
+        except FileNotFoundError:
+            return False
+        if (file_stat.st_dev, file_stat.st_ino) == \
+                (blob_stat.st_dev, blob_stat.st_ino):
+            return True
+        if file_stat.st_size != blob_stat.st_size:
+            return False
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256()
+            for block in iter(lambda: f.read(STREAM_BUFFER_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest() == key
+
+
+# Formats a Tracer can write.
+TRACE_FORMATS = ('jsonl', 'chrome')
+
+
+class Tracer:
+    """Records timed spans of project builds to a trace file.
+
+    Notes:
+        Each span records its wall time, the bytes written and the number of
+        filesystem calls made ('stat', 'mkdir', 'open', 'write', 'fsync',
+        'rename') while it was open, children included. Spans are written
+        when they end, one event at a time, so traces of many builds can be
+        appended to the same file, also from several processes with the
+        'jsonl' format. A Tracer without a path records nothing.
+
+    Attributes:
+        path (pathlib.PosixPath): trace file, None to disable tracing.
+
+        trace_format (str):\
+            'jsonl' for one JSON event per line, or 'chrome' for the Chrome \
+            trace event format (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, path: str or pathlib.PosixPath = None,
+                 trace_format: str = 'jsonl'):
+        """Instantiate an object.
+
+        Args:
+            path (str or pathlib.PosixPath, optional):\
+                For class attribute 'path'. Defaults to None.
+
+            trace_format (str, optional):\
+                For class attribute 'trace_format'. Defaults to 'jsonl'.
+
+        Raises:
+            ValueError: if the trace format is not known.
+        """
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f'Unknown trace format: {trace_format}')
+
+        self.path = None if path is None else Path(path)
+        self.trace_format = trace_format
+        self._file = None
+        self._lock = self._local = None
+        if self.path is not None:
+            import threading
+
+            self._lock = threading.Lock()
+            self._local = threading.local()
+
+    @property
+    def enabled(self):
+        """bool: True if spans are recorded."""
+        return self.path is not None
+
+    def _stack(self):
+        """Return the open spans of the current thread."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        """Record the code run inside a 'with' block as a span.
+
+        Args:
+            name (str): name of the span.
+            **args: values recorded with the span.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._stack()
+        span = {'args': args, 'bytes': 0, 'syscalls': {}}
+        stack.append(span)
+        start = time.time()
+        start_counter = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_counter
+            stack.pop()
+            if stack:
+                parent = stack[-1]
+                parent['bytes'] += span['bytes']
+                for syscall, count in span['syscalls'].items():
+                    parent['syscalls'][syscall] = \
+                        parent['syscalls'].get(syscall, 0) + count
+
+            args = dict(span['args'], bytes=span['bytes'],
+                        syscalls=span['syscalls'])
+            self._write({'name': name, 'ph': 'X',
+                         'ts': int(start * 1e6), 'dur': int(duration * 1e6),
+                         'pid': os.getpid(), 'tid': _thread.get_ident(),
+                         'args': args})
+
+    def annotate(self, **args):
+        """Add values to the innermost open span."""
+        stack = self._stack() if self.enabled else None
+        if stack:
+            stack[-1]['args'].update(args)
+
+    def count(self, syscall: str, calls: int = 1, written: int = 0):
+        """Add filesystem calls and bytes written to the innermost span."""
+        stack = self._stack() if self.enabled else None
+        if stack:
+            span = stack[-1]
+            span['syscalls'][syscall] = span['syscalls'].get(syscall, 0) + \
+                calls
+            span['bytes'] += written
+
+    def start(self):
+        """Create the trace file before any span ends, so that processes
+        sharing it only ever append events."""
+        if self.enabled:
+            with self._lock:
+                self._open()
+
+    def _open(self):
+        """Open the trace file, starting a Chrome trace if it is empty."""
+        if self._file is None:
+            self._file = self.path.open('a')
+            if self.trace_format == 'chrome' and self._file.tell() == 0:
+                # Chrome accepts an array without its closing bracket.
+                self._file.write('[\n')
+                self._file.flush()
+
+    def _write(self, event: dict):
+        """Append an event to the trace file."""
+        import json
+
+        with self._lock:
+            self._open()
+            line = json.dumps(event)
+            if self.trace_format == 'chrome':
+                line += ','
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        """Close the trace file."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _traced(method):
+    """Record each call of a ProjectBuilder method as a span."""
+    @functools.wraps(method)
+    def traced_method(self, *args, **kwargs):
+        with self.tracer.span(method.__name__.lstrip('_'),
+                              project=self.proj_name):
+            return method(self, *args, **kwargs)
+    return traced_method
+
+
+# When ProjectBuilder flushes written files to disk.
+FSYNC_POLICIES = ('file', 'tree', 'never')
+
+
+# Flag of renameat2 failing when the destination exists.
+RENAME_NOREPLACE = 1
+
+
+@functools.lru_cache(maxsize=None)
+def _renameat2():
+    """Return a function calling libc's renameat2 and returning its errno,
+    None where renameat2 is not available."""
+    if not sys.platform.startswith('linux'):
+        return None
+
+    import ctypes
+
+    libc_renameat2 = getattr(ctypes.CDLL(None, use_errno=True), 'renameat2',
+                             None)
+    if libc_renameat2 is None:
+        return None
+    libc_renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int,
+                               ctypes.c_char_p, ctypes.c_uint]
+
+    def renameat2(src: str, dst: str, flags: int):
+        # Both paths are relative to the working directory (AT_FDCWD).
+        if libc_renameat2(-100, os.fsencode(src), -100, os.fsencode(dst),
+                          flags) == 0:
+            return 0
+        return ctypes.get_errno()
+    return renameat2
+
+
+def _rename_noreplace(src: str or pathlib.PosixPath,
+                      dst: str or pathlib.PosixPath):
+    """Rename a directory, failing if the destination exists.
+
+    Notes:
+        On Linux renameat2(RENAME_NOREPLACE) checks and renames in one \
+        call. Elsewhere, or when the filesystem does not support it, the \
+        destination is claimed by creating it empty and the directory is \
+        renamed over it, which rename() allows for an empty directory.
+
+    Raises:
+        FileExistsError: if the destination exists.
+    """
+    renameat2 = _renameat2()
+    if renameat2 is not None:
+        error = renameat2(str(src), str(dst), RENAME_NOREPLACE)
+        if not error:
+            return
+        if error not in (errno.EINVAL, errno.ENOSYS):
+            raise OSError(error, os.strerror(error), str(dst))
+
+    os.mkdir(str(dst))
+    try:
+        os.rename(str(src), str(dst))
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.rmdir(str(dst))
+        raise
+
+
+def _fsync_dir(path: str or pathlib.PosixPath):
+    """Flush the entries of a directory to disk where the OS allows it."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _fsync_tree(root: str or pathlib.PosixPath):
+    """Flush every file and directory under 'root' to disk.
+
+    Returns:
+        int: number of files and directories flushed.
+    """
+    flushed = 0
+    for dirpath, _, filenames in os.walk(str(root)):
+        for filename in filenames:
+            fd = os.open(os.path.join(dirpath, filename), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        _fsync_dir(dirpath)
+        flushed += len(filenames) + 1
+    return flushed
+
+
+# Directory holding the built-in layout specs.
+LAYOUT_DIR = Path(__file__).resolve().parent / 'layouts'
+
+# Environment a layout can ask for.
+ENV_TYPES = ('venv', 'conda', 'none')
+
+# Names layout directory and file paths may use (see layout_names).
+LAYOUT_NAMES = ('project_name', 'module_name', 'lower_name')
+
+_layout_plans = {}
+
+
+class FileStep(NamedTuple):
+    """A file of a build plan.
+
+    Attributes:
+        path (str): path in the project, may use the layout name variables.
+        template (str): template name, None for the file name + '.template'.
+        context (tuple): (key, value) pairs added to the template variables.
+        source (str): static file copied as is, None for a template file.
+    """
+    path: str
+    template: str
+    context: tuple
+    source: str = None
+
+
+class BuildPlan(NamedTuple):
+    """Immutable steps building a project layout (see compile_layout).
+
+    Attributes:
+        name (str): name of the layout.
+        dirs (tuple): directories to create, parents first.
+        files (tuple): FileStep of each file to create.
+        env (str): environment type, one of ENV_TYPES.
+        requirements (tuple): pip requirements installed in the environment.
+        origin (str):\
+            what load_layout loads the plan from again: the name of a \
+            built-in layout or the resolved path of a layout file. None for \
+            plans compiled from a spec in memory.
+    """
+    name: str
+    dirs: tuple
+    files: tuple
+    env: str
+    requirements: tuple = ()
+    origin: str = None
+
+
+def _check_layout_path(path: str):
+    """Check that a layout path stays inside the project and only uses
+    LAYOUT_NAMES.
+
+    Raises:
+        ValueError: if the path is absolute, has a '..' component or uses \
+            an unknown name.
+    """
+    import string
+
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(path)
+                  if field is not None]
+    except ValueError:
+        raise ValueError(f'Invalid layout path: {path}')
+    for field in fields:
+        if field not in LAYOUT_NAMES:
+            raise ValueError(f'Unknown name {{{field}}} in layout path: '
+                             f'{path}')
+
+    parts = Path(path).parts
+    if not parts or Path(path).is_absolute() or '..' in parts:
+        raise ValueError(f'Layout path is not inside the project: {path}')
+
+
+def compile_layout(spec: dict, name: str = None,
+                   base_dir: str or pathlib.PosixPath = None):
+    """Compile a layout spec into a build plan.
+
+    Notes:
+        A spec has an optional 'env' ('venv', 'conda' or 'none'), an optional
+        list of pip 'requirements' installed in it (see Wheelhouse), an
+        optional list of 'dirs' and a list of 'files'. Each file is a table
+        with a 'name', an optional 'template' and an optional 'context' table
+        of extra template variables. A file with a 'source' instead is a
+        static asset (data, weights, binary fixtures) copied into the project
+        without being read into Python. A file with 'cells' is a notebook
+        built from a skeleton ('template', NOTEBOOK_SKELETON by default) and
+        a list of cells, each a table with one CELL_TYPES key holding the
+        cell's template source. A file with 'each', a list of values, is
+        created once per value, with '{item}' in its name and the 'item'
+        variable set to the value. Names are relative paths inside the
+        project and may use {project_name}, {module_name} (lower case, '-'
+        replaced by '_') and {lower_name} (lower case). Parents of every
+        directory and file are created even when they are not listed.
+
+    Args:
+        spec (dict): the parsed layout.
+        name (str, optional): name of the layout.
+        base_dir (str or pathlib.PosixPath, optional):\
+            directory relative 'source' paths start from. Defaults to None. \
+            If None, the current directory is used.
+
+    Raises:
+        ValueError: if the spec has unknown keys, an unknown env type or a \
+            path outside the project or using an unknown name.
+
+    Returns:
+        BuildPlan: the compiled plan.
+    """
+    unknown = set(spec) - {'env', 'requirements', 'dirs', 'files'}
+    if unknown:
+        raise ValueError(f'Unknown layout keys: {sorted(unknown)}')
+
+    env = spec.get('env', 'none')
+    if env not in ENV_TYPES:
+        raise ValueError(f'Unknown environment type: {env}')
+
+    requirements = spec.get('requirements', [])
+    if not all(isinstance(requirement, str) for requirement in requirements):
+        raise ValueError(f'Invalid layout requirements: {requirements}')
+
+    files = []
+    for file_spec in spec.get('files', []):
+        unknown = set(file_spec) - {'name', 'template', 'context', 'source',
+                                    'cells', 'each'}
+        if unknown or 'name' not in file_spec or 'source' in file_spec and \
+                ('template' in file_spec or 'context' in file_spec or
+                 'cells' in file_spec) or 'each' in file_spec and \
+                '{item}' not in file_spec['name']:
+            raise ValueError(f'Invalid layout file: {file_spec}')
+        source = file_spec.get('source')
+        if source is not None:
+            source = str(Path(base_dir or Path.cwd()) / source)
+        template = file_spec.get('template')
+        context = dict(file_spec.get('context', {}))
+
+        if 'cells' in file_spec:
+            cells = []
+            for cell in file_spec['cells']:
+                if not isinstance(cell, dict) or len(cell) != 1:
+                    raise ValueError(f'Invalid notebook cell: {cell}')
+                (cell_type, cell_source), = cell.items()
+                if cell_type not in CELL_TYPES or \
+                        not isinstance(cell_source, str):
+                    raise ValueError(f'Invalid notebook cell: {cell}')
+                cells.append((cell_type, cell_source))
+            context['cells'] = tuple(cells)
+            template = template or NOTEBOOK_SKELETON
+
+        for item in file_spec.get('each', [None]):
+            path = file_spec['name']
+            item_context = context
+            if item is not None:
+                path = path.replace('{item}', str(item))
+                item_context = dict(context, item=item)
+            _check_layout_path(path)
+            files.append(FileStep(path, template,
+                                  tuple(sorted(item_context.items())),
+                                  source))
+
+    for path in spec.get('dirs', []):
+        _check_layout_path(path)
+
+    dirs = []
+    paths = list(spec.get('dirs', [])) + \
+        [str(Path(step.path).parent) for step in files]
+    for path in paths:
+        parts = Path(path).parts
+        for depth in range(1, len(parts) + 1):
+            dir_path = str(Path(*parts[:depth]))
+            if dir_path not in dirs:
+                dirs.append(dir_path)
+    dirs.sort(key=lambda dir_path: len(Path(dir_path).parts))
+
+    return BuildPlan(name, tuple(dirs), tuple(files), env,
+                     tuple(requirements))
+
+
+def load_layout(layout: str or pathlib.PosixPath):
+    """Load a layout and compile it into a build plan.
+
+    Notes:
+        Compiled plans are cached by a hash of the spec, so a layout is only
+        parsed and compiled again when its file changes.
+
+    Args:
+        layout (str or pathlib.PosixPath):\
+            name of a built-in layout in LAYOUT_DIR ('simple' or 'ml') or \
+            path to a '.toml', '.yml' or '.yaml' layout file.
+
+    Raises:
+        FileNotFoundError: if the layout does not exist.
+        ImportError: if the parser for the layout format is not installed.
+
+    Returns:
+        BuildPlan: the compiled plan.
+    """
+    import hashlib
+
+    layout_path = Path(layout)
+    origin = str(layout_path.resolve())
+    if layout_path.suffix not in ('.toml', '.yml', '.yaml'):
+        layout_path = LAYOUT_DIR / f'{layout}.toml'
+        origin = str(layout)
+
+    try:
+        data = layout_path.read_bytes()
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No {layout} layout was found.')
+
+    # Static asset paths are relative to the layout file.
+    base_dir = layout_path.resolve().parent
+    key = hashlib.sha256(str(base_dir / layout_path.name).encode() + b'\0' +
+                         data).hexdigest()
+    plan = _layout_plans.get(key)
+    if plan is None:
+        if layout_path.suffix == '.toml':
+            tomllib = _optional_import('tomllib') or \
+                _optional_import('toml')
+            if tomllib is None:
+                raise ImportError('A TOML parser (toml) is needed to read '
+                                  f'{layout_path}')
+            spec = tomllib.loads(data.decode())
+        else:
+            yaml = _optional_import('yaml')
+            if yaml is None:
+                raise ImportError('PyYAML is needed to read '
+                                  f'{layout_path}')
+            spec = yaml.safe_load(data) or {}
+
+        plan = compile_layout(spec, layout_path.stem, base_dir)._replace(
+            origin=origin)
+        _layout_plans[key] = plan
+    return plan
+
+
+# Archive formats a project can be streamed into.
+ARCHIVE_FORMATS = ('tar.gz', 'tar', 'zip')
+
+
+class _ArchiveWriter:
+    """Writes the directories and files of a project into a tar or zip
+    archive.
+
+    Notes:
+        Tar headers hold the file size, so rendered text is spooled in
+        memory up to STREAM_BUFFER_SIZE bytes and in a temporary file
+        beyond that. Zip members are streamed as they are rendered. Both
+        work on unseekable outputs such as stdout.
+    """
+
+    def __init__(self, fileobj, fmt: str):
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f'Unknown archive format: {fmt}')
+        self.fmt = fmt
+        self.mtime = time.time()
+        if fmt == 'zip':
+            import zipfile
+
+            self._zipfile = zipfile
+            self.archive = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            import tarfile
+
+            self._tarfile = tarfile
+            mode = 'w|gz' if fmt == 'tar.gz' else 'w|'
+            self.archive = tarfile.open(fileobj=fileobj, mode=mode,
+                                        format=tarfile.PAX_FORMAT)
+
+    def _tar_info(self, name: str, mode: int, size: int = 0,
+                  kind: bytes = None):
+        info = self._tarfile.TarInfo(name)
+        info.mtime = self.mtime
+        info.mode = mode
+        info.size = size
+        if kind is not None:
+            info.type = kind
+        return info
+
+    def _zip_info(self, name: str, mode: int):
+        info = self._zipfile.ZipInfo(name, time.localtime(self.mtime)[:6])
+        info.external_attr = mode << 16
+        info.compress_type = self._zipfile.ZIP_DEFLATED
+        return info
+
+    def add_dir(self, name: str):
+        """Add a directory."""
+        import stat
+
+        if self.fmt == 'zip':
+            info = self._zip_info(name + '/', stat.S_IFDIR | 0o755)
+            info.compress_type = self._zipfile.ZIP_STORED
+            self.archive.writestr(info, b'')
+        else:
+            self.archive.addfile(self._tar_info(name, 0o755,
+                                                kind=self._tarfile.DIRTYPE))
+
+    def add_text(self, name: str, chunks):
+        """Add a file holding the text of 'chunks'.
+
+        Returns:
+            tuple: the sha256 hash of the file and its size.
+        """
+        import hashlib
+        import stat
+        import tempfile
+
+        digest = hashlib.sha256()
+        size = 0
+        if self.fmt == 'zip':
+            info = self._zip_info(name, stat.S_IFREG | 0o644)
+            with self.archive.open(info, 'w') as member:
+                for chunk in chunks:
+                    data = chunk.encode('utf-8')
+                    member.write(data)
+                    digest.update(data)
+                    size += len(data)
+            return digest.hexdigest(), size
+
+        with tempfile.SpooledTemporaryFile(STREAM_BUFFER_SIZE) as spool:
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                spool.write(data)
+                digest.update(data)
+                size += len(data)
+            spool.seek(0)
+            self.archive.addfile(self._tar_info(name, 0o644, size), spool)
+        return digest.hexdigest(), size
+
+    def add_file(self, name: str, source: str or pathlib.PosixPath):
+        """Add a copy of a file, read in blocks.
+
+        Returns:
+            int: the size of the file.
+        """
+        import shutil
+        import stat
+
+        with open(str(source), 'rb') as f:
+            source_stat = os.fstat(f.fileno())
+            mode = stat.S_IMODE(source_stat.st_mode)
+            size = source_stat.st_size
+            if self.fmt == 'zip':
+                info = self._zip_info(name, stat.S_IFREG | mode)
+                with self.archive.open(
+                        info, 'w',
+                        force_zip64=size >= self._zipfile.ZIP64_LIMIT) \
+                        as member:
+                    shutil.copyfileobj(f, member, STREAM_BUFFER_SIZE)
+            else:
+                self.archive.addfile(self._tar_info(name, mode, size), f)
+        return size
+
+    def close(self):
+        self.archive.close()
+
+
+# File recording how each file of a generated project was rendered.
+MANIFEST_NAME = '.auto_pb.json'
+
+_template_hashes = {}
+
+
+def _hash_text(text: str):
+    """Return the hash of a generated file's content."""
+    import hashlib
+
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _hash_context(template_dict: dict):
+    """Return the hash of the variables a template was rendered with."""
+    import json
+
+    context = json.dumps(template_dict, sort_keys=True, default=str)
+    return _hash_text(context)
+
+
+def _template_hash(template):
+    """Return the hash of a template's source, cached by modification time."""
+    import hashlib
+
+    mtime = os.stat(template.filename).st_mtime_ns
+    key = (template.filename, mtime)
+    template_hash = _template_hashes.get(key)
+    if template_hash is None:
+        with open(template.filename, 'rb') as f:
+            template_hash = hashlib.sha256(f.read()).hexdigest()
+        _template_hashes[key] = template_hash
+    return template_hash
+
+
+# Problems a project name can have, by error code.
+NAME_PROBLEMS = {
+    'type': 'The project name is not a string.',
+    'empty': 'The project name cannot be empty.',
+    'digit_start': 'The first character cannot be a number (digit).',
+    'space': 'No spaces allowed in the project name. '
+             'Tip: Replace " " with "-", spaces with dashes.',
+    'special_chars': 'Only letters, digits, \'_\' and \'-\' can be used in '
+                     'the project name.',
+    'bad_start': 'The project name cannot start with \'-\' or \'_\'.',
+    'bad_end': 'The project name cannot end with \'-\' or \'_\'.',
+    'duplicate': 'The project name is used more than once.',
+    'exists': 'A file or directory with the project name exists.'}
+
+_NAME_SPECIAL_CHAR = re.compile(r'[^\w-]')
+
+
+class NameProblem(NamedTuple):
+    """Problem found with a project name (see validate_project_names).
+
+    Attributes:
+        index (int): position of the name in the names validated.
+        name (str): the name.
+        code (str): the error code, a key of NAME_PROBLEMS.
+    """
+    index: int
+    name: str
+    code: str
+
+    @property
+    def message(self):
+        """str: the problem explained to the user (see name_problem_text)."""
+        return name_problem_text(self.name, self.code)
+
+
+def name_problem_text(name: str, code: str):
+    """Return the text of NAME_PROBLEMS explaining a problem with a name.
+
+    Notes:
+        The text of 'special_chars' is followed by the characters of the
+        name that are not allowed.
+
+    Args:
+        name (str): name of the project.
+        code (str): the error code, a key of NAME_PROBLEMS.
+
+    Returns:
+        str: the text shown to the user.
+    """
+    text = NAME_PROBLEMS[code]
+    if code == 'special_chars':
+        chars = sorted(set(_NAME_SPECIAL_CHAR.findall(name)))
+        text = f'{text} Not allowed: {", ".join(map(repr, chars))}'
+    return text
+
+
+def project_name_problem(name: str):
+    """Return the error code of the first problem with a project name.
+
+    Notes:
+        Names may only hold word characters and '-', cannot start with a
+        digit and cannot start or end with '-' or '_'. The checks use
+        string methods and one precompiled pattern, so valid names are
+        checked without building any objects.
+
+    Args:
+        name (str): name of the project.
+
+    Returns:
+        str: a key of NAME_PROBLEMS, None if the name is valid.
+    """
+    if type(name) != str:
+        return 'type'
+    if not name:
+        return 'empty'
+    if name[0].isdigit():
+        return 'digit_start'
+    if ' ' in name:
+        return 'space'
+    if _NAME_SPECIAL_CHAR.search(name) is not None:
+        return 'special_chars'
+    if len(name) > 1:
+        if name[0] in '-_':
+            return 'bad_start'
+        if name[-1] in '-_':
+            return 'bad_end'
+    return None
+
+
+def validate_project_names(names, unique: bool = False,
+                           path: str or pathlib.PosixPath = None):
+    """Validate many project names at once.
+
+    Args:
+        names (iterable): the project names, e.g. the rows of a manifest.
+
+        unique (bool):\
+            if True a name used more than once is a 'duplicate' after its \
+            first use. Defaults to False.
+
+        path (str or pathlib.PosixPath, optional):\
+            directory the projects are created in. Defaults to None. If \
+            given, a name already present in it 'exists'. The directory is \
+            listed once.
+
+    Yields:
+        NameProblem: the problem of each invalid name, in order.
+    """
+    existing = frozenset(os.listdir(str(path))) if path is not None else ()
+    seen = set()
+    for index, name in enumerate(names):
+        code = project_name_problem(name)
+        if code is None:
+            if name in existing:
+                code = 'exists'
+            elif unique:
+                if name in seen:
+                    code = 'duplicate'
+                else:
+                    seen.add(name)
+        if code is not None:
+            yield NameProblem(index, name, code)
+
+
+class ProjectBuilder:
+    """The class manages the newly created project folder.
+
+    Attributes:
+        proj_name (str): name of project entered by the user.
+
+        author_name (str): name of the author entered by the user.
+
+        path (pathlib.PosixPath):\
+            path to a directory where the project directory is to be created.\
+            Defaults to None. If None, path to the parent directory of this\
+                 project directory will be used.
+
+        proj_dir (pathlib.PosixPath): path to the project directory.
+
+        verbose (bool): if False, progress messages are not printed.
+
+        env_job (EnvJob):\
+            environment being created in the background by a pipelined \
+            build, None otherwise.
+
+        venv_cache (VenvCache):\
+            cache the virtual environment is cloned from. None means the \
+            environment is built from scratch.
+
+        conda_cache (CondaEnvCache):\
+            cache the conda environment is cloned from. None means the \
+            environment is solved and built from scratch.
+
+        staged (bool):\
+            if True the project is built in a staging directory and only \
+            appears under its name once publish() is called.
+
+        fsync (str):\
+            when written files are flushed to disk: 'file' after each file, \
+            'tree' once for the whole project in publish() or 'never'.
+
+        tracer (Tracer): records the time spent in each build step.
+
+        root (pathlib.PosixPath):\
+            directory every file of the build is written under. The project \
+            is created in it when no path is given and a given path must be \
+            inside it. None means the parent of the current directory is \
+            used.
+
+        template_dir (pathlib.PosixPath): directory holding the templates.
+
+        env_job_factory (callable):\
+            called with the command, location and timeout to start creating \
+            an environment. Returns an EnvJob or an object with the same \
+            done(), result() and kill() methods.
+
+        blob_store (BlobStore):\
+            store the files rendered from templates are deduplicated in. \
+            None means every file is written in full.
+
+        wheelhouse (Wheelhouse):\
+            cache the requirements of a layout are installed from. None \
+            means a Wheelhouse in CACHE_DIR.
+    """
+
+    def __init__(self, path: str or pathlib.PosixPath = None,
+                 proj_name: str = None, author: str = None,
+                 verbose: bool = True, venv_cache: VenvCache = None,
+                 conda_cache: CondaEnvCache = None, staged: bool = False,
+                 fsync: str = 'never', tracer: Tracer = None,
+                 root: str or pathlib.PosixPath = None,
+                 template_dir: str or pathlib.PosixPath = None,
+                 env_job_factory=None, blob_store: BlobStore = None,
+                 wheelhouse: Wheelhouse = None):
+        """Instantiate an object.
+
+        Args:
+            path (str or pathlib.PosixPath, optional):\
+                For class attribute 'path'.
+
+            proj_name (str, optional):\
+                For class attribute 'proj_name'. Defaults to None. If None, \
+                the project and author names are asked for interactively.
+
+            author (str, optional):\
+                For class attribute 'author'. Only used when 'proj_name' is \
+                provided. Defaults to None. If None, an empty name is used.
+
+            verbose (bool, optional):\
+                For class attribute 'verbose'. Defaults to True.
+
+            venv_cache (VenvCache, optional):\
+                For class attribute 'venv_cache'. Defaults to None.
+
+            conda_cache (CondaEnvCache, optional):\
+                For class attribute 'conda_cache'. Defaults to None.
+
+            staged (bool, optional):\
+                For class attribute 'staged'. Defaults to False.
+
+            fsync (str, optional):\
+                For class attribute 'fsync'. Defaults to 'never'.
+
+            tracer (Tracer, optional):\
+                For class attribute 'tracer'. Defaults to None. If None, \
+                nothing is recorded.
+
+            root (str or pathlib.PosixPath, optional):\
+                For class attribute 'root'. Defaults to None.
+
+            template_dir (str or pathlib.PosixPath, optional):\
+                For class attribute 'template_dir'. Defaults to None. If \
+                None, TEMPLATE_DIR is used.
+
+            env_job_factory (callable, optional):\
+                For class attribute 'env_job_factory'. Defaults to None. If \
+                None, EnvJob is used.
+
+            blob_store (BlobStore, optional):\
+                For class attribute 'blob_store'. Defaults to None.
+
+            wheelhouse (Wheelhouse, optional):\
+                For class attribute 'wheelhouse'. Defaults to None.
+
+        Raises:
+            TypeError: if the path provided is not an absolute path.
+            FileNotFoundError: if the path provided does not exist.
+            TypeError: if the path input is not to a directory.
+            ValueError: if the project name provided is not valid.
+            ValueError: if the fsync policy is not known.
+            ValueError: if the path provided is not inside the root.
+        """
+        if path is None and root is not None:
+            path = root
+
+        if path is None:
+            path = Path.cwd().parent
+        else:
+            if type(path) == str:
+                path = Path(path)
+
+            if not path.is_absolute():
+                raise TypeError(f'Path entered is not an absolute path.\n'
+                                f'path: {path}')
+            if not path.exists():
+                raise FileNotFoundError(f'The path provided, does not exist.\n'
+                                        f'path: {path}')
+            if not path.is_dir():
+                raise TypeError(f'No directory present at {path}')
+
+        if root is not None:
+            resolved = path.resolve()
+            if Path(root).resolve() not in (resolved, *resolved.parents):
+                raise ValueError(f'Path {path} is not inside the root '
+                                 f'{root}')
+
+        self.path = path
+        self.proj_dir = None
+        self.verbose = verbose
+        self.tracer = Tracer() if tracer is None else tracer
+        self.env_job = None
+        self.venv_cache = venv_cache
+        self.conda_cache = conda_cache
+        self.root = None if root is None else Path(root)
+        self.template_dir = TEMPLATE_DIR if template_dir is None \
+            else Path(template_dir)
+        self.env_job_factory = EnvJob if env_job_factory is None \
+            else env_job_factory
+        self.blob_store = blob_store
+        self.wheelhouse = wheelhouse
+
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'Unknown fsync policy: {fsync}')
+        self.staged = staged
+        self.fsync = fsync
+        self._final_dir = None
+        # Kind ('dir' or 'file') of the paths created or checked so far.
+        self._snapshot = {}
+        # Hashes of the files rendered from templates, by project path.
+        self._manifest = {}
+        # Layout recorded in the manifest for update (see BuildPlan.origin).
+        self._layout = None
+        # Environment to create once an archived project is extracted.
+        self._pending_env = None
+        # Requirements installed in the environment of the layout.
+        self._requirements = ()
+
+        if proj_name is None:
+            self.proj_name, self.author = self.get_names()
+        else:
+            if not self.valid_project_name(proj_name, verbose=verbose):
+                raise ValueError(f'Invalid project name: {proj_name}')
+            self.proj_name = proj_name
+            self.author = '' if author is None else author
+
+    def get_names(self):
+        """Take input from user for the project name and author name. Print out \
+        the information provided.
+
+        Returns (Tuple):
+            proj_name (str): name of project entered by the user.
+            author_name (str): name of the author entered by the user.
+        """
+        print('\n> What would you like to name your project?')
+        for attempt in range(3):
+            proj_name = input().strip()
+            code = project_name_problem(proj_name)
+            if code is None:
+                break
+            print(f'\n> PROBLEM: {name_problem_text(proj_name, code)}')
+            print('> Please enter a valid project name.')
+        else:
+            print('\n')
+            raise UserWarning('You ran out of attempts to enter a valid '
+                              'project name.')
+
+        print('\n> Who is the author of the project? '
+              '(Enter full name of the author)')
+        author_name = input()
+
+        print('\n### Project Details ###')
+        print(f'Project name: {proj_name}')
+        print(f'Author:       {author_name}\n')
+        return proj_name, author_name
+
+    def _log(self, message: str):
+        """Print a progress message unless the builder is not verbose."""
+        if self.verbose:
+            print(message)
+
+    @staticmethod
+    def valid_project_name(name: str, verbose: bool = True):
+        """Checks if the 'name' provided is a valid name for the project.
+
+        Args:
+            name (str): name of the project or directory to be created.
+
+            verbose (bool, optional):\
+                if True the problem found with the name is printed. \
+                Defaults to True.
+
+        Notes:
+            See project_name_problem, which returns the problem as an error \
+            code instead, and validate_project_names for many names.
+
+        Raises:
+            TypeError: if the provided argument is not a string.
+
+        Returns:
+            bool: if the name provided is valid or no.
+        """
+        code = project_name_problem(name)
+        if code == 'type':
+            raise TypeError('Argument is not a string.')
+
+        if code is not None and verbose:
+            print(f'\n> PROBLEM: {name_problem_text(name, code)}')
+        return code is None
+
+    def valid_path(self, path: str or pathlib.PosixPath = None,
+                   filename: str = None):
+        """The method does all the error checks to ensure file creation is
+           possible.
+
+        Args:
+            path (str or pathlib.PosixPath):\
+                Path where the file/directory is to be created.
+
+            filename (str): name of the file/directory to be created.
+
+        Raises:
+            FileNotFoundError: if no project directory exists.
+            FileNotFoundError: if the path input does not exist.
+            TypeError: if the path input is not a directory.
+            FileExistsError: if the file to be created exists at the path
+                             provided.
+
+        Returns:
+            pathlib.PosixPath: path with the filename (without if if None).
+        """
+        file_path = self._target_path(path, filename)
+
+        if filename is not None and self._path_kind(file_path) is not None:
+            raise FileExistsError(f'File {filename} already exists at '
+                                  f'{file_path.parent}.')
+
+        return file_path
+
+    def _target_path(self, path: str or pathlib.PosixPath = None,
+                     filename: str = None):
+        """Check the directories of valid_path, but not the file itself.
+
+        Files and directories are created exclusively (O_EXCL), so an
+        existing file is reported when it is created instead.
+        """
+        if self.proj_dir is None or \
+                self._path_kind(self.proj_dir) != 'dir':
+            raise FileNotFoundError(f'Please create a project directory before'
+                                    f' creating a {filename} file.')
+
+        if path is None:
+            path = self.proj_dir
+        elif type(path) == str:
+            path = Path(path)
+
+        kind = self._path_kind(path)
+        if kind is None:
+            raise FileNotFoundError(f'The path provided, does not exist.\n \
+                                    path: {path}')
+        if kind != 'dir':
+            raise TypeError(f'No directory present at {path}')
+
+        if filename is None:
+            return path
+
+        return path / filename
+
+    def _path_kind(self, path: pathlib.PosixPath):
+        """Return 'dir', 'file' or None if nothing exists at 'path'.
+
+        Paths created by the builder, and directories it has already checked,
+        are answered from its snapshot without touching the filesystem.
+        """
+        import stat
+
+        kind = self._snapshot.get(path)
+        if kind is not None:
+            return kind
+
+        self.tracer.count('stat')
+        try:
+            mode = path.stat().st_mode
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        if stat.S_ISDIR(mode):
+            self._snapshot[path] = 'dir'
+            return 'dir'
+        return 'file'
+
+    @_traced
+    def create_proj_dir(self):
+        """The function creates a directory at the path specified and with the
+        name input.
+
+        Notes:
+            In a staged build the project is built in a hidden sibling \
+            directory that publish() renames to the project name.
+
+        Raises:
+            FileExistsError:\
+                if the project directory exists and the build is staged.
+
+        Returns:
+            pathlib.Posix object: This is the path to the directory created.
+        """
+        proj_dir = self.path / self.proj_name
+
+        if self.staged:
+            if self._path_kind(proj_dir) is not None:
+                raise FileExistsError(f'Directory exists: {proj_dir}')
+
+            while True:
+                staging_dir = self.path / \
+                    f'.{self.proj_name}.{os.urandom(4).hex()}.staging'
+                self.tracer.count('mkdir')
+                try:
+                    staging_dir.mkdir()
+                    break
+                except FileExistsError:
+                    continue
+
+            self._final_dir = proj_dir
+            self.proj_dir = staging_dir
+            self._snapshot[staging_dir] = 'dir'
+            self._log(f'Staging directory: {staging_dir}\n\n')
+            return staging_dir
+
+        if self._path_kind(proj_dir) is not None:
+            self.proj_dir = proj_dir
+            self._log(f'Directory exists: {proj_dir}\n\n')
+            return proj_dir
+
+        proj_dir.mkdir(exist_ok=True)
+        self.tracer.count('mkdir')
+        self.proj_dir = proj_dir
+        self._snapshot[proj_dir] = 'dir'
+        self._log(f'Created directory: {proj_dir}\n\n')
+        return proj_dir
+
+    @_traced
+    def create_dir(self, dir_name: str, path: str or pathlib.PosixPath = None):
+        """The function creates a directory at the path specified and with the
+        name input.
+
+        Args:
+            dir_name (str): name of the directory to be created.
+            path (pathlib.PosixPath or str, optional):\
+                path or directory name inside the project directory where the \
+                file needs to be created. Defaults to None.
+
+        Returns:
+            pathlib.Posix object: This is the path to the directory created.
+        """
+        new_dir = self._target_path(path, dir_name)
+        self.tracer.annotate(path=str(new_dir))
+        new_dir.mkdir()
+        self.tracer.count('mkdir')
+        self._snapshot[new_dir] = 'dir'
+        self._log(f'Created directory \'{dir_name}\': {new_dir}\n')
+        return new_dir
+
+    def layout_names(self):
+        """Return the variables that layout file names may use.
+
+        Returns:
+            dict: 'project_name', 'module_name' and 'lower_name'.
+        """
+        return {'project_name': self.proj_name,
+                'module_name': self.proj_name.replace('-', '_').lower(),
+                'lower_name': self.proj_name.lower()}
+
+    def _template_dict(self):
+        """Return the default template variables of the project."""
+        return {'project_name': self.proj_name,
+                'author_name': self.author,
+                'git_username': 'radroid'}
+
+    @_traced
+    def build(self, plan: BuildPlan, create_env: bool = True,
+              pipeline: bool = False, env_timeout: float = None,
+              init_git: bool = False):
+        """Create the project directory and run a build plan in it.
+
+        Args:
+            plan (BuildPlan): the plan to run (see load_layout).
+
+            create_env (bool):\
+                if True the environment of the plan is created. Defaults to \
+                True.
+
+            pipeline (bool):\
+                if True the environment is created in the background while \
+                the files are rendered and the method returns without \
+                waiting for it. Wait with 'env_job.result()'. Defaults to \
+                False.
+
+            env_timeout (float, optional):\
+                seconds environment creation may take. Defaults to None.
+
+            init_git (bool):\
+                if True a git repository holding the generated files is \
+                created once the project is published (see init_git). \
+                Defaults to False.
+
+        Returns:
+            pathlib.PosixPath: path to the project directory.
+        """
+        names = self.layout_names()
+        create_env = create_env and plan.env != 'none'
+        self._layout = plan.origin
+        self._requirements = plan.requirements
+        self.create_proj_dir()
+
+        # A staged project moves when published, so its environment can only
+        # be created afterwards.
+        if create_env and pipeline and not self.staged:
+            self.env_job = self._start_env(plan.env, env_timeout)
+
+        try:
+            for dir_path in plan.dirs:
+                self.create_dir(dir_path.format(**names))
+
+            for step in plan.files:
+                file_path = Path(step.path.format(**names))
+                if step.source is not None:
+                    self.copy_file(file_path.name, step.source,
+                                   path=self.proj_dir / file_path.parent)
+                    continue
+                temp_dict = self._template_dict()
+                temp_dict.update(step.context)
+                self.create_file(filename=file_path.name, template=True,
+                                 temp_dict=temp_dict, temp_name=step.template,
+                                 path=self.proj_dir / file_path.parent)
+
+            self.publish()
+        except BaseException:
+            self._cancel_env()
+            self.discard()
+            raise
+
+        if init_git:
+            self.init_git()
+
+        if create_env and self.env_job is None:
+            if pipeline:
+                self.env_job = self._start_env(plan.env, env_timeout)
+            elif plan.env == 'venv':
+                self.create_pipenv(env_timeout)
+            else:
+                self.create_conda_env(timeout=env_timeout)
+        return self.proj_dir
+
+    def _cancel_env(self):
+        """Stop the environment job of a build that failed."""
+        if self.env_job is not None:
+            self.env_job.kill()
+            self.env_job = None
+
+    def _start_env(self, env: str, timeout: float = None):
+        """Start creating an environment of type 'venv' or 'conda'."""
+        if env == 'venv':
+            return self.start_pipenv(timeout)
+        return self.start_conda_env(timeout=timeout)
+
+    @_traced
+    def archive(self, plan: BuildPlan, dest, fmt: str = None,
+                create_env: bool = True):
+        """Stream the project of a build plan into a tar or zip archive
+        without creating it on disk.
+
+        Notes:
+            Members are named '<project name>/<path>' and include the \
+            manifest, so the extracted project can be updated. Environments \
+            cannot be archived: the environment of the plan is recorded in \
+            the manifest instead and created by create_project_env after \
+            extraction.
+
+        Args:
+            plan (BuildPlan): the plan to run (see load_layout).
+
+            dest (str or pathlib.PosixPath or file object):\
+                path of the new archive or binary file object it is written \
+                to, e.g. sys.stdout.buffer. A file object is not closed.
+
+            fmt (str, optional):\
+                one of ARCHIVE_FORMATS. Defaults to None. If None, the format \
+                is taken from the file name and is 'tar.gz' otherwise.
+
+            create_env (bool):\
+                if True the environment of the plan is recorded for \
+                create_project_env. Defaults to True.
+
+        Raises:
+            ValueError: if the archive format is not known.
+            FileExistsError: if something exists at the destination path.
+            FileNotFoundError: if a template or static asset does not exist.
+
+        Returns:
+            str or pathlib.PosixPath or file object: the destination.
+        """
+        if fmt is None:
+            name = str(getattr(dest, 'name', dest))
+            fmt = next((fmt for fmt in ARCHIVE_FORMATS
+                        if name.endswith('.' + fmt)), 'tar.gz')
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f'Unknown archive format: {fmt}')
+
+        names = self.layout_names()
+        self._layout = plan.origin
+        self._manifest = {}
+        self._pending_env = plan.env if create_env and plan.env != 'none' \
+            else None
+        self._requirements = plan.requirements
+
+        if isinstance(dest, (str, pathlib.PurePath)):
+            fileobj = open(str(dest), 'xb')
+        else:
+            fileobj = dest
+
+        tracer = self.tracer
+        try:
+            writer = _ArchiveWriter(fileobj, fmt)
+            writer.add_dir(self.proj_name)
+            for dir_path in plan.dirs:
+                writer.add_dir(f'{self.proj_name}/{dir_path.format(**names)}')
+
+            for step in plan.files:
+                rel_path = Path(step.path.format(**names)).as_posix()
+                member = f'{self.proj_name}/{rel_path}'
+                if step.source is not None:
+                    size = writer.add_file(member, step.source)
+                    tracer.count('write', written=size)
+                    self._log(f'Archived {rel_path}')
+                    continue
+
+                template_name = step.template or \
+                    Path(rel_path).name + '.template'
+                temp_dict = self._template_dict()
+                temp_dict.update(step.context)
+                with tracer.span('load_template', template=template_name):
+                    template = self._get_template(template_name)
+                with tracer.span('render', template=template_name,
+                                 path=member):
+                    output_hash, size = writer.add_text(
+                        member, template.generate(temp_dict))
+                    tracer.count('write', written=size)
+                self._record(rel_path, template_name, template, temp_dict,
+                             output_hash)
+                self._log(f'Archived {rel_path}')
+
+            writer.add_text(f'{self.proj_name}/{MANIFEST_NAME}',
+                            [self._manifest_text()])
+            writer.close()
+        except BaseException:
+            if fileobj is not dest:
+                fileobj.close()
+                os.unlink(str(dest))
+            raise
+
+        if fileobj is not dest:
+            fileobj.close()
+        else:
+            fileobj.flush()
+        self._log(f'Archived {self.proj_name} to {fmt}\n')
+        return dest
+
+    @_traced
+    def create_file(self, filename: str, template: bool = False,
+                    temp_dict: dict = None, temp_name: str = None,
+                    path: str or pathlib.PosixPath = None):
+        """Creates a file at a given path and a given name.
+
+        Args:
+            filename (str): name of the file to be created.
+
+            template (bool, optional):\
+                True if there if the file needs to contain data contained in \
+                its template. Defaults to False.
+
+            temp_dict (dict, optional):\
+                used to customise parts of the template. The variable names \
+                matching a key in the dict will be replaced with the \
+                respective value. Defaults to None. If None, the project and \
+                author names are added to the dictionary.
+
+            temp_name (str, optional):\
+                name of the template file in the templates directory.\
+                Defaults to None. Uses the filename argument followed \
+                by '.template' to create a name. A file of this name \
+                is looked for in the templates directory.
+
+            path (pathlib.PosixPath or str, optional):\
+                path or directory name inside the project directory where the \
+                file needs to be created. Defaults to None. If None, the \
+                project directory is used as path.
+
+        Raises:
+            FileExistsError: if the file exists.
+
+        Returns:
+            pathlib.PosixPath: path to the file created.
+        """
+        file_path = self._target_path(path, filename)
+        self.tracer.annotate(path=str(file_path))
+
+        if temp_dict is None:
+            temp_dict = self._template_dict()
+
+        if template:
+            # The file is removed again if rendering fails part way.
+            self.__add_to_file(path_to_file=file_path, template_dict=temp_dict,
+                               template_name=temp_name)
+            self._log(f'Created {filename}: {file_path}')
+            self._log(f'Text added to {filename}')
+        else:
+            file_path.touch(exist_ok=False)
+            self.tracer.count('open')
+            self._log(f'Created {filename}: {file_path}')
+        self._snapshot[file_path] = 'file'
+        self._log('')
+
+        return file_path
+
+    @_traced
+    def copy_file(self, filename: str, source: str or pathlib.PosixPath,
+                  path: str or pathlib.PosixPath = None):
+        """Copies a static asset (data, model weights, binary fixtures) into
+        the project.
+
+        Notes:
+            The file is cloned where the filesystem supports it and otherwise
+            copied by the kernel (see _copy_data), so large assets are never
+            read into Python.
+
+        Args:
+            filename (str): name of the file to be created.
+
+            source (str or pathlib.PosixPath): path to the file to copy.
+
+            path (pathlib.PosixPath or str, optional):\
+                see create_file. Defaults to None.
+
+        Raises:
+            FileExistsError: if the file exists.
+            FileNotFoundError: if the source does not exist.
+
+        Returns:
+            pathlib.PosixPath: path to the file created.
+        """
+        file_path = self._target_path(path, filename)
+        self.tracer.annotate(path=str(file_path), source=str(source))
+
+        method, size = _copy_asset(source, file_path,
+                                   fsync=self.fsync == 'file')
+        self.tracer.count('open', 2)
+        self.tracer.count(method, written=size)
+        if self.fsync == 'file':
+            self.tracer.count('fsync')
+        self._snapshot[file_path] = 'file'
+        self._log(f'Copied {filename}: {file_path}')
+        self._log('')
+
+        return file_path
+
+    @_traced
+    def __add_to_file(self, path_to_file: pathlib.PosixPath,
+                      template_dict: dict, template_name: str,
+                      overwrite: bool = False):
+        """Write a new file from a template stored in the templates directory.
+
+        Notes:
+            Files inside the project directory are recorded in the project \
+            manifest (see publish).
+
+        Args:
+            path_to_file (pathlib.PosixPath):\
+                path to the file that needs to be written.
+            template_dict (dict):\
+                used to customise parts of the template. The variable names \
+                matching a key in the dict will be replaced with the \
+                respective value.
+            template_name (str):\
+                template_name of the template file in the templates directory.
+            overwrite (bool, optional):\
+                if True an existing file is replaced. Defaults to False.
+
+        Raises:
+            FileExistsError: if something exists at the path input.
+            FileNotFoundError: if the directory of the path does not exist.
+            FileNotFoundError: if the project directory does not exist.
+            FileNotFoundError: if the template file does not exist.
+        """
+        import hashlib
+
+        if self.proj_dir is None or self._path_kind(self.proj_dir) != 'dir':
+            raise FileNotFoundError('You need to create a project directory.')
+
+        if template_name is None:
+            template_name = path_to_file.name + '.template'
+
+        tracer = self.tracer
+        with tracer.span('load_template', template=template_name):
+            template = self._get_template(template_name)
+
+        # The rendered text is streamed to the file, so only the write
+        # buffer is held in memory however large the file is.
+        with tracer.span('render', template=template_name,
+                         path=str(path_to_file)):
+            target = path_to_file
+            if overwrite:
+                # Replace the file only once it is complete.
+                target = path_to_file.with_name(
+                    f'.{path_to_file.name}.{os.urandom(4).hex()}.tmp')
+
+            if self.blob_store is not None:
+                output_hash, _, written, method = self.blob_store.add(
+                    template.generate(template_dict), target,
+                    fsync=self.fsync == 'file')
+                tracer.count(method)
+                main = None
+            else:
+                digest = hashlib.sha256()
+                written = 0
+                main = target.open('x', buffering=STREAM_BUFFER_SIZE)
+            try:
+                if main is not None:
+                    with main:
+                        for chunk in template.generate(template_dict):
+                            main.write(chunk)
+                            data = chunk.encode('utf-8')
+                            digest.update(data)
+                            written += len(data)
+                        if self.fsync == 'file':
+                            main.flush()
+                            os.fsync(main.fileno())
+                            tracer.count('fsync')
+                    output_hash = digest.hexdigest()
+                if overwrite:
+                    os.replace(str(target), str(path_to_file))
+            except BaseException:
+                target.unlink()
+                raise
+            tracer.count('open')
+            tracer.count('write', written=written)
+
+        try:
+            rel_path = path_to_file.relative_to(self.proj_dir).as_posix()
+        except ValueError:
+            return
+        self._record(rel_path, template_name, template, template_dict,
+                     output_hash)
+
+    def _record(self, rel_path: str, template_name: str, template,
+                template_dict: dict, output_hash: str):
+        """Record a file rendered from a template in the manifest."""
+        self._manifest[rel_path] = {
+            'template': template_name,
+            'template_hash': _template_hash(template),
+            'context_hash': _hash_context(template_dict),
+            'output_hash': output_hash}
+
+    def _get_template(self, template_name: str):
+        """Return a compiled template from the templates directory.
+
+        Raises:
+            FileNotFoundError: if the template file does not exist.
+        """
+        return get_template(self.template_dir, template_name)
+
+    def _manifest_text(self):
+        """Return the manifest of the generated files."""
+        import json
+
+        manifest = {'version': 1,
+                    'layout': self._layout,
+                    'project_name': self.proj_name,
+                    'author': self.author,
+                    'files': self._manifest}
+        if self._pending_env is not None:
+            manifest['env'] = self._pending_env
+        if self._requirements:
+            manifest['requirements'] = list(self._requirements)
+        return json.dumps(manifest, indent=1, sort_keys=True) + '\n'
+
+    def _write_manifest(self):
+        """Write the manifest of the generated files to the project."""
+        manifest_path = self.proj_dir / MANIFEST_NAME
+        with manifest_path.open('w') as f:
+            f.write(self._manifest_text())
+        self.tracer.count('open')
+        self.tracer.count('write')
+        self._snapshot[manifest_path] = 'file'
+
+    @_traced
+    def update(self, layout: str or pathlib.PosixPath or BuildPlan = None):
+        """Bring a generated project up to date with its layout.
+
+        Notes:
+            A file is rendered again only when its template or template \
+            variables changed since it was generated and its content was not \
+            modified since. Files added to the layout are created, and files \
+            deleted or edited by the user are left alone. Static assets are \
+            only copied when missing and are reported as 'untracked'.
+
+        Args:
+            layout (str or pathlib.PosixPath or BuildPlan, optional):\
+                layout of the project (see load_layout). Defaults to None. \
+                If None, the layout recorded in the manifest is used.
+
+        Raises:
+            FileNotFoundError: if the project has no manifest.
+            FileNotFoundError: if the recorded layout file no longer exists.
+            ValueError: if no layout is given and none is recorded.
+
+        Returns:
+            dict: status of each layout file by path: 'created', \
+                'updated', 'unchanged', 'modified' (by the user), 'deleted' \
+                (by the user) or 'untracked' (not generated by the builder).
+        """
+        import json
+
+        manifest_path = self.proj_dir / MANIFEST_NAME
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except FileNotFoundError:
+            raise FileNotFoundError(f'No {MANIFEST_NAME} found in '
+                                    f'{self.proj_dir}')
+
+        if layout is None:
+            layout = manifest['layout']
+            if layout is None:
+                raise ValueError(f'{manifest_path} records no layout file, '
+                                 'pass the layout to update')
+            if Path(layout).is_absolute() and not Path(layout).exists():
+                raise FileNotFoundError(f'The layout {layout} the project '
+                                        'was built from no longer exists')
+        plan = layout if isinstance(layout, BuildPlan) \
+            else load_layout(layout)
+        self._layout = plan.origin
+        self._requirements = plan.requirements
+        self._manifest = manifest['files']
+        self._pending_env = manifest.get('env')
+        names = self.layout_names()
+
+        for dir_path in plan.dirs:
+            dir_path = dir_path.format(**names)
+            if self._path_kind(self.proj_dir / dir_path) is None:
+                self.create_dir(dir_path)
+
+        status = {}
+        for step in plan.files:
+            rel_path = Path(step.path.format(**names)).as_posix()
+            file_path = self.proj_dir / rel_path
+            if step.source is not None:
+                # Static assets are not tracked, only copied when missing.
+                if self._path_kind(file_path) is None:
+                    self.copy_file(file_path.name, step.source,
+                                   path=file_path.parent)
+                    status[rel_path] = 'created'
+                else:
+                    status[rel_path] = 'untracked'
+                self._log(f'{status[rel_path].title()}: {rel_path}')
+                continue
+
+            template_name = step.template or file_path.name + '.template'
+            temp_dict = self._template_dict()
+            temp_dict.update(step.context)
+            entry = self._manifest.get(rel_path)
+
+            if entry is None:
+                if self._path_kind(file_path) is None:
+                    self.create_file(file_path.name, template=True,
+                                     temp_dict=temp_dict,
+                                     temp_name=template_name,
+                                     path=file_path.parent)
+                    status[rel_path] = 'created'
+                else:
+                    status[rel_path] = 'untracked'
+            elif self._path_kind(file_path) is None:
+                status[rel_path] = 'deleted'
+            elif entry['template'] == template_name and \
+                    entry['template_hash'] == _template_hash(
+                        self._get_template(template_name)) and \
+                    entry['context_hash'] == _hash_context(temp_dict):
+                status[rel_path] = 'unchanged'
+            elif _hash_text(file_path.read_text()) != entry['output_hash']:
+                status[rel_path] = 'modified'
+            else:
+                self.__add_to_file(file_path, temp_dict, template_name,
+                                   overwrite=True)
+                status[rel_path] = 'updated'
+            self._log(f'{status[rel_path].title()}: {rel_path}')
+
+        self._write_manifest()
+        return status
+
+    @_traced
+    def publish(self):
+        """Finish writing the project files.
+
+        Notes:
+            The manifest of the files rendered from templates is written to \
+            MANIFEST_NAME in the project, for update(). Files are flushed to \
+            disk as set by the 'fsync' attribute. In a staged build the \
+            staging directory is then renamed to the project directory \
+            without replacing anything created there meanwhile (see \
+            _rename_noreplace), so the project appears complete or not at \
+            all.
+
+        Raises:
+            FileExistsError:\
+                if the project directory was created during a staged build.
+
+        Returns:
+            pathlib.PosixPath: path to the project directory.
+        """
+        if self._manifest:
+            self._write_manifest()
+
+        if self.fsync == 'tree':
+            self.tracer.count('fsync', _fsync_tree(self.proj_dir))
+
+        if self.staged and self._final_dir is not None:
+            try:
+                _rename_noreplace(self.proj_dir, self._final_dir)
+            except FileExistsError:
+                raise FileExistsError(f'Directory exists: {self._final_dir}')
+            self.tracer.count('rename')
+            self._snapshot = {self._moved(path): kind
+                              for path, kind in self._snapshot.items()}
+            self.proj_dir, self._final_dir = self._final_dir, None
+            self._log(f'Published directory: {self.proj_dir}\n\n')
+
+        if self.fsync != 'never':
+            _fsync_dir(self.proj_dir.parent)
+            self.tracer.count('fsync')
+        return self.proj_dir
+
+    def discard(self):
+        """Remove the staging directory of an unpublished staged build."""
+        import shutil
+
+        if self.staged and self._final_dir is not None:
+            shutil.rmtree(self.proj_dir, ignore_errors=True)
+            self._snapshot = {path: kind
+                              for path, kind in self._snapshot.items()
+                              if self._moved(path) == path}
+            self.proj_dir, self._final_dir = None, None
+
+    @_traced
+    def init_git(self, branch: str = 'main', email: str = ''):
+        """Create a git repository in the project holding all generated files
+        in one initial commit.
+
+        Notes:
+            The commit is streamed to a single 'git fast-import', so the \
+            number of git processes (init, fast-import and read-tree for \
+            the index) does not grow with the number of files. Nothing is \
+            fetched, so it works offline. The author is the project author \
+            and the files are the ones created by this builder. '<', '>' \
+            and control characters are removed from the author and email. \
+            If git fails, the repository is removed again.
+
+        Args:
+            branch (str): name of the branch committed to. Defaults to 'main'.
+            email (str): email of the commit author. Defaults to none.
+
+        Raises:
+            FileExistsError: if the project already has a repository.
+            subprocess.CalledProcessError: if git fails.
+
+        Returns:
+            pathlib.PosixPath: path to the repository.
+        """
+        import shutil
+        import subprocess
+
+        git_dir = self.proj_dir / '.git'
+        if self._path_kind(git_dir) is not None:
+            raise FileExistsError(f'Repository exists: {git_dir}')
+
+        files = sorted(path.relative_to(self.proj_dir).as_posix()
+                       for path, kind in self._snapshot.items()
+                       if kind == 'file' and self.proj_dir in path.parents)
+
+        now = time.time()
+        offset = time.localtime(now).tm_gmtoff // 60
+        sign = '-' if offset < 0 else '+'
+        name = _git_ident(self.author or '') or self.proj_name
+        identity = f'{name} <{_git_ident(email)}> {int(now)} ' \
+            f'{sign}{abs(offset) // 60:02d}{abs(offset) % 60:02d}'
+        message = f'Initial commit of {self.proj_name}\n'.encode('utf-8')
+
+        subprocess.run([GIT, 'init', '-q', str(self.proj_dir)], check=True,
+                       stdin=subprocess.DEVNULL)
+        try:
+            self._import_git(git_dir, files, branch, identity, message)
+        except BaseException:
+            shutil.rmtree(str(git_dir), ignore_errors=True)
+            raise
+
+        self.tracer.count('exec', 3)
+        self._snapshot[git_dir] = 'dir'
+        self._log(f'Initialised git repository: {git_dir}\n')
+        return git_dir
+
+    def _import_git(self, git_dir: pathlib.PosixPath, files: list,
+                    branch: str, identity: str, message: bytes):
+        """Commit files to a new repository with one 'git fast-import' and
+        fill the index."""
+        import shutil
+        import subprocess
+
+        (git_dir / 'HEAD').write_text(f'ref: refs/heads/{branch}\n')
+        importer = subprocess.Popen([GIT, 'fast-import', '--quiet', '--done'],
+                                    cwd=str(self.proj_dir),
+                                    stdin=subprocess.PIPE)
+        try:
+            stream = importer.stdin
+            for mark, rel_path in enumerate(files, 1):
+                with open(str(self.proj_dir / rel_path), 'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    stream.write(f'blob\nmark :{mark}\ndata {size}\n'
+                                 .encode('utf-8'))
+                    shutil.copyfileobj(f, stream, STREAM_BUFFER_SIZE)
+                stream.write(b'\n')
+                self.tracer.count('open', written=size)
+
+            stream.write(f'commit refs/heads/{branch}\n'
+                         f'author {identity}\ncommitter {identity}\n'
+                         f'data {len(message)}\n'.encode('utf-8') + message)
+            for mark, rel_path in enumerate(files, 1):
+                mode = '100755' if os.access(
+                    str(self.proj_dir / rel_path), os.X_OK) else '100644'
+                stream.write(f'M {mode} :{mark} {_git_quote(rel_path)}\n'
+                             .encode('utf-8'))
+            stream.write(b'done\n')
+            stream.close()
+        except BaseException:
+            importer.kill()
+            importer.wait()
+            raise
+        if importer.wait() != 0:
+            raise subprocess.CalledProcessError(importer.returncode,
+                                                importer.args)
+
+        # Fill the index so the working tree shows as clean.
+        subprocess.run([GIT, 'read-tree', branch], cwd=str(self.proj_dir),
+                       check=True, stdin=subprocess.DEVNULL)
+
+    def _moved(self, path: pathlib.PosixPath):
+        """Return where 'path' ends up once the staging directory is
+        published."""
+        try:
+            return self._final_dir / path.relative_to(self.proj_dir)
+        except ValueError:
+            return path
+
+    @_traced
+    def create_conda_env(self, yml_file_path: str or pathlib.PosixPath = None,
+                         timeout: float = None):
+        """Creates a conda environment from a .yml file for a project.
+
+        Args:
+            yml_file_path (strorpathlib.PosixPath, optional):\
+                [description]. Defaults to None. If None the project's own \
+                environment.yml is used, rendered from the \
+                environment.yml.template file of the templates directory \
+                when the project has none. Concurrent builds therefore never \
+                share a spec file.
+
+            timeout (float, optional):\
+                seconds conda may run for. Defaults to None (no limit).
+
+        Raises:
+            TypeError: if the path provided is not an absolute path.
+            TypeError: the path input is not to a .yml file.
+            FileNotFoundError: if the path provided does not exist.
+            subprocess.CalledProcessError: if conda fails.
+            subprocess.TimeoutExpired: if conda runs past the timeout.
+
+        Returns:
+            pathlib.PosixPath: path to the environment created.
+        """
+        return self.start_conda_env(yml_file_path, timeout).result()
+
+    @_traced
+    def start_conda_env(self, yml_file_path: str or pathlib.PosixPath = None,
+                        timeout: float = None):
+        """Start creating a conda environment in the background.
+
+        Args:
+            yml_file_path (str or pathlib.PosixPath, optional):\
+                see create_conda_env.
+
+            timeout (float, optional): see create_conda_env.
+
+        Raises:
+            TypeError: if the path provided is not an absolute path.
+            TypeError: the path input is not to a .yml file.
+            FileNotFoundError: if the path provided does not exist.
+
+        Returns:
+            EnvJob: handle to wait for the environment with.
+        """
+        create_loc = self.proj_dir / 'env'
+
+        if yml_file_path is None:
+            yml_file_path = self.proj_dir / 'environment.yml'
+            if self._path_kind(yml_file_path) is None:
+                self.create_file('environment.yml', template=True,
+                                 temp_dict={'env_name': str(create_loc)})
+                # Like the environment, the spec is not a layout file.
+                self._manifest.pop('environment.yml', None)
+        else:
+            if not yml_file_path.is_absolute():
+                raise TypeError(f'Path entered is not an absolute path.\n'
+                                f'path: {yml_file_path}')
+            if not yml_file_path.suffix == '.yml':
+                raise TypeError(f'Path input is not to a .yml file.\n'
+                                f'{yml_file_path}')
+
+        if not yml_file_path.exists():
+            raise FileNotFoundError(f'No .yml file found at {yml_file_path}')
+
+        if self.conda_cache is None:
+            command = [CONDA, 'env', 'create', '-f', str(yml_file_path),
+                       '--prefix', str(create_loc)]
+        else:
+            command = self.conda_cache.clone_command(create_loc,
+                                                     yml_file_path)
+        command = self._with_requirements(command, create_loc)
+
+        self._log(f'Creating conda environment at {create_loc}\n\n')
+        return self.env_job_factory(command, create_loc, timeout)
+
+    def _with_requirements(self, command: list,
+                           env_dir: pathlib.PosixPath):
+        """Extend an environment command to install the requirements of the
+        layout from the wheelhouse once the environment exists."""
+        if not self._requirements:
+            return command
+        wheelhouse = Wheelhouse() if self.wheelhouse is None \
+            else self.wheelhouse
+        return wheelhouse.install_command(env_dir, self._requirements,
+                                          command)
+
+    @_traced
+    def create_pipenv(self, timeout: float = None):
+        """Creates a python virtual environment in the project directory.
+
+        Args:
+            timeout (float, optional):\
+                seconds venv may run for. Defaults to None (no limit).
+
+        Raises:
+            subprocess.CalledProcessError: if venv fails.
+            subprocess.TimeoutExpired: if venv runs past the timeout.
+
+        Returns:
+            pathlib.PosixPath: path to the environment created.
+        """
+        return self.start_pipenv(timeout).result()
+
+    @_traced
+    def start_pipenv(self, timeout: float = None):
+        """Start creating a python virtual environment in the background.
+
+        Args:
+            timeout (float, optional): see create_pipenv.
+
+        Returns:
+            EnvJob: handle to wait for the environment with.
+        """
+        create_loc = self.proj_dir / 'venv'
+        if self.venv_cache is None:
+            command = [sys.executable, '-m', 'venv', str(create_loc)]
+        else:
+            command = self.venv_cache.clone_command(create_loc)
+        command = self._with_requirements(command, create_loc)
+
+        self._log(f'Creating Pipenv environment at {create_loc}\n\n')
+        return self.env_job_factory(command, create_loc, timeout)
+
+
+class AsyncProjectBuilder(ProjectBuilder):
+    """ProjectBuilder whose build runs the filesystem calls concurrently.
+
+    Notes:
+        Every directory and file of a plan is created on a thread pool as
+        soon as its parent directory exists, so on network storage the
+        round trips of independent steps overlap instead of adding up.
+        Builds of many projects can share one pool to bound the number of
+        calls in flight, e.g. with asyncio.gather().
+
+    Attributes:
+        executor (concurrent.futures.Executor):\
+            pool the filesystem calls run on. None means a pool of \
+            'max_workers' threads is created for each build.
+
+        max_workers (int): threads of the pool created for each build.
+
+        The other attributes are the ProjectBuilder attributes.
+    """
+
+    def __init__(self, *args, executor=None, max_workers: int = 8,
+                 **kwargs):
+        """Instantiate an object.
+
+        Args:
+            executor (concurrent.futures.Executor, optional):\
+                For class attribute 'executor'. Defaults to None.
+
+            max_workers (int, optional):\
+                For class attribute 'max_workers'. Defaults to 8.
+
+            The other arguments are the ProjectBuilder arguments.
+        """
+        super().__init__(*args, **kwargs)
+        self.executor = executor
+        self.max_workers = max_workers
+
+    async def build(self, plan: str or pathlib.PosixPath or BuildPlan,
+                    create_env: bool = True, env_timeout: float = None,
+                    init_git: bool = False):
+        """Create the project directory and run a build plan in it.
+
+        Notes:
+            The environment is created while the files are rendered, \
+            except in a staged build where it waits for publish().
+
+        Args:
+            plan (str or pathlib.PosixPath or BuildPlan):\
+                the plan to run, or a layout to load it from (see \
+                load_layout).
+
+            create_env (bool): see ProjectBuilder.build.
+
+            env_timeout (float, optional): see ProjectBuilder.build.
+
+            init_git (bool): see ProjectBuilder.build.
+
+        Returns:
+            pathlib.PosixPath: path to the project directory.
+        """
+        import asyncio
+
+        if not isinstance(plan, BuildPlan):
+            plan = load_layout(plan)
+        names = self.layout_names()
+        create_env = create_env and plan.env != 'none'
+        self._layout = plan.origin
+        self._requirements = plan.requirements
+
+        executor = self.executor
+        if executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            executor = ThreadPoolExecutor(self.max_workers)
+        loop = asyncio.get_event_loop()
+
+        def run(function, *args, **kwargs):
+            return loop.run_in_executor(
+                executor, functools.partial(function, *args, **kwargs))
+
+        async def create_dir(dir_path: str):
+            parent = dir_tasks.get(str(Path(dir_path).parent))
+            if parent is not None:
+                await parent
+            await run(self.create_dir, dir_path.format(**names))
+
+        async def create_file(step: FileStep):
+            parent = dir_tasks.get(str(Path(step.path).parent))
+            if parent is not None:
+                await parent
+            file_path = Path(step.path.format(**names))
+            if step.source is not None:
+                await run(self.copy_file, file_path.name, step.source,
+                          path=self.proj_dir / file_path.parent)
+                return
+            temp_dict = self._template_dict()
+            temp_dict.update(step.context)
+            await run(self.create_file, filename=file_path.name,
+                      template=True, temp_dict=temp_dict,
+                      temp_name=step.template,
+                      path=self.proj_dir / file_path.parent)
+
+        try:
+            await run(self.create_proj_dir)
+            if create_env and not self.staged:
+                self.env_job = await run(self._start_env, plan.env,
+                                         env_timeout)
+
+            try:
+                # Directories are sorted by depth, so a parent's task
+                # always exists before its children look it up.
+                dir_tasks = {}
+                for dir_path in plan.dirs:
+                    dir_tasks[dir_path] = asyncio.ensure_future(
+                        create_dir(dir_path))
+                tasks = list(dir_tasks.values())
+                tasks += [asyncio.ensure_future(create_file(step))
+                          for step in plan.files]
+
+                # Let every call finish before cleaning up after a failure.
+                results = await asyncio.gather(*tasks,
+                                               return_exceptions=True)
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+                await run(self.publish)
+            except BaseException:
+                await run(self._cancel_env)
+                self.discard()
+                raise
+
+            if init_git:
+                await run(self.init_git)
+
+            if create_env:
+                if self.env_job is None:
+                    self.env_job = await run(self._start_env, plan.env,
+                                             env_timeout)
+                await run(self.env_job.result)
+        finally:
+            if executor is not self.executor:
+                executor.shutdown(wait=False)
+        return self.proj_dir
+
+
+def create_simple_project(path: str or pathlib.PosixPath = None,
+                          proj_name: str = None, author: str = None,
+                          create_env: bool = True, verbose: bool = True,
+                          pipeline: bool = False, env_timeout: float = None,
+                          venv_cache: VenvCache = None, staged: bool = False,
+                          fsync: str = 'never', tracer: Tracer = None,
+                          root: str or pathlib.PosixPath = None,
+                          env_job_factory=None):
+    """Creates a simple project using the ProjectBuilder class.
+
+    Notes:
+        Creates the following files in the project directory:
+        - {{ project_name }}.py : main python script
+        - README.md
+        - TODO.md
+        - LICENSE : MIT License.
+        - test_project.py : pytest python script
+        - setup.py
+        - .gitignore : basic python gitignore.
+        - venv : python 3 virtual environment directory.
+
+        The layout is defined in layouts/simple.toml.
+
+    Args:
+        path (str or pathlib.PosixPath, optional): for class attribute 'path'.
+                                                   Defaults to None.
+
+        proj_name (str, optional):\
+            for class attribute 'proj_name'. Defaults to None. If None, the \
+            names are asked for interactively.
+
+        author (str, optional): for class attribute 'author'.
+
+        create_env (bool):\
+            if True the function creates a virtual environment in the \
+            project folder. Defaults to True.
+
+        verbose (bool): for class attribute 'verbose'. Defaults to True.
+
+        pipeline (bool):\
+            if True the environment is created in the background while the \
+            files are rendered and the function returns without waiting for \
+            it. Wait with 'pb.env_job.result()'. Defaults to False.
+
+        env_timeout (float, optional):\
+            seconds environment creation may take. Defaults to None.
+
+        venv_cache (VenvCache, optional):\
+            for class attribute 'venv_cache'. Defaults to None.
+
+        staged (bool):\
+            for class attribute 'staged'. Defaults to False. The environment \
+            is created once the project is published.
+
+        fsync (str): for class attribute 'fsync'. Defaults to 'never'.
+
+        tracer (Tracer, optional): for class attribute 'tracer'.
+
+        root (str or pathlib.PosixPath, optional):\
+            for class attribute 'root'. Defaults to None.
+
+        env_job_factory (callable, optional):\
+            for class attribute 'env_job_factory'. Defaults to None.
+
+    Returns:
+        ProjectBuilder object: an instantiated ProjectBuilder class object
+                               whose attributes can be used to locate the
+                               project directory.
+    """
+    return build_layout('simple', path=path, proj_name=proj_name,
+                        author=author, create_env=create_env,
+                        verbose=verbose, pipeline=pipeline,
+                        env_timeout=env_timeout, venv_cache=venv_cache,
+                        staged=staged, fsync=fsync, tracer=tracer, root=root,
+                        env_job_factory=env_job_factory)
+
+
+def create_ml_project(path: str or pathlib.PosixPath = None,
+                      create_conda_env: bool = False,
+                      proj_name: str = None, author: str = None,
+                      verbose: bool = True, pipeline: bool = False,
+                      env_timeout: float = None,
+                      conda_cache: CondaEnvCache = None,
+                      staged: bool = False, fsync: str = 'never',
+                      tracer: Tracer = None,
+                      root: str or pathlib.PosixPath = None,
+                      env_job_factory=None):
+    """Creates a basic layout for a machine learning project using
+     ProjectBuilder class.
+
+    Notes:
+        Creates the following file structure:
+
+        project_directory/
+        |
+        ├── data/
+        |
+        ├── tests/
+        |   └── test_project.py: pytest python script
+        |
+        ├── notebooks/
+        |   └── {{ project_name }}.ipynb: main jupyter notebook
+        |
+        ├── env/ : conda environment for the project
         |
         ├── README.md
         ├── TODO.md
         ├── LICENSE: MIT License.
         └── .gitignore: basic python gitignore.
 
+        The layout is defined in layouts/ml.toml.
+
+    Args:
+        path (str or pathlib.PosixPath, optional):\
+            for class attribute 'path'. Defaults to None.
+
+        create_conda_env (bool):\
+            if True the function creates a conda environment in the project \
+            folder. Default to False.
+
+        proj_name (str, optional):\
+            for class attribute 'proj_name'. Defaults to None. If None, the \
+            names are asked for interactively.
+
+        author (str, optional): for class attribute 'author'.
+
+        verbose (bool): for class attribute 'verbose'. Defaults to True.
+
+        pipeline (bool):\
+            if True the conda environment is created in the background \
+            while the files are rendered and the function returns without \
+            waiting for it. Wait with 'ml_pb.env_job.result()'. Defaults to \
+            False.
+
+        env_timeout (float, optional):\
+            seconds environment creation may take. Defaults to None.
+
+        conda_cache (CondaEnvCache, optional):\
+            for class attribute 'conda_cache'. Defaults to None.
+
+        staged (bool):\
+            for class attribute 'staged'. Defaults to False. The environment \
+            is created once the project is published.
+
+        fsync (str): for class attribute 'fsync'. Defaults to 'never'.
+
+        tracer (Tracer, optional): for class attribute 'tracer'.
+
+        root (str or pathlib.PosixPath, optional):\
+            for class attribute 'root'. Defaults to None.
+
+        env_job_factory (callable, optional):\
+            for class attribute 'env_job_factory'. Defaults to None.
+
+    Returns:
+        ProjectBuilder object:
+            an instantiated ProjectBuilder class object whose attributes can
+             be used to locate the project directory.
+    """
+    return build_layout('ml', path=path, proj_name=proj_name,
+                        author=author, create_env=create_conda_env,
+                        verbose=verbose, pipeline=pipeline,
+                        env_timeout=env_timeout, conda_cache=conda_cache,
+                        staged=staged, fsync=fsync, tracer=tracer, root=root,
+                        env_job_factory=env_job_factory)
+
+
+def build_layout(layout: str or pathlib.PosixPath or BuildPlan,
+                 path: str or pathlib.PosixPath = None, proj_name: str = None,
+                 author: str = None, create_env: bool = True,
+                 verbose: bool = True, pipeline: bool = False,
+                 env_timeout: float = None, venv_cache: VenvCache = None,
+                 conda_cache: CondaEnvCache = None, staged: bool = False,
+                 fsync: str = 'never', tracer: Tracer = None,
+                 root: str or pathlib.PosixPath = None,
+                 template_dir: str or pathlib.PosixPath = None,
+                 env_job_factory=None, blob_store: BlobStore = None,
+                 init_git: bool = False, wheelhouse: Wheelhouse = None):
+    """Creates a project from a layout using the ProjectBuilder class.
+
+    Args:
+        layout (str or pathlib.PosixPath or BuildPlan):\
+            layout name or file (see load_layout) or a compiled plan.
+
+        create_env (bool):\
+            if True the environment of the layout is created. Defaults to \
+            True.
+
+        pipeline (bool): see ProjectBuilder.build.
+
+        env_timeout (float, optional): see ProjectBuilder.build.
+
+        init_git (bool): see ProjectBuilder.build.
+
+        The other arguments are the ProjectBuilder arguments.
+
+    Returns:
+        ProjectBuilder object:
+            an instantiated ProjectBuilder class object whose attributes can
+            be used to locate the project directory.
+    """
+    if not isinstance(layout, BuildPlan):
+        layout = load_layout(layout)
+
+    pb = ProjectBuilder(path=path, proj_name=proj_name, author=author,
+                        verbose=verbose, venv_cache=venv_cache,
+                        conda_cache=conda_cache, staged=staged, fsync=fsync,
+                        tracer=tracer, root=root, template_dir=template_dir,
+                        env_job_factory=env_job_factory,
+                        blob_store=blob_store, wheelhouse=wheelhouse)
+    pb.build(layout, create_env=create_env, pipeline=pipeline,
+             env_timeout=env_timeout, init_git=init_git)
+    return pb
+
+
+def archive_layout(layout: str or pathlib.PosixPath or BuildPlan, dest,
+                   proj_name: str, author: str = None, fmt: str = None,
+                   create_env: bool = True, verbose: bool = True,
+                   tracer: Tracer = None,
+                   template_dir: str or pathlib.PosixPath = None):
+    """Streams the project of a layout into an archive using the
+    ProjectBuilder class.
+
     Args:
-        path (str or pathlib.PosixPath, optional):\
-            for class attribute 'path'. Defaults to None.
+        layout (str or pathlib.PosixPath or BuildPlan):\
+            layout name or file (see load_layout) or a compiled plan.
 
-        create_conda_env (bool):\
-            if True the function creates a conda environment in the project \
-            folder. Default to False.
+        dest, fmt and create_env: see ProjectBuilder.archive.
+
+        The other arguments are the ProjectBuilder arguments.
 
     Returns:
-        ProjectBuilder object:
-            an instantiated ProjectBuilder class object whose attributes can
-             be used to locate the project directory.
+        ProjectBuilder object: the instantiated ProjectBuilder class object.
+    """
+    if not isinstance(layout, BuildPlan):
+        layout = load_layout(layout)
+
+    pb = ProjectBuilder(proj_name=proj_name, author=author, verbose=verbose,
+                        tracer=tracer, template_dir=template_dir)
+    pb.archive(layout, dest, fmt=fmt, create_env=create_env)
+    return pb
+
+
+def create_project_env(proj_dir: str or pathlib.PosixPath,
+                       verbose: bool = True, env_timeout: float = None,
+                       venv_cache: VenvCache = None,
+                       conda_cache: CondaEnvCache = None,
+                       root: str or pathlib.PosixPath = None,
+                       env_job_factory=None, wheelhouse: Wheelhouse = None):
+    """Create the environment recorded in the manifest of an extracted
+    project archive (see ProjectBuilder.archive).
+
+    Args:
+        proj_dir (str or pathlib.PosixPath): path to the project directory.
+
+        env_timeout (float, optional): see ProjectBuilder.build.
+
+        The other arguments are the ProjectBuilder arguments.
+
+    Raises:
+        FileNotFoundError: if the project has no manifest.
+
+    Returns:
+        pathlib.PosixPath: path to the environment created, None if the \
+            manifest records no environment.
+    """
+    import json
+
+    proj_dir = Path(proj_dir).resolve()
+    try:
+        manifest = json.loads((proj_dir / MANIFEST_NAME).read_text())
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No {MANIFEST_NAME} found in {proj_dir}')
+
+    env = manifest.get('env')
+    if env is None:
+        return None
+
+    pb = ProjectBuilder(path=proj_dir.parent,
+                        proj_name=manifest['project_name'],
+                        author=manifest['author'], verbose=verbose,
+                        venv_cache=venv_cache, conda_cache=conda_cache,
+                        root=root, env_job_factory=env_job_factory,
+                        wheelhouse=wheelhouse)
+    pb.proj_dir = proj_dir
+    pb._requirements = tuple(manifest.get('requirements', ()))
+    env_path = pb._start_env(env, env_timeout).result()
+
+    pb._layout = manifest['layout']
+    pb._manifest = manifest['files']
+    pb._write_manifest()
+    return env_path
+
+
+async def build_layout_async(layout: str or pathlib.PosixPath or BuildPlan,
+                             path: str or pathlib.PosixPath = None,
+                             proj_name: str = None, author: str = None,
+                             create_env: bool = True, verbose: bool = True,
+                             env_timeout: float = None, executor=None,
+                             max_workers: int = 8, init_git: bool = False,
+                             **kwargs):
+    """Creates a project from a layout using the AsyncProjectBuilder class.
+
+    Args:
+        layout (str or pathlib.PosixPath or BuildPlan): see build_layout.
+
+        create_env (bool): see build_layout.
+
+        env_timeout (float, optional): see ProjectBuilder.build.
+
+        init_git (bool): see ProjectBuilder.build.
+
+        The other arguments are the AsyncProjectBuilder arguments.
+
+    Returns:
+        AsyncProjectBuilder object:
+            an instantiated AsyncProjectBuilder class object whose attributes
+            can be used to locate the project directory.
+    """
+    pb = AsyncProjectBuilder(path=path, proj_name=proj_name, author=author,
+                             verbose=verbose, executor=executor,
+                             max_workers=max_workers, **kwargs)
+    await pb.build(layout, create_env=create_env, env_timeout=env_timeout,
+                   init_git=init_git)
+    return pb
+
+
+# File recording the packages of a workspace.
+WORKSPACE_NAME = '.auto_pb-workspace.json'
+
+# Layout files a workspace holds once for all of its packages.
+WORKSPACE_FILES = ('.gitignore', 'LICENSE')
+
+# Directory of the shared environment, by environment type.
+_ENV_DIRS = {'venv': 'venv', 'conda': 'env'}
+
+
+class Workspace:
+    """Monorepo of many packages sharing one environment and top-level files.
+
+    Notes:
+        The workspace root is built from the 'workspace' layout and holds
+        the only environment and the WORKSPACE_FILES. Packages are built
+        under 'packages/' from any other layout, without those files or an
+        environment of their own. Adding a package only builds that package,
+        installs the requirements the environment does not have yet (see
+        Wheelhouse) and lists it in a '.pth' file of the environment, so
+        each package can be imported without installing it.
+
+    Attributes:
+        root (pathlib.PosixPath): path to the workspace directory.
+
+        author (str): author of the packages.
+
+        env (str): type of the shared environment, one of ENV_TYPES.
+
+        packages (dict): layout name of each package, by package name.
+
+        requirements (list): requirements installed in the environment.
+
+        wheelhouse (Wheelhouse):\
+            cache requirements are installed from. None means a Wheelhouse \
+            in CACHE_DIR.
+    """
+
+    def __init__(self, root: str or pathlib.PosixPath,
+                 wheelhouse: Wheelhouse = None):
+        """Open an existing workspace.
+
+        Args:
+            root (str or pathlib.PosixPath): For class attribute 'root'.
+
+            wheelhouse (Wheelhouse, optional):\
+                For class attribute 'wheelhouse'. Defaults to None.
+
+        Raises:
+            FileNotFoundError: if the directory is not a workspace.
+        """
+        import json
+
+        self.root = Path(root).resolve()
+        self.wheelhouse = wheelhouse
+        try:
+            meta = json.loads((self.root / WORKSPACE_NAME).read_text())
+        except FileNotFoundError:
+            raise FileNotFoundError(f'No {WORKSPACE_NAME} found in '
+                                    f'{self.root}')
+        self.author = meta['author']
+        self.env = meta['env']
+        self.packages = meta['packages']
+        self.requirements = meta['requirements']
+
+    @classmethod
+    def create(cls, path: str or pathlib.PosixPath, name: str,
+               author: str = None, env: str = 'venv', packages: list = (),
+               create_env: bool = True, verbose: bool = True,
+               wheelhouse: Wheelhouse = None, **kwargs):
+        """Create a workspace and its packages.
+
+        Args:
+            path (str or pathlib.PosixPath):\
+                directory to create the workspace directory in.
+
+            name (str): name of the workspace directory.
+
+            author (str, optional): author of the workspace and packages.
+
+            env (str):\
+                type of the shared environment, one of ENV_TYPES. Defaults \
+                to 'venv'.
+
+            packages (list):\
+                (name, layout) of each package to add (see add_packages).
+
+            create_env (bool):\
+                if True the shared environment is created. Defaults to True.
+
+            verbose (bool): see ProjectBuilder. Defaults to True.
+
+            wheelhouse (Wheelhouse, optional):\
+                For class attribute 'wheelhouse'. Defaults to None.
+
+            **kwargs: other ProjectBuilder arguments of the root.
+
+        Raises:
+            ValueError: if the environment type is not known.
+
+        Returns:
+            Workspace: the new workspace.
+        """
+        import json
+
+        if env not in ENV_TYPES:
+            raise ValueError(f'Unknown environment type: {env}')
+
+        pb = ProjectBuilder(path=path, proj_name=name, author=author,
+                            verbose=verbose, wheelhouse=wheelhouse, **kwargs)
+        plan = load_layout('workspace')._replace(env=env)
+        pb.build(plan, create_env=False)
+        meta = {'version': 1, 'author': pb.author, 'env': env,
+                'packages': {}, 'requirements': []}
+        (pb.proj_dir / WORKSPACE_NAME).write_text(json.dumps(meta, indent=1))
+
+        if create_env and env != 'none':
+            pb._start_env(env).result()
+
+        workspace = cls(pb.proj_dir, wheelhouse)
+        workspace.add_packages(packages, verbose=verbose)
+        return workspace
+
+    @property
+    def env_dir(self):
+        """pathlib.PosixPath: path to the shared environment, None if there \
+        is none."""
+        env_dir = self.root / _ENV_DIRS.get(self.env, 'venv')
+        return env_dir if self.env != 'none' and env_dir.is_dir() else None
+
+    def add(self, name: str, layout: str or pathlib.PosixPath or BuildPlan =
+            'simple', verbose: bool = True):
+        """Add one package to the workspace (see add_packages).
+
+        Returns:
+            ProjectBuilder object: the builder of the package.
+        """
+        return self.add_packages([(name, layout)], verbose=verbose)[0]
+
+    def add_packages(self, packages: list, verbose: bool = True):
+        """Add packages to the workspace.
+
+        Args:
+            packages (list):\
+                (name, layout) of each package. The layout is a layout name \
+                or file or a compiled plan (see load_layout).
+
+            verbose (bool): see ProjectBuilder. Defaults to True.
+
+        Raises:
+            ValueError: if a package name is not valid or used twice.
+            FileExistsError: if the workspace has a package of that name.
+            subprocess.CalledProcessError: if installing requirements fails.
+
+        Returns:
+            list: the ProjectBuilder object of each package.
+        """
+        packages = list(packages)
+        names = [name for name, _ in packages]
+        for problem in validate_project_names(names, unique=True):
+            raise ValueError(f'Invalid package name {problem.name!r}: '
+                             f'{problem.message}')
+        for name in names:
+            if name in self.packages:
+                raise FileExistsError(f'Package exists: {name}')
+
+        builders = []
+        requirements = []
+        try:
+            for name, layout in packages:
+                plan = layout if isinstance(layout, BuildPlan) \
+                    else load_layout(layout)
+                plan = plan._replace(env='none', files=tuple(
+                    step for step in plan.files
+                    if step.path not in WORKSPACE_FILES))
+
+                pb = ProjectBuilder(path=self.root / 'packages',
+                                    proj_name=name, author=self.author,
+                                    verbose=verbose, staged=True)
+                pb.build(plan, create_env=False)
+                builders.append(pb)
+                self.packages[name] = plan.name
+                requirements += [requirement
+                                 for requirement in plan.requirements
+                                 if requirement not in self.requirements and
+                                 requirement not in requirements]
+        finally:
+            # Record, link and install the packages built so far, even when
+            # a later one fails.
+            env_dir = self.env_dir
+            if env_dir is not None:
+                self._link_packages(env_dir)
+            self._save()
+            if env_dir is not None and requirements:
+                wheelhouse = Wheelhouse() if self.wheelhouse is None \
+                    else self.wheelhouse
+                wheelhouse.install(env_dir, requirements)
+                self.requirements += requirements
+                self._save()
+        return builders
+
+    def _link_packages(self, env_dir: pathlib.PosixPath):
+        """List the package directories in a '.pth' file of the
+        environment."""
+        site_packages = next(env_dir.glob('lib/python*/site-packages'), None)
+        if site_packages is None:
+            return
+        lines = ''.join(f'{self.root / "packages" / name}\n'
+                        for name in sorted(self.packages))
+        (site_packages / 'auto_pb_workspace.pth').write_text(lines)
+
+    def _save(self):
+        """Write the workspace file."""
+        import json
+
+        meta = {'version': 1, 'author': self.author, 'env': self.env,
+                'packages': self.packages, 'requirements': self.requirements}
+        tmp_path = self.root / f'.{WORKSPACE_NAME}.tmp'
+        tmp_path.write_text(json.dumps(meta, indent=1, sort_keys=True))
+        os.replace(str(tmp_path), str(self.root / WORKSPACE_NAME))
+
+
+def update_project(proj_dir: str or pathlib.PosixPath,
+                   layout: str or pathlib.PosixPath or BuildPlan = None,
+                   author: str = None, verbose: bool = True,
+                   template_dir: str or pathlib.PosixPath = None):
+    """Update a generated project after its templates or layout changed.
+
+    Args:
+        proj_dir (str or pathlib.PosixPath): path to the project directory.
+
+        layout (str or pathlib.PosixPath or BuildPlan, optional):\
+            see ProjectBuilder.update.
+
+        author (str, optional):\
+            new author name. Defaults to None. If None, the author recorded \
+            in the manifest is kept.
+
+        verbose (bool): for class attribute 'verbose'. Defaults to True.
+
+        template_dir (str or pathlib.PosixPath, optional):\
+            for class attribute 'template_dir'. Defaults to None.
+
+    Raises:
+        FileNotFoundError: if the project has no manifest.
+
+    Returns:
+        dict: status of each layout file (see ProjectBuilder.update).
+    """
+    import json
+
+    proj_dir = Path(proj_dir).resolve()
+    try:
+        manifest = json.loads((proj_dir / MANIFEST_NAME).read_text())
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No {MANIFEST_NAME} found in {proj_dir}')
+
+    if author is None:
+        author = manifest['author']
+    pb = ProjectBuilder(path=proj_dir.parent,
+                        proj_name=manifest['project_name'], author=author,
+                        verbose=verbose, template_dir=template_dir)
+    pb.proj_dir = proj_dir
+    return pb.update(layout)
+
+
+def read_manifest(manifest: str or pathlib.PosixPath):
+    """Read the rows of a bulk build manifest one at a time.
+
+    Notes:
+        A '.csv' manifest needs a header row. Any other file is read as JSON
+        lines, one object per line. The recognised columns are 'name',
+        'author', 'layout' (see load_layout), 'path' and 'git' ('true' to
+        commit the project to a new git repository). Blank lines are
+        skipped.
+
+    Args:
+        manifest (str or pathlib.PosixPath): path to the manifest file.
+
+    Yields:
+        dict: a manifest row.
+    """
+    import json
+
+    manifest = Path(manifest)
+
+    with manifest.open('r', newline='') as f:
+        if manifest.suffix == '.csv':
+            import csv
+
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# Tracer and blob store of the builds run by this bulk build worker process.
+_bulk_tracer = Tracer()
+_bulk_blob_store = None
+
+
+def _init_bulk_worker(bytecode_cache_dir: str = None, trace: str = None,
+                      trace_format: str = 'jsonl',
+                      blob_store: BlobStore = None):
+    """Warm the template cache of a bulk build worker process."""
+    global _bulk_tracer, _bulk_blob_store
+    _bulk_tracer = Tracer(trace, trace_format)
+    _bulk_blob_store = blob_store
+
+    if bytecode_cache_dir is not None:
+        configure_template_cache(bytecode_cache_dir=bytecode_cache_dir)
+
+    for template_name in sorted(os.listdir(str(TEMPLATE_DIR))):
+        get_template(TEMPLATE_DIR, template_name)
+
+
+def build_project(row: dict, create_env: bool = False,
+                  tracer: Tracer = None, blob_store: BlobStore = None):
+    """Build the project described by a manifest row without any prompts.
+
+    Args:
+        row (dict):\
+            the 'name', 'author', 'layout', 'path' and 'git' of the project \
+            (see read_manifest).
+
+        create_env (bool):\
+            if True an environment is created for the project. Defaults to \
+            False.
+
+        tracer (Tracer, optional): records the build. Defaults to None.
+
+        blob_store (BlobStore, optional):\
+            store the generated files are deduplicated in. Defaults to None.
+
+    Returns:
+        dict: the project name, whether the build succeeded and either the \
+            project directory or the error raised.
+    """
+    name = row.get('name')
+    result = {'name': name}
+
+    try:
+        if not isinstance(name, str):
+            raise TypeError('Manifest row has no project name.')
+
+        pb = build_layout(row.get('layout') or 'simple',
+                          path=row.get('path') or None, proj_name=name,
+                          author=row.get('author'), create_env=create_env,
+                          verbose=False, tracer=tracer,
+                          blob_store=blob_store,
+                          init_git=str(row.get('git')).lower() in
+                          ('true', '1', 'yes'))
+    except Exception as error:
+        result.update(ok=False, error=f'{type(error).__name__}: {error}')
+    else:
+        result.update(ok=True, proj_dir=str(pb.proj_dir))
+    return result
+
+
+def _build_manifest_row(index: int, row: dict, create_env: bool):
+    """Build one manifest row and tag the result with the row index."""
+    result = {'row': index}
+    result.update(build_project(row, create_env, _bulk_tracer,
+                                _bulk_blob_store))
+    return result
+
+
+def build_from_manifest(manifest: str or pathlib.PosixPath or list,
+                        processes: int = None, create_env: bool = False,
+                        bytecode_cache_dir: str = None, trace: str = None,
+                        trace_format: str = 'jsonl',
+                        blob_store: BlobStore = None):
+    """Build every project in a manifest without any interactive input.
+
+    Notes:
+        Rows are read lazily and only a few rows per worker are in flight at
+        any time, so memory use does not grow with the size of the manifest.
+        Results are yielded in the order the builds finish.
+
+    Args:
+        manifest (str or pathlib.PosixPath or list):\
+            path to a manifest file (see read_manifest) or an iterable of \
+            manifest rows.
+
+        processes (int, optional):\
+            number of worker processes. Defaults to None. If None, the \
+            number of CPUs is used. If 1, projects are built in this process.
+
+        create_env (bool):\
+            if True an environment is created for every project. Defaults \
+            to False.
+
+        bytecode_cache_dir (str, optional):\
+            on-disk template bytecode cache shared by the workers.
+
+        trace (str, optional):\
+            file every worker appends the spans of its builds to (see \
+            Tracer). Defaults to None, no trace is recorded.
+
+        trace_format (str): see Tracer. Defaults to 'jsonl'.
+
+        blob_store (BlobStore, optional):\
+            store the generated files of every project are deduplicated in. \
+            Defaults to None.
+
+    Yields:
+        dict: the result of each row (see build_project) and its 'row' index.
+    """
+    if isinstance(manifest, (str, pathlib.PurePath)):
+        manifest = read_manifest(manifest)
+    rows = enumerate(manifest)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if trace is not None:
+        # Start the trace here so the workers only ever append events.
+        tracer = Tracer(trace, trace_format)
+        tracer.start()
+        tracer.close()
+
+    if processes == 1:
+        _init_bulk_worker(bytecode_cache_dir, trace, trace_format, blob_store)
+        for index, row in rows:
+            yield _build_manifest_row(index, row, create_env)
+        return
+
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor
+    from concurrent.futures import as_completed, wait
+
+    max_pending = processes * 4
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=_init_bulk_worker,
+                             initargs=(bytecode_cache_dir, trace,
+                                       trace_format,
+                                       blob_store)) as executor:
+        pending = set()
+        for index, row in rows:
+            pending.add(executor.submit(_build_manifest_row, index, row,
+                                        create_env))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        for future in as_completed(pending):
+            yield future.result()
+
+
+def default_socket():
+    """Return the Unix socket used by the build server when no other path is
+    given.
+
+    Notes:
+        The socket is put in $XDG_RUNTIME_DIR when it is set, otherwise in a
+        directory of the temporary directory that only the user can access.
+    """
+    import tempfile
+
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return Path(runtime_dir) / 'auto_pb.sock'
+    return Path(tempfile.gettempdir()) / f'auto_pb-{os.getuid()}' / \
+        'build.sock'
+
+
+def _private_dir(path: pathlib.PosixPath):
+    """Create a directory only the user can access, or check that an
+    existing one is.
+
+    Raises:
+        PermissionError: if the directory is not the user's or others can \
+            access it.
+    """
+    import stat
+
+    try:
+        path.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or \
+            info.st_mode & 0o077:
+        raise PermissionError(f'{path} is not a private directory.')
+
+
+def _remove_stale_socket(socket_path: pathlib.PosixPath):
+    """Remove a socket no server listens on any more.
+
+    Raises:
+        FileExistsError: if the path is not a socket or a server answers on \
+            it.
+    """
+    import stat
+
+    try:
+        info = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(info.st_mode):
+        raise FileExistsError(f'{socket_path} exists and is not a socket.')
+
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except ConnectionRefusedError:
+            socket_path.unlink()
+            return
+    raise FileExistsError(f'A build server is listening on {socket_path}.')
+
+
+def _handle_build_requests(handler):
+    """Answer each JSON line sent to the build server with a JSON result."""
+    import json
+
+    for line in handler.rfile:
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('Build request is not a JSON object.')
+        except ValueError as error:
+            result = {'ok': False,
+                      'error': f'{type(error).__name__}: {error}'}
+        else:
+            result = build_project(row, bool(row.get('create_env')),
+                                   handler.server.tracer)
+        handler.wfile.write(json.dumps(result).encode() + b'\n')
+
+
+def make_build_server(socket_path: str or pathlib.PosixPath = None,
+                      bytecode_cache_dir: str = None, trace: str = None,
+                      trace_format: str = 'jsonl'):
+    """Create a build server listening on a Unix socket.
+
+    Notes:
+        Every template is compiled before the server is returned and stays
+        compiled for the life of the process. Each connection is handled in
+        its own thread and may send any number of build requests, one JSON
+        object per line (see build_project). A 'create_env' key in the
+        request asks for the project's environment to be created.
+
+    Args:
+        socket_path (str or pathlib.PosixPath, optional):\
+            path of the socket. Defaults to None. If None, the path given \
+            by default_socket is used. A socket no server listens on any \
+            more is removed.
+
+        bytecode_cache_dir (str, optional):\
+            on-disk template bytecode cache used to warm the server.
+
+        trace (str, optional):\
+            file the spans of every build are appended to (see Tracer). \
+            Defaults to None, no trace is recorded.
+
+        trace_format (str): see Tracer. Defaults to 'jsonl'.
+
+    Raises:
+        FileExistsError: if a server already listens on the socket or \
+            something other than a socket is at its path.
+        PermissionError: if the directory of the default socket is not \
+            private to the user.
+
+    Returns:
+        socketserver.ThreadingUnixStreamServer: server ready for \
+            serve_forever().
+    """
+    if socket_path is None:
+        socket_path = default_socket()
+        _private_dir(socket_path.parent)
+    socket_path = Path(socket_path)
+    _remove_stale_socket(socket_path)
+
+    _init_bulk_worker(bytecode_cache_dir)
+
+    import socketserver
+
+    class BuildRequestHandler(socketserver.StreamRequestHandler):
+        handle = _handle_build_requests
+
+    server = socketserver.ThreadingUnixStreamServer(str(socket_path),
+                                                    BuildRequestHandler)
+    server.daemon_threads = True
+    server.tracer = Tracer(trace, trace_format)
+    return server
+
+
+def request_build(row: dict, socket_path: str or pathlib.PosixPath = None,
+                  timeout: float = None, fallback: bool = True):
+    """Ask the build server to build a project.
+
+    Args:
+        row (dict): the build request (see build_project).
+
+        socket_path (str or pathlib.PosixPath, optional):\
+            path of the server socket. Defaults to None. If None, the path \
+            given by default_socket is used.
+
+        timeout (float, optional): seconds to wait for the server.
+
+        fallback (bool):\
+            if True the project is built in this process when no server is \
+            running. Defaults to True.
+
+    Raises:
+        ConnectionError: if no server is running and fallback is False.
+        PermissionError: if the socket belongs to another user.
+
+    Returns:
+        dict: the result of the build (see build_project).
+    """
+    import json
+
+    socket_path = Path(socket_path or default_socket())
+    row = dict(row)
+    # The server has its own working directory, so use the default path of
+    # this process.
+    if not row.get('path'):
+        row['path'] = str(Path.cwd().parent)
+
+    import socket
+
+    try:
+        # Only send the build to a server run by this user.
+        if os.lstat(socket_path).st_uid != os.getuid():
+            raise PermissionError(f'{socket_path} belongs to another user.')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(socket_path))
+            sock.sendall(json.dumps(row).encode() + b'\n')
+            with sock.makefile('rb') as response:
+                line = response.readline()
+    except (FileNotFoundError, ConnectionError):
+        if not fallback:
+            raise ConnectionError('No build server is running.')
+        return build_project(row, bool(row.get('create_env')))
+
+    if not line:
+        raise ConnectionError('The build server closed the connection.')
+    return json.loads(line)
+
+
+def main(argv: list = None):
+    """Command line entry point.
+
+    Without arguments a simple project is created interactively. The 'bulk'
+    command builds every project in a manifest and writes one JSON result per
+    line to stdout. The 'serve' command runs a build server and the 'build'
+    command sends one project to it, building in this process when no server
+    is running.
+
+    Returns:
+        int: exit status, 1 if any project failed to build.
     """
-    ml_pb = ProjectBuilder(path=path)
-    ml_pb.create_proj_dir()
+    import argparse
+    import json
+    import subprocess
+
+    parser = argparse.ArgumentParser(prog='auto_pb',
+                                     description='Create new projects.')
+    commands = parser.add_subparsers(dest='command')
+
+    bulk = commands.add_parser('bulk', help='build projects from a manifest')
+    bulk.add_argument('manifest', help='CSV or JSON lines manifest file')
+    bulk.add_argument('-p', '--processes', type=int, default=None,
+                      help='number of worker processes')
+    bulk.add_argument('--create-env', action='store_true',
+                      help='create an environment for every project')
+    bulk.add_argument('--bytecode-cache', default=None,
+                      help='directory for the template bytecode cache')
+    bulk.add_argument('--trace', default=None,
+                      help='file the build trace is appended to')
+    bulk.add_argument('--trace-format', choices=TRACE_FORMATS,
+                      default='jsonl', help='format of the build trace')
+    bulk.add_argument('--blob-store', default=None,
+                      help='directory of a store deduplicating the files')
+    bulk.add_argument('--hardlink', action='store_true',
+                      help='hard link files to the store instead of copying')
+
+    validate = commands.add_parser('validate',
+                                   help='check the project names of a '
+                                   'manifest')
+    validate.add_argument('manifest', help='CSV or JSON lines manifest file')
+    validate.add_argument('--unique', action='store_true',
+                          help='report names used more than once')
+    validate.add_argument('--path', default=None,
+                          help='report names existing in this directory')
+
+    serve = commands.add_parser('serve', help='run a build server')
+    serve.add_argument('--socket', default=None,
+                       help='path of the server socket')
+    serve.add_argument('--bytecode-cache', default=None,
+                       help='directory for the template bytecode cache')
+    serve.add_argument('--trace', default=None,
+                       help='file the build trace is appended to')
+    serve.add_argument('--trace-format', choices=TRACE_FORMATS,
+                       default='jsonl', help='format of the build trace')
+
+    build = commands.add_parser('build', help='build one project')
+    build.add_argument('name', help='name of the project')
+    build.add_argument('-a', '--author', default='',
+                       help='full name of the author')
+    build.add_argument('-l', '--layout', default='simple',
+                       help='built-in layout name or layout file')
+    build.add_argument('--path', default=None,
+                       help='directory to create the project in')
+    build.add_argument('--create-env', action='store_true',
+                       help='create an environment for the project')
+    build.add_argument('--git', action='store_true',
+                       help='commit the project to a new git repository')
+    build.add_argument('--socket', default=None,
+                       help='path of the server socket')
+
+    clone = commands.add_parser('clone-venv',
+                                help='clone a cached virtual environment')
+    clone.add_argument('dest', help='path of the new environment')
+    clone.add_argument('--cache-dir', default=None,
+                       help='directory holding the cached environments')
+    clone.add_argument('-r', '--requirement', action='append', default=[],
+                       help='pip requirement installed in the environment')
+    clone.add_argument('--without-pip', action='store_true',
+                       help='create the environment without pip')
+    clone.add_argument('--hardlink', action='store_true',
+                       help='hard link files instead of copying them')
+    clone.add_argument('--max-size', type=int, default=None,
+                       help='bytes the cache may hold')
+    clone.add_argument('--max-age', type=float, default=None,
+                       help='seconds an unused environment is kept for')
+
+    clone_conda = commands.add_parser('clone-conda-env',
+                                      help='clone a cached conda environment')
+    clone_conda.add_argument('dest', help='path of the new environment')
+    clone_conda.add_argument('spec', help='environment.yml file')
+    clone_conda.add_argument('--cache-dir', default=None,
+                             help='directory holding the cached environments')
+    clone_conda.add_argument('--conda', default=None,
+                             help='conda executable')
+    clone_conda.add_argument('--max-entries', type=int, default=None,
+                             help='environments the cache may hold')
+    clone_conda.add_argument('--max-age', type=float, default=None,
+                             help='seconds an unused environment is kept for')
+
+    update = commands.add_parser('update',
+                                 help='re-render files whose template changed')
+    update.add_argument('proj_dir', help='path of the project directory')
+    update.add_argument('-l', '--layout', default=None,
+                        help='layout name or file, if it changed')
+    update.add_argument('-a', '--author', default=None,
+                        help='new full name of the author')
+
+    archive = commands.add_parser('archive',
+                                  help='stream a project into an archive')
+    archive.add_argument('name', help='name of the project')
+    archive.add_argument('-o', '--output', default='-',
+                         help='archive file, - for stdout')
+    archive.add_argument('-a', '--author', default='',
+                         help='full name of the author')
+    archive.add_argument('-l', '--layout', default='simple',
+                         help='built-in layout name or layout file')
+    archive.add_argument('--format', choices=ARCHIVE_FORMATS, default=None,
+                         help='archive format, by default from the file name')
+    archive.add_argument('--no-env', action='store_true',
+                         help='do not record the environment to create')
+
+    env = commands.add_parser('env', help='create the environment recorded '
+                              'in an extracted project')
+    env.add_argument('proj_dir', help='path of the project directory')
+
+    wheels = commands.add_parser('wheelhouse',
+                                 help='fetch the wheels of requirements')
+    wheels.add_argument('-r', '--requirement', action='append', default=[],
+                        help='pip requirement, may be repeated')
+    wheels.add_argument('--cache-dir', default=None,
+                        help='directory holding the wheels')
+    wheels.add_argument('--find-links', action='append', default=[],
+                        help='extra place pip looks for distributions in')
+    wheels.add_argument('--python', default=None,
+                        help='interpreter of the environment the wheels are '
+                        'for')
+
+    install = commands.add_parser('install-wheels',
+                                  help='install requirements from the '
+                                  'wheelhouse into an environment')
+    install.add_argument('env_dir', help='path of the environment')
+    install.add_argument('--create-command', default=None,
+                         help='JSON list, command creating the environment')
+    install.add_argument('-r', '--requirement', action='append', default=[],
+                         help='pip requirement, may be repeated')
+    install.add_argument('--cache-dir', default=None,
+                         help='directory holding the wheels')
+    install.add_argument('--find-links', action='append', default=[],
+                         help='extra place pip looks for distributions in')
+
+    workspace = commands.add_parser('workspace',
+                                    help='create a workspace of packages '
+                                    'sharing one environment')
+    workspace.add_argument('name', help='name of the workspace')
+    workspace.add_argument('--path', default=None,
+                           help='directory to create the workspace in')
+    workspace.add_argument('-a', '--author', default='',
+                           help='full name of the author')
+    workspace.add_argument('--env', choices=ENV_TYPES, default='venv',
+                           help='type of the shared environment')
+    workspace.add_argument('-p', '--package', action='append', default=[],
+                           help='NAME or NAME:LAYOUT of a package, may be '
+                           'repeated')
+
+    add_package = commands.add_parser('add-package',
+                                      help='add a package to a workspace')
+    add_package.add_argument('workspace', help='path of the workspace')
+    add_package.add_argument('name', help='name of the package')
+    add_package.add_argument('-l', '--layout', default='simple',
+                             help='built-in layout name or layout file')
+
+    blobs = commands.add_parser('blobs',
+                                help='maintain a store of generated files')
+    blobs.add_argument('action', choices=('verify', 'gc'),
+                       help='remove corrupted or unused blobs')
+    blobs.add_argument('--store', default=None,
+                       help='directory of the store')
+
+    precompile = commands.add_parser('precompile',
+                                     help='compile templates into modules')
+    precompile.add_argument('--template-dir', default=None,
+                            help='directory of the templates')
+
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        create_simple_project()
+        return 0
+
+    if args.command == 'validate':
+        names = (row.get('name') for row in read_manifest(args.manifest))
+        failed = False
+        for problem in validate_project_names(names, unique=args.unique,
+                                              path=args.path):
+            failed = True
+            sys.stdout.write(json.dumps(dict(problem._asdict(),
+                                             message=problem.message)) + '\n')
+        return 1 if failed else 0
+
+    if args.command == 'serve':
+        with make_build_server(args.socket, args.bytecode_cache, args.trace,
+                               args.trace_format) as server:
+            print(f'Serving builds on {server.server_address}')
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                Path(server.server_address).unlink()
+        return 0
+
+    if args.command == 'clone-venv':
+        cache = VenvCache(args.cache_dir, requirements=args.requirement,
+                          with_pip=not args.without_pip,
+                          hardlink=args.hardlink, max_size=args.max_size,
+                          max_age=args.max_age)
+        cache.clone(args.dest)
+        return 0
+
+    if args.command == 'clone-conda-env':
+        cache = CondaEnvCache(args.cache_dir, conda_exe=args.conda,
+                              max_entries=args.max_entries,
+                              max_age=args.max_age)
+        cache.clone(args.dest, args.spec)
+        return 0
+
+    if args.command == 'update':
+        status = update_project(args.proj_dir, layout=args.layout,
+                                author=args.author, verbose=False)
+        sys.stdout.write(json.dumps(status, indent=1) + '\n')
+        return 0
+
+    if args.command == 'archive':
+        dest = sys.stdout.buffer if args.output == '-' else args.output
+        archive_layout(args.layout, dest, args.name, author=args.author,
+                       fmt=args.format, create_env=not args.no_env,
+                       verbose=False)
+        return 0
+
+    if args.command == 'env':
+        create_project_env(args.proj_dir, verbose=False)
+        return 0
 
-    files = ['README.md',
-             'TODO.md',
-             'LICENSE',
-             '.gitignore']
+    if args.command == 'wheelhouse':
+        wheelhouse = Wheelhouse(args.cache_dir, args.find_links)
+        entry = wheelhouse.populate(args.requirement, args.python)
+        sys.stdout.write(f'{entry}\n')
+        return 0
 
-    for filename in files:
-        ml_pb.create_file(filename=filename, template=True)
+    if args.command == 'install-wheels':
+        if args.create_command is not None:
+            subprocess.run(json.loads(args.create_command), check=True)
+        wheelhouse = Wheelhouse(args.cache_dir, args.find_links)
+        wheelhouse.install(args.env_dir, args.requirement)
+        return 0
 
-    dirs = ['data',
-            'tests',
-            'notebooks']
+    if args.command == 'workspace':
+        packages = [(package.partition(':')[0],
+                     package.partition(':')[2] or 'simple')
+                    for package in args.package]
+        path = Path.cwd() if args.path is None else Path(args.path).resolve()
+        workspace = Workspace.create(path, args.name, author=args.author,
+                                     env=args.env, packages=packages,
+                                     verbose=False)
+        sys.stdout.write(f'{workspace.root}\n')
+        return 0
 
-    for dir_name in dirs:
-        ml_pb.create_dir(dir_name=dir_name)
+    if args.command == 'add-package':
+        pb = Workspace(args.workspace).add(args.name, args.layout,
+                                           verbose=False)
+        sys.stdout.write(f'{pb.proj_dir}\n')
+        return 0
 
-    # Create main jupyter notebook.
-    notebook = f'{ml_pb.proj_name.lower()}.ipynb'
-    path = ml_pb.proj_dir / 'notebooks'
-    ml_pb.create_file(filename=notebook, template=True,
-                      temp_name='jupyter.ipynb.template',
-                      path=path)
+    if args.command == 'blobs':
+        store = BlobStore(args.store)
+        removed = store.verify() if args.action == 'verify' else store.gc()
+        sys.stdout.write(json.dumps(removed, indent=1) + '\n')
+        return 0
 
-    # Create test python file
-    name = ml_pb.proj_name.replace('-', '_').lower()
-    test_filename = f'test_{name}.py'
-    path = ml_pb.proj_dir / 'tests'
+    if args.command == 'precompile':
+        target = precompile_templates(args.template_dir)
+        sys.stdout.write(f'{target}\n')
+        return 0
 
-    ml_pb.create_file(filename=test_filename, template=True,
-                      temp_name='test_project.py.template',
-                      path=path)
+    if args.command == 'build':
+        row = {'name': args.name, 'author': args.author,
+               'layout': args.layout, 'path': args.path,
+               'create_env': args.create_env, 'git': args.git}
+        result = request_build(row, socket_path=args.socket)
+        sys.stdout.write(json.dumps(result) + '\n')
+        return 0 if result['ok'] else 1
 
-    if create_conda_env:
-        ml_pb.create_conda_env()
+    blob_store = None
+    if args.blob_store is not None or args.hardlink:
+        blob_store = BlobStore(args.blob_store, hardlink=args.hardlink)
 
-    return ml_pb
+    failed = False
+    for result in build_from_manifest(args.manifest,
+                                      processes=args.processes,
+                                      create_env=args.create_env,
+                                      bytecode_cache_dir=args.bytecode_cache,
+                                      trace=args.trace,
+                                      trace_format=args.trace_format,
+                                      blob_store=blob_store):
+        failed = failed or not result['ok']
+        sys.stdout.write(json.dumps(result) + '\n')
+    return 1 if failed else 0
 
 
 if __name__ == '__main__':
-    create_simple_project()
+    sys.exit(main())
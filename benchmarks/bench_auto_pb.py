@@ -0,0 +1,238 @@
+"""Benchmarks the speed of project generation.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_auto_pb --output results.json
+    python -m benchmarks.bench_auto_pb --baseline results.json
+
+Environment creation is replaced by a stub, so only the work done by
+auto_pb itself is measured. Results are written as JSON. When a baseline is
+given, the median time of every scenario is compared against it and the
+exit status is 1 if any scenario got slower than the tolerance allows.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from itertools import count
+from pathlib import Path
+
+from auto_pb import ProjectBuilder
+from auto_pb import create_simple_project, create_ml_project
+from auto_pb import build_from_manifest, configure_template_cache
+from auto_pb import load_layout
+
+
+class StubEnvJob:
+    """Stands in for EnvJob so no environment is created.
+
+    Attributes:
+        command (list): the command that would create the environment.
+        location (pathlib.PosixPath): path to the environment directory.
+    """
+
+    def __init__(self, command, location, timeout=None):
+        self.command = command
+        self.location = location
+        self.output = ''
+        location.mkdir()
+
+    def done(self):
+        return True
+
+    def result(self):
+        return self.location
+
+    def kill(self):
+        pass
+
+
+def render_layout(layout: str):
+    """Render every file of a layout in memory, without writing anything."""
+    pb = ProjectBuilder(proj_name='bench-render',
+                        author='Bench Mark', verbose=False)
+    names = pb.layout_names()
+    for step in load_layout(layout).files:
+        template_name = step.template or \
+            Path(step.path.format(**names)).name + '.template'
+        temp_dict = pb._template_dict()
+        temp_dict.update(step.context)
+        pb._get_template(template_name).render(temp_dict)
+
+
+def scenarios(out_dir: Path, bulk: int, processes: int):
+    """Return the benchmark scenarios.
+
+    Args:
+        out_dir (pathlib.PosixPath): directory projects are built in.
+        bulk (int): number of projects built by the bulk scenario.
+        processes (int): worker processes of the bulk scenario.
+
+    Notes:
+        The template scenarios only render, so comparing 'template_warm'
+        with 'full_io' gives the cost of the filesystem calls.
+
+    Returns:
+        dict: name -> (function run once per repeat, projects per run).
+    """
+    names = count()
+
+    def simple_project():
+        create_simple_project(root=out_dir, proj_name=f'simple-{next(names)}',
+                              author='Bench Mark', verbose=False,
+                              env_job_factory=StubEnvJob)
+
+    def ml_project():
+        create_ml_project(root=out_dir, create_conda_env=True,
+                          proj_name=f'ml-{next(names)}', author='Bench Mark',
+                          verbose=False, env_job_factory=StubEnvJob)
+
+    def template_cold():
+        configure_template_cache()
+        render_layout('simple')
+
+    def template_warm():
+        render_layout('simple')
+
+    def full_io():
+        create_simple_project(root=out_dir, proj_name=f'io-{next(names)}',
+                              author='Bench Mark', create_env=False,
+                              verbose=False)
+
+    def bulk_build():
+        rows = [{'name': f'bulk-{next(names)}', 'path': str(out_dir)}
+                for _ in range(bulk)]
+        for result in build_from_manifest(rows, processes=processes):
+            if not result['ok']:
+                raise RuntimeError(result['error'])
+
+    return {'simple_project': (simple_project, 1),
+            'ml_project': (ml_project, 1),
+            'template_cold': (template_cold, 1),
+            'template_warm': (template_warm, 1),
+            'full_io': (full_io, 1),
+            'bulk_build': (bulk_build, bulk)}
+
+
+def run(repeat: int = 20, bulk: int = 50, processes: int = None,
+        only: list = None):
+    """Run the benchmarks.
+
+    Args:
+        repeat (int): number of timed runs of each scenario. Defaults to 20.
+
+        bulk (int):\
+            number of projects built by each run of the bulk scenario. \
+            Defaults to 50.
+
+        processes (int, optional):\
+            worker processes of the bulk scenario. Defaults to None. If \
+            None, the number of CPUs is used.
+
+        only (list, optional):\
+            names of the scenarios to run. Defaults to None, all of them.
+
+    Returns:
+        dict: the machine and the timings of every scenario.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        benches = scenarios(Path(out_dir), bulk, processes)
+        for name, (bench, projects) in benches.items():
+            if only and name not in only:
+                continue
+
+            # One untimed run so every scenario but the cold one starts warm.
+            bench()
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                bench()
+                times.append(time.perf_counter() - start)
+
+            median = statistics.median(times)
+            results[name] = {'runs': repeat,
+                             'min': min(times),
+                             'median': median,
+                             'mean': statistics.mean(times),
+                             'projects_per_second': projects / median}
+
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results}
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.25):
+    """Compare results against a baseline.
+
+    Args:
+        results (dict): output of run().
+        baseline (dict): earlier output of run().
+        tolerance (float):\
+            fraction by which a median time may exceed the baseline. \
+            Defaults to 0.25.
+
+    Returns:
+        list: (name, baseline median, median) of each slower scenario.
+    """
+    regressions = []
+    for name, result in results['results'].items():
+        before = baseline['results'].get(name)
+        if before is not None and \
+                result['median'] > before['median'] * (1 + tolerance):
+            regressions.append((name, before['median'], result['median']))
+    return regressions
+
+
+def main(argv: list = None):
+    """Command line entry point.
+
+    Returns:
+        int: exit status, 1 if a scenario is slower than the baseline.
+    """
+    parser = argparse.ArgumentParser(prog='bench_auto_pb',
+                                     description='Benchmark auto_pb.')
+    parser.add_argument('-r', '--repeat', type=int, default=20,
+                        help='timed runs of each scenario')
+    parser.add_argument('--bulk', type=int, default=50,
+                        help='projects built by each bulk run')
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='worker processes of the bulk scenario')
+    parser.add_argument('--only', action='append', default=None,
+                        help='scenario to run, may be repeated')
+    parser.add_argument('-o', '--output', default=None,
+                        help='file the JSON results are written to')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.bulk, args.processes, args.only)
+    output = json.dumps(results, indent=1) + '\n'
+    if args.output is None:
+        sys.stdout.write(output)
+    else:
+        Path(args.output).write_text(output)
+
+    for name, result in results['results'].items():
+        sys.stderr.write(f'{name:16} {result["median"] * 1e3:10.3f} ms '
+                         f'{result["projects_per_second"]:10.1f} projects/s\n')
+
+    if args.baseline is None:
+        return 0
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    regressions = compare(results, baseline, args.tolerance)
+    for name, before, after in regressions:
+        sys.stderr.write(f'REGRESSION {name}: {before * 1e3:.3f} ms -> '
+                         f'{after * 1e3:.3f} ms\n')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,58 +1,101 @@
 """Tests functions in auto-pb.py using PyTests."""
 
 # import pytest
-from tests.tud_test_base import set_keyboard_input
+from tests.tud_test_base import get_display_output, set_keyboard_input
 from auto_pb import ProjectBuilder
 from auto_pb import create_simple_project, create_ml_project
+from auto_pb import configure_template_cache, get_template_env
+from auto_pb import build_from_manifest, read_manifest
+from auto_pb import make_build_server, request_build
+from auto_pb import CondaEnvCache, EnvJob, VenvCache
+from auto_pb import canonical_env_spec
+from auto_pb import build_layout, compile_layout, load_layout
+from auto_pb import update_project
+from auto_pb import Tracer
+from auto_pb import TEMPLATE_DIR
+from auto_pb import FastTemplate, get_template
+from auto_pb import STREAM_BUFFER_SIZE
+from auto_pb import BlobStore
+from auto_pb import archive_layout, create_project_env
+from auto_pb import AsyncProjectBuilder, build_layout_async
+from auto_pb import Wheelhouse
+from auto_pb import NotebookTemplate
+from auto_pb import NAME_PROBLEMS, project_name_problem, name_problem_text
+from auto_pb import validate_project_names
+from auto_pb import main
+from auto_pb import Workspace
+from auto_pb import precompile_templates
+from benchmarks.bench_auto_pb import compare, run
 from pathlib import Path
-from shutil import rmtree
+import json
+import os
+import socket
+from shutil import copytree, rmtree, which
 import subprocess
+import sys
+import tempfile
+import threading
+import time
 import pytest
 
 
+class FakeEnvJob:
+    """Stand-in for EnvJob that only creates the environment directory."""
+
+    def __init__(self, command, location, timeout=None):
+        self.command = command
+        self.location = location
+        self.timeout = timeout
+        self.output = ''
+        location.mkdir()
+
+    def done(self):
+        return True
+
+    def result(self):
+        return self.location
+
+    def kill(self):
+        pass
+
+
 # Part of code Refactoring
 @pytest.fixture()
-def pb():
+def pb(tmp_path):
     set_keyboard_input(['test', 'RaDroid'])
-    pb = ProjectBuilder()
-    yield pb
-    if pb.proj_dir is not None and pb.proj_dir.exists():
-        rmtree(pb.proj_dir)
+    return ProjectBuilder(root=tmp_path, env_job_factory=FakeEnvJob)
 
 
 @pytest.fixture(scope="module")
-def sim_proj():
+def sim_proj(tmp_path_factory):
     """Uses the create_simple_project() method from the auto_pb module and
     returns a ProjectBuilder instance."""
     set_keyboard_input(['simple-project', 'RaDroid'])
-    sim_proj = create_simple_project()
-    yield sim_proj
-    rmtree(sim_proj.proj_dir)
+    return create_simple_project(root=tmp_path_factory.mktemp('sim_proj'),
+                                 env_job_factory=FakeEnvJob)
 
 
 @pytest.fixture(scope="module")
-def ml_proj():
+def ml_proj(tmp_path_factory):
     """Uses the create_ml_project() method from the auto_pb module and returns a
     ProjectBuilder instance."""
     set_keyboard_input(['machine-learning-project', 'RaDroid'])
-    ml_proj = create_ml_project()
-    yield ml_proj
-    rmtree(ml_proj.proj_dir)
+    return create_ml_project(root=tmp_path_factory.mktemp('ml_proj'),
+                             env_job_factory=FakeEnvJob)
 
 
 # Test Milestone 1. First User Input
-def test_instantiating_path_error_1():
-    path = Path.cwd() / 'non_existant'
+def test_instantiating_path_error_1(tmp_path):
+    path = tmp_path / 'non_existant'
     with pytest.raises(FileNotFoundError):
         ProjectBuilder(path)
 
 
-def test_instantiating_path_error_2():
-    path = Path.cwd() / 'test.txt'
+def test_instantiating_path_error_2(tmp_path):
+    path = tmp_path / 'test.txt'
     path.touch()
     with pytest.raises(TypeError):
         ProjectBuilder(path)
-    path.unlink()
 
 
 def test_instantiating_error_1():
@@ -85,10 +128,26 @@ def test_instantiating_right_2():
     assert pb.path == path
 
 
-def test_instantiating_right_3(pb):
+def test_instantiating_right_3():
+    set_keyboard_input(['test', 'RaDroid'])
+    pb = ProjectBuilder()
     assert pb.path == Path.cwd().parent
 
 
+def test_instantiating_root(pb, tmp_path):
+    assert pb.path == tmp_path
+
+
+def test_instantiating_root_outside(tmp_path):
+    (tmp_path / 'root' / 'inner').mkdir(parents=True)
+    pb = ProjectBuilder(path=tmp_path / 'root' / 'inner', proj_name='test',
+                        author='RaDroid', root=tmp_path / 'root')
+    assert pb.path == tmp_path / 'root' / 'inner'
+    with pytest.raises(ValueError):
+        ProjectBuilder(path=tmp_path, proj_name='test', author='RaDroid',
+                       root=tmp_path / 'root')
+
+
 def test_instantiating_right_4(pb):
     names_tup = pb.proj_name, pb.author
     assert names_tup == ('test', 'RaDroid')
@@ -100,9 +159,9 @@ def test_create_proj_dir_creation_1(pb):
     assert new_dir.exists()
 
 
-def test_create_proj_dir_creation_2(pb):
+def test_create_proj_dir_creation_2(pb, tmp_path):
     new_dir = pb.create_proj_dir()
-    assert new_dir == Path.cwd().parent / 'test'
+    assert new_dir == tmp_path / 'test'
 
 
 # Test Milestone 3a. Create Readme.md
@@ -204,14 +263,14 @@ def test_sim_proj_venv_exists(sim_proj):
 
 
 # Test Milestone 10. Simplify directory creation and Refactor
-def test_valid_path_error_1(pb):
+def test_valid_path_error_1(pb, tmp_path):
     with pytest.raises(FileNotFoundError):
-        pb.valid_path(Path.cwd())
+        pb.valid_path(tmp_path)
 
 
-def test_valid_path_error_2(pb):
+def test_valid_path_error_2(pb, tmp_path):
     pb.create_proj_dir()
-    path = Path.cwd() / 'does-not-exist'
+    path = tmp_path / 'does-not-exist'
     with pytest.raises(FileNotFoundError):
         pb.valid_path(path)
 
@@ -290,6 +349,14 @@ def test_ml_proj_gitignore_exists(ml_proj):
     assert path.exists()
 
 
+def test_ml_proj_root_holds_only_project(tmp_path):
+    ml_pb = create_ml_project(root=tmp_path, create_conda_env=True,
+                              proj_name='contained', author='RaDroid',
+                              env_job_factory=FakeEnvJob)
+    assert list(tmp_path.iterdir()) == [ml_pb.proj_dir]
+    assert (ml_pb.proj_dir / 'environment.yml').is_file()
+
+
 def ml_proj_conda_env():
     set_keyboard_input(['machine-learning-project-2', 'RaDroid'])
     ml_proj = create_ml_project(create_conda_env=True)
@@ -304,3 +371,1474 @@ def ml_proj_conda_env():
     finally:
         if ml_proj.proj_dir.exists():
             rmtree(ml_proj.proj_dir)
+
+
+# Test Milestone 16. Shared compiled-template cache.
+def test_template_cache_shared():
+    env = get_template_env(TEMPLATE_DIR)
+    assert env is get_template_env(TEMPLATE_DIR)
+    assert env.get_template('LICENSE.template') is \
+        env.get_template('LICENSE.template')
+
+
+def test_template_cache_reload(tmp_path):
+    template = tmp_path / 'hello.template'
+    template.write_text('Hello {{ name }}')
+    env = get_template_env(tmp_path)
+    assert env.get_template('hello.template').render(name='A') == 'Hello A'
+
+    template.write_text('Bye {{ name }}')
+    os.utime(template, (0, 0))
+    assert env.get_template('hello.template').render(name='A') == 'Bye A'
+
+
+def test_template_cache_bytecode(tmp_path):
+    configure_template_cache(bytecode_cache_dir=tmp_path / 'bytecode')
+    try:
+        env = get_template_env(TEMPLATE_DIR)
+        env.get_template('TODO.md.template')
+        assert list((tmp_path / 'bytecode').iterdir())
+    finally:
+        configure_template_cache()
+
+
+# Test Milestone 17. Headless bulk project generation.
+def test_headless_project(tmp_path):
+    pb = create_simple_project(path=tmp_path, proj_name='headless',
+                               author='RaDroid', create_env=False)
+    assert (pb.proj_dir / 'headless.py').exists()
+    assert not (pb.proj_dir / 'venv').exists()
+
+
+def test_headless_invalid_name(tmp_path):
+    with pytest.raises(ValueError):
+        ProjectBuilder(path=tmp_path, proj_name='-bad', author='RaDroid')
+
+
+def test_read_manifest_csv(tmp_path):
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text('name,author,layout\nproj-a,RaDroid,simple\n')
+    rows = list(read_manifest(manifest))
+    assert rows == [{'name': 'proj-a', 'author': 'RaDroid',
+                     'layout': 'simple'}]
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_build_from_manifest(tmp_path, processes):
+    manifest = tmp_path / 'manifest.jsonl'
+    rows = [{'name': 'proj-a', 'author': 'RaDroid', 'layout': 'simple',
+             'path': str(tmp_path)},
+            {'name': 'proj-b', 'author': 'RaDroid', 'layout': 'ml',
+             'path': str(tmp_path)},
+            {'name': '-bad', 'author': 'RaDroid', 'path': str(tmp_path)}]
+    manifest.write_text('\n'.join(json.dumps(row) for row in rows))
+
+    results = sorted(build_from_manifest(manifest, processes=processes),
+                     key=lambda result: result['row'])
+    assert [result['ok'] for result in results] == [True, True, False]
+    assert (tmp_path / 'proj-a' / 'setup.py').exists()
+    assert (tmp_path / 'proj-b' / 'notebooks').is_dir()
+    assert results[2]['error'].startswith('ValueError')
+
+
+def test_concurrent_conda_builds(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    def build(name):
+        return build_layout('ml', path=tmp_path, proj_name=name,
+                            author='RaDroid', verbose=False, root=tmp_path,
+                            pipeline=True, env_job_factory=FakeEnvJob)
+
+    names = ['ml-{}'.format(index) for index in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        built = list(pool.map(build, names))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == names
+    for pb in built:
+        spec = pb.proj_dir / 'environment.yml'
+        assert str(pb.proj_dir / 'env') in spec.read_text()
+        assert str(spec) in pb.env_job.command
+        assert 'environment.yml' not in json.loads(
+            (pb.proj_dir / '.auto_pb.json').read_text())['files']
+
+
+# Test Milestone 18. Scaffolding daemon.
+@pytest.fixture
+def socket_path():
+    # AF_UNIX paths are limited to about 104 bytes, too few for tmp_path on
+    # macOS.
+    socket_dir = tempfile.mkdtemp(dir='/tmp')
+    yield Path(socket_dir) / 'build.sock'
+    rmtree(socket_dir)
+
+
+def test_build_server(tmp_path, socket_path):
+    server = make_build_server(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with pytest.raises(FileExistsError):
+            make_build_server(socket_path)
+        result = request_build({'name': 'served', 'author': 'RaDroid',
+                                'path': str(tmp_path)},
+                               socket_path=socket_path, fallback=False)
+        bad = request_build({'name': 'not valid', 'path': str(tmp_path)},
+                            socket_path=socket_path, fallback=False)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert result == {'name': 'served', 'ok': True,
+                      'proj_dir': str(tmp_path / 'served')}
+    assert (tmp_path / 'served' / 'README.md').exists()
+    assert not bad['ok']
+
+
+def test_build_server_concurrent_requests(tmp_path, socket_path,
+                                          monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr('auto_pb.EnvJob', FakeEnvJob)
+    server = make_build_server(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    rows = [{'name': 'served-{}'.format(index), 'author': 'RaDroid',
+             'layout': 'ml', 'create_env': True, 'path': str(tmp_path)}
+            for index in range(8)]
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda row: request_build(row, socket_path=socket_path,
+                                          fallback=False), rows))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert all(result['ok'] for result in results), results
+    for row in rows:
+        proj_dir = tmp_path / row['name']
+        assert (proj_dir / 'env').is_dir()
+        assert str(proj_dir / 'env') in \
+            (proj_dir / 'environment.yml').read_text()
+
+
+def test_build_server_socket_path(socket_path):
+    socket_path.write_text('not a socket')
+    with pytest.raises(FileExistsError):
+        make_build_server(socket_path)
+    assert socket_path.read_text() == 'not a socket'
+
+    socket_path.unlink()
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(socket_path))
+    stale.close()
+    server = make_build_server(socket_path)
+    server.server_close()
+
+
+def test_build_server_fallback(tmp_path):
+    row = {'name': 'in-process', 'path': str(tmp_path)}
+    result = request_build(row, socket_path=tmp_path / 'missing.sock')
+    assert result['ok']
+    assert (tmp_path / 'in-process' / 'setup.py').exists()
+
+    with pytest.raises(ConnectionError):
+        request_build(row, socket_path=tmp_path / 'missing.sock',
+                      fallback=False)
+
+
+# Test Milestone 19. Pipelined environment creation.
+def test_env_job_result(tmp_path):
+    job = EnvJob([sys.executable, '-c', 'print("made")'], tmp_path)
+    assert job.result() == tmp_path
+    assert job.done()
+    assert job.output.strip() == 'made'
+
+
+def test_env_job_error(tmp_path):
+    job = EnvJob([sys.executable, '-c', 'import sys; sys.exit(3)'], tmp_path)
+    with pytest.raises(subprocess.CalledProcessError):
+        job.result()
+
+
+def test_env_job_timeout(tmp_path):
+    job = EnvJob([sys.executable, '-c', 'import time; time.sleep(10)'],
+                 tmp_path, timeout=0.2)
+    with pytest.raises(subprocess.TimeoutExpired):
+        job.result()
+
+
+def test_env_job_large_output(tmp_path):
+    # More output than a pipe holds does not stall the command.
+    job = EnvJob([sys.executable, '-c', 'print("x" * 200000)'], tmp_path)
+    deadline = time.monotonic() + 10
+    while not job.done() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.done()
+    assert job.result() == tmp_path
+    assert len(job.output) == 200001
+
+
+def test_env_job_killed_on_failure(tmp_path):
+    jobs = []
+
+    def start(command, location, timeout=None):
+        jobs.append(EnvJob([sys.executable, '-c',
+                            'import time; time.sleep(10)'], location))
+        return jobs[-1]
+
+    layout = compile_layout({'env': 'venv', 'files': [
+        {'name': 'README.md', 'template': 'missing.template'}]})
+    with pytest.raises(FileNotFoundError):
+        build_layout(layout, path=tmp_path, proj_name='failed',
+                     verbose=False, pipeline=True, env_job_factory=start)
+    assert jobs[0].done() and jobs[0]._process.returncode < 0
+
+    with pytest.raises(FileNotFoundError):
+        run_async(build_layout_async(layout, path=tmp_path,
+                                     proj_name='failed-async', verbose=False,
+                                     env_job_factory=start))
+    assert jobs[1].done() and jobs[1]._process.returncode < 0
+
+
+def test_pipelined_project(tmp_path):
+    pb = create_simple_project(path=tmp_path, proj_name='pipelined',
+                               author='RaDroid', pipeline=True,
+                               env_job_factory=FakeEnvJob)
+    assert (pb.proj_dir / 'README.md').exists()
+    assert pb.env_job.result() == pb.proj_dir / 'venv'
+    assert pb.env_job.command[1:] == ['-m', 'venv', str(pb.proj_dir / 'venv')]
+
+
+# Test Milestone 20. Golden virtual environment cache.
+@pytest.fixture()
+def venv_cache(tmp_path):
+    return VenvCache(tmp_path / 'cache', with_pip=False)
+
+
+def test_venv_cache_clone(tmp_path, venv_cache):
+    dest = venv_cache.clone(tmp_path / 'venv')
+    golden, meta = venv_cache.golden()
+
+    assert str(dest) in (dest / 'pyvenv.cfg').read_text()
+    assert meta['prefix'] not in (dest / 'bin' / 'activate').read_text()
+    prefix = subprocess.check_output([str(dest / 'bin' / 'python'), '-c',
+                                      'import sys; print(sys.prefix)'])
+    assert prefix.decode().strip() == str(dest)
+
+
+def test_venv_cache_reused(tmp_path, venv_cache):
+    venv_cache.clone(tmp_path / 'venv-1')
+    golden, _ = venv_cache.golden()
+    venv_cache.clone(tmp_path / 'venv-2')
+    assert list(venv_cache.cache_dir.iterdir()) == [golden.parent]
+
+
+def test_venv_cache_evict(venv_cache):
+    venv_cache.golden()
+    venv_cache.max_age = 0
+    assert venv_cache.evict() == [venv_cache.key]
+    assert not list(venv_cache.cache_dir.iterdir())
+
+
+def test_sim_proj_venv_cache(tmp_path, venv_cache):
+    pb = create_simple_project(path=tmp_path, proj_name='cached',
+                               author='RaDroid', venv_cache=venv_cache)
+    assert (pb.proj_dir / 'venv' / 'bin' / 'python').exists()
+
+
+# Test Milestone 21. Conda environment cache.
+STUB_CONDA = '''#!{python}
+"""Stand-in for conda recording its calls."""
+import shutil
+import sys
+from pathlib import Path
+
+args = sys.argv[1:]
+with open({log!r}, 'a') as log:
+    log.write(' '.join(args[:2]) + '\\n')
+prefix = Path(args[args.index('--prefix') + 1])
+if args[:2] == ['env', 'create']:
+    prefix.mkdir(parents=True)
+    (prefix / 'conda-meta').mkdir()
+else:
+    shutil.copytree(args[args.index('--clone') + 1], str(prefix))
+'''
+
+
+@pytest.fixture()
+def conda_cache(tmp_path):
+    stub = tmp_path / 'conda'
+    stub.write_text(STUB_CONDA.format(python=sys.executable,
+                                      log=str(tmp_path / 'conda.log')))
+    stub.chmod(0o755)
+    return CondaEnvCache(tmp_path / 'cache', conda_exe=str(stub))
+
+
+def test_canonical_env_spec():
+    spec_1 = 'name: a\ndependencies:\n  - numpy\n  - pandas\nprefix: a\n'
+    spec_2 = 'name: b\ndependencies:\n  - pandas\n  - numpy\nprefix: b\n'
+    assert CondaEnvCache.spec_key(spec_1) == CondaEnvCache.spec_key(spec_2)
+
+    # Nested pip lists are sorted with their item, channel order is kept.
+    spec_1 = ('channels:\n  - conda-forge\n  - defaults\ndependencies:\n'
+              '  - pip:\n    - b\n    - a\n  - python=3.8\n')
+    spec_2 = ('channels:\n  - conda-forge\n  - defaults\ndependencies:\n'
+              '  - python=3.8\n  # pinned\n  - pip:\n    - a\n    - b\n')
+    assert canonical_env_spec(spec_1) == canonical_env_spec(spec_2) == \
+        'channels:\n  - conda-forge\n  - defaults\ndependencies:\n' \
+        '  - pip:\n    - a\n    - b\n  - python=3.8'
+    swapped = spec_1.replace('conda-forge', 'x').replace('defaults',
+                                                         'conda-forge')
+    assert canonical_env_spec(spec_1) != \
+        canonical_env_spec(swapped.replace('x', 'defaults'))
+
+
+def test_conda_cache_clone(tmp_path, conda_cache):
+    spec = tmp_path / 'environment.yml'
+    spec.write_text('name: x\ndependencies:\n  - numpy\n')
+    conda_cache.clone(tmp_path / 'env-1', spec)
+    conda_cache.clone(tmp_path / 'env-2', spec)
+
+    calls = (tmp_path / 'conda.log').read_text().splitlines()
+    assert calls == ['env create', 'create --clone', 'create --clone']
+    assert (tmp_path / 'env-2' / 'conda-meta').is_dir()
+
+
+def test_conda_cache_evict(tmp_path, conda_cache):
+    conda_cache.max_entries = 1
+    for number in range(2):
+        spec = tmp_path / f'environment-{number}.yml'
+        spec.write_text(f'dependencies:\n  - package-{number}\n')
+        conda_cache.golden(spec)
+    assert len(list(conda_cache.cache_dir.glob('*/meta.json'))) == 1
+
+
+def test_ml_proj_conda_cache(tmp_path, conda_cache):
+    for name in ['ml-cached-1', 'ml-cached-2']:
+        ml_pb = create_ml_project(root=tmp_path, create_conda_env=True,
+                                  proj_name=name, author='RaDroid',
+                                  conda_cache=conda_cache)
+        assert (ml_pb.proj_dir / 'env' / 'conda-meta').is_dir()
+
+    calls = (tmp_path / 'conda.log').read_text().splitlines()
+    assert calls.count('env create') == 1
+
+
+# Test Milestone 22. Staged builds.
+def test_staged_build(tmp_path):
+    pb = ProjectBuilder(path=tmp_path, proj_name='staged', author='RaDroid',
+                        staged=True)
+    staging_dir = pb.create_proj_dir()
+    pb.create_file('README.md', template=True)
+    assert not (tmp_path / 'staged').exists()
+
+    assert pb.publish() == tmp_path / 'staged'
+    assert (tmp_path / 'staged' / 'README.md').exists()
+    assert not staging_dir.exists()
+
+
+def test_staged_build_discard(tmp_path):
+    pb = ProjectBuilder(path=tmp_path, proj_name='staged', author='RaDroid',
+                        staged=True)
+    pb.create_proj_dir()
+    pb.discard()
+    assert not list(tmp_path.iterdir())
+
+
+def test_staged_build_exists(tmp_path):
+    (tmp_path / 'staged').mkdir()
+    pb = ProjectBuilder(path=tmp_path, proj_name='staged', author='RaDroid',
+                        staged=True)
+    with pytest.raises(FileExistsError):
+        pb.create_proj_dir()
+
+
+@pytest.mark.parametrize('renameat2', [True, False])
+def test_staged_build_publish_race(tmp_path, monkeypatch, renameat2):
+    if not renameat2:
+        monkeypatch.setattr('auto_pb._renameat2', lambda: None)
+    pb = ProjectBuilder(path=tmp_path, proj_name='staged', author='RaDroid',
+                        staged=True, verbose=False)
+    staging_dir = pb.create_proj_dir()
+    pb.create_file('README.md', template=True)
+    # An empty directory created during the build is not replaced.
+    (tmp_path / 'staged').mkdir()
+    with pytest.raises(FileExistsError):
+        pb.publish()
+    assert not list((tmp_path / 'staged').iterdir())
+    assert (staging_dir / 'README.md').exists()
+
+
+@pytest.mark.parametrize('fsync', ['file', 'tree'])
+def test_staged_ml_proj(tmp_path, fsync):
+    ml_pb = create_ml_project(path=tmp_path, proj_name='staged-ml',
+                              author='RaDroid', staged=True, fsync=fsync)
+    assert list(tmp_path.iterdir()) == [tmp_path / 'staged-ml']
+    assert ml_pb.proj_dir == tmp_path / 'staged-ml'
+    assert (ml_pb.proj_dir / 'tests' / 'test_staged_ml.py').exists()
+
+
+def test_fsync_policy_error(tmp_path):
+    with pytest.raises(ValueError):
+        ProjectBuilder(path=tmp_path, proj_name='test', fsync='sometimes')
+
+
+# Test Milestone 23. Directory snapshot.
+def test_snapshot_no_stat(tmp_path, monkeypatch):
+    pb = ProjectBuilder(path=tmp_path, proj_name='snapshot', author='RaDroid')
+    pb.create_proj_dir()
+    tests_dir = pb.create_dir('tests')
+
+    stat_calls = []
+    path_stat = Path.stat
+
+    def counting_stat(self, *args, **kwargs):
+        stat_calls.append(self)
+        return path_stat(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, 'stat', counting_stat)
+    pb.create_file('README.md', template=True)
+    pb.create_file('test_snapshot.py', template=True,
+                   temp_name='test_project.py.template', path=tests_dir)
+    assert stat_calls == []
+
+    with pytest.raises(FileExistsError):
+        pb.valid_path(filename='README.md')
+
+
+def test_snapshot_exclusive_create(tmp_path):
+    pb = ProjectBuilder(path=tmp_path, proj_name='snapshot', author='RaDroid')
+    pb.create_proj_dir()
+    (pb.proj_dir / 'TODO.md').write_text('not from the builder')
+
+    with pytest.raises(FileExistsError):
+        pb.create_file('TODO.md', template=True)
+    with pytest.raises(FileExistsError):
+        pb.create_file('TODO.md')
+    assert (pb.proj_dir / 'TODO.md').read_text() == 'not from the builder'
+
+
+# Test Milestone 24. Declarative layouts.
+def test_load_layout_cached():
+    plan = load_layout('ml')
+    assert plan is load_layout('ml')
+    assert plan.dirs == ('data', 'tests', 'notebooks')
+    assert plan.env == 'conda'
+
+
+def test_load_layout_missing():
+    with pytest.raises(FileNotFoundError):
+        load_layout('does-not-exist')
+
+
+def test_compile_layout_errors():
+    with pytest.raises(ValueError):
+        compile_layout({'env': 'docker'})
+    with pytest.raises(ValueError):
+        compile_layout({'files': [{'template': 'README.md.template'}]})
+
+
+@pytest.mark.parametrize('path', ['notes{draft}.md', '../escaped.md',
+                                  '/etc/escaped.md', 'a/../../b.md',
+                                  '{project_name', '{0}.md'])
+def test_compile_layout_bad_paths(path):
+    with pytest.raises(ValueError):
+        compile_layout({'files': [{'name': path}]})
+    with pytest.raises(ValueError):
+        compile_layout({'dirs': [path]})
+    assert compile_layout({'files': [{'name': '{lower_name}/{{x}}.md'}]})
+
+
+def test_build_custom_layout(tmp_path):
+    layout = tmp_path / 'docs.toml'
+    layout.write_text('[[files]]\n'
+                      'name = "docs/guide/{module_name}.md"\n'
+                      'template = "TODO.md.template"\n'
+                      'context = { project_name = "Guide" }\n')
+    plan = load_layout(layout)
+    assert plan.dirs == ('docs', 'docs/guide')
+
+    pb = build_layout(plan, path=tmp_path, proj_name='my-docs',
+                      author='RaDroid')
+    guide = pb.proj_dir / 'docs' / 'guide' / 'my_docs.md'
+    assert guide.read_text().startswith('# TODO for Guide')
+
+
+def test_build_yaml_layout(tmp_path):
+    pytest.importorskip('yaml')
+    layout = tmp_path / 'minimal.yml'
+    layout.write_text('env: none\nfiles:\n  - name: LICENSE\n')
+    pb = build_layout(layout, path=tmp_path, proj_name='minimal',
+                      author='RaDroid')
+    assert sorted(path.name for path in pb.proj_dir.iterdir()) == \
+        ['.auto_pb.json', 'LICENSE']
+
+
+# Test Milestone 25. Incremental project updates.
+@pytest.fixture()
+def updatable(tmp_path):
+    """Project built from a copy of the templates directory."""
+    copytree(str(TEMPLATE_DIR), str(tmp_path / 'templates'))
+    return build_layout('simple', root=tmp_path, proj_name='updatable',
+                        author='RaDroid', create_env=False, verbose=False,
+                        template_dir=tmp_path / 'templates')
+
+
+def test_update_unchanged(updatable):
+    status = update_project(updatable.proj_dir, verbose=False,
+                            template_dir=updatable.template_dir)
+    assert set(status.values()) == {'unchanged'}
+
+
+def test_update_template_changed(updatable):
+    todo = updatable.proj_dir / 'TODO.md'
+    (updatable.template_dir / 'TODO.md.template').write_text('New TODO')
+    (updatable.template_dir / 'LICENSE.template').write_text('New LICENSE')
+    (updatable.proj_dir / 'LICENSE').write_text('My own licence')
+
+    status = update_project(updatable.proj_dir, verbose=False,
+                            template_dir=updatable.template_dir)
+    assert status['TODO.md'] == 'updated'
+    assert status['LICENSE'] == 'modified'
+    assert status['README.md'] == 'unchanged'
+    assert todo.read_text() == 'New TODO'
+    assert (updatable.proj_dir / 'LICENSE').read_text() == 'My own licence'
+
+    status = update_project(updatable.proj_dir, verbose=False,
+                            template_dir=updatable.template_dir)
+    assert status['TODO.md'] == 'unchanged'
+
+
+def test_update_context_changed(updatable):
+    status = update_project(updatable.proj_dir, author='Raj D', verbose=False,
+                            template_dir=updatable.template_dir)
+    assert status['setup.py'] == 'updated'
+    assert "author='Raj D'" in (updatable.proj_dir / 'setup.py').read_text()
+
+
+def test_update_deleted(updatable):
+    (updatable.proj_dir / 'LICENSE').unlink()
+    status = update_project(updatable.proj_dir, verbose=False,
+                            template_dir=updatable.template_dir)
+    assert status['LICENSE'] == 'deleted'
+    assert not (updatable.proj_dir / 'LICENSE').exists()
+
+
+def test_update_custom_layout(tmp_path):
+    # A layout file named like a built-in layout is loaded from its path.
+    layout = tmp_path / 'mine' / 'simple.toml'
+    layout.parent.mkdir()
+    layout.write_text('[[files]]\nname = "NOTES.md"\n'
+                      'template = "TODO.md.template"\n')
+    pb = build_layout(layout, path=tmp_path, proj_name='custom',
+                      author='RaDroid', verbose=False)
+    assert update_project(pb.proj_dir, verbose=False) == \
+        {'NOTES.md': 'unchanged'}
+    assert sorted(path.name for path in pb.proj_dir.iterdir()) == \
+        ['.auto_pb.json', 'NOTES.md']
+
+    layout.unlink()
+    with pytest.raises(FileNotFoundError):
+        update_project(pb.proj_dir, verbose=False)
+
+    plan = compile_layout({'files': [{'name': 'NOTES.md',
+                                      'template': 'TODO.md.template'}]})
+    pb = build_layout(plan, path=tmp_path, proj_name='in-memory',
+                      author='RaDroid', verbose=False)
+    with pytest.raises(ValueError):
+        update_project(pb.proj_dir, verbose=False)
+
+
+def test_update_no_manifest(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        update_project(tmp_path)
+
+
+# Test Milestone 26. Build tracing.
+def read_trace(trace):
+    return [json.loads(line) for line in trace.read_text().splitlines()]
+
+
+def test_trace_jsonl(tmp_path):
+    trace = tmp_path / 'trace.jsonl'
+    tracer = Tracer(trace)
+    create_simple_project(path=tmp_path, proj_name='traced',
+                          author='RaDroid', create_env=False, verbose=False,
+                          tracer=tracer)
+    tracer.close()
+
+    events = read_trace(trace)
+    names = [event['name'] for event in events]
+    assert names[-1] == 'build'
+    assert {'create_proj_dir', 'create_file', 'load_template', 'render',
+            'publish'} <= set(names)
+
+    readme = next(event for event in events if event['name'] == 'create_file'
+                  and event['args']['path'].endswith('README.md'))
+    assert readme['args']['bytes'] > 0
+    assert readme['args']['syscalls']['write'] == 1
+    assert readme['args']['project'] == 'traced'
+    build = events[-1]['args']
+    assert build['bytes'] >= readme['args']['bytes']
+    assert build['syscalls']['mkdir'] == 1
+
+
+def test_trace_chrome(tmp_path):
+    trace = tmp_path / 'trace.json'
+    tracer = Tracer(trace, 'chrome')
+    create_simple_project(path=tmp_path, proj_name='chrome',
+                          author='RaDroid', create_env=False, verbose=False,
+                          tracer=tracer)
+    tracer.close()
+
+    events = json.loads(trace.read_text().rstrip(',\n') + ']')
+    assert all(event['ph'] == 'X' for event in events)
+
+
+def test_trace_disabled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tracer = Tracer(None)
+    tracer.start()
+    with tracer.span('nothing'):
+        tracer.count('write', written=10)
+    assert not tracer.enabled
+    tracer.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_trace_start(tmp_path):
+    trace = tmp_path / 'trace.json'
+    tracer = Tracer(trace, 'chrome')
+    tracer.start()
+    tracer.close()
+    assert trace.read_text() == '[\n'
+
+
+def test_trace_bulk(tmp_path):
+    trace = tmp_path / 'trace.jsonl'
+    rows = [{'name': f'bulk-{i}', 'path': str(tmp_path)} for i in range(3)]
+    results = list(build_from_manifest(rows, processes=2, trace=str(trace)))
+    assert all(result['ok'] for result in results)
+    builds = [event for event in read_trace(trace)
+              if event['name'] == 'build']
+    assert len(builds) == 3
+
+
+def test_trace_unknown_format():
+    with pytest.raises(ValueError):
+        Tracer('trace.txt', 'text')
+
+
+# Test Milestone 27. Benchmarks.
+def test_benchmark_run():
+    results = run(repeat=1, bulk=2, processes=1,
+                  only=['ml_project', 'template_cold', 'bulk_build'])
+    assert sorted(results['results']) == \
+        ['bulk_build', 'ml_project', 'template_cold']
+    assert results['results']['bulk_build']['projects_per_second'] > 0
+
+
+def test_benchmark_compare():
+    baseline = {'results': {'fast': {'median': 1.0},
+                            'slow': {'median': 1.0}}}
+    results = {'results': {'fast': {'median': 1.1},
+                           'slow': {'median': 2.0},
+                           'new': {'median': 5.0}}}
+    assert compare(results, baseline, tolerance=0.25) == [('slow', 1.0, 2.0)]
+
+
+# Test Milestone 28. Fast start-up.
+@pytest.mark.parametrize('template_name', ['.gitignore.template',
+                                           'LICENSE.template',
+                                           'environment.yml.template',
+                                           'main.py.template',
+                                           'setup.py.template'])
+def test_fast_template_matches_jinja(template_name):
+    template = get_template(TEMPLATE_DIR, template_name)
+    assert isinstance(template, FastTemplate)
+
+    jinja_template = get_template_env(TEMPLATE_DIR).get_template(template_name)
+    for context in [{'project_name': 'my-proj', 'author_name': 'RaDroid',
+                     'env_name': '/env'}, {'project_name': None}, {}]:
+        assert template.render(context) == jinja_template.render(context)
+
+
+def test_fast_template_needs_jinja():
+    assert FastTemplate.compile('{{ name.title() }}') is None
+    assert FastTemplate.compile('{% if name %}{{ name }}{% endif %}') is None
+    assert FastTemplate.compile('{{- name }}') is None
+    assert FastTemplate.compile('{{ none }}') is None
+    assert FastTemplate.compile('{# note #}{{ name }}\r\n').render(
+        name='x') == 'x'
+
+
+def test_lazy_imports(tmp_path):
+    layout = tmp_path / 'plain.toml'
+    layout.write_text('[[files]]\nname = "LICENSE"\n'
+                      '[[files]]\nname = "{module_name}.py"\n'
+                      'template = "main.py.template"\n')
+    code = ('import sys, auto_pb\n'
+            f'auto_pb.build_layout({str(layout)!r}, path={str(tmp_path)!r}, '
+            'proj_name="plain", verbose=False)\n'
+            'print([name for name in ("jinja2", "yaml", "argparse", '
+            '"concurrent.futures", "socketserver") if name in sys.modules])')
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=str(TEMPLATE_DIR.parent))
+    assert output.decode().strip() == '[]'
+    assert (tmp_path / 'plain' / 'plain.py').exists()
+
+
+def test_import_is_light():
+    code = ('import sys, auto_pb\n'
+            'print([name for name in ("json", "subprocess", "shutil", '
+            '"tempfile", "hashlib", "threading") if name in sys.modules])')
+    output = subprocess.check_output([sys.executable, '-S', '-c', code],
+                                     cwd=str(TEMPLATE_DIR.parent))
+    assert output.decode().strip() == '[]'
+
+
+# Test Milestone 29. Streaming rendering.
+def test_stream_identical(sim_proj):
+    names = sim_proj.layout_names()
+    for step in load_layout('simple').files:
+        path = sim_proj.proj_dir / step.path.format(**names)
+        template = get_template(TEMPLATE_DIR, step.template or
+                                path.name + '.template')
+        temp_dict = sim_proj._template_dict()
+        temp_dict.update(step.context)
+        assert path.read_bytes() == template.render(temp_dict).encode()
+
+
+@pytest.fixture()
+def big_template(tmp_path):
+    template_dir = tmp_path / 'templates'
+    template_dir.mkdir()
+    (template_dir / 'big.txt.template').write_text(
+        '{% for i in range(lines) %}line {{ i }} of {{ project_name }}\n'
+        '{% endfor %}{{ fail() if fail is defined }}')
+    pb = ProjectBuilder(root=tmp_path, proj_name='big', author='RaDroid',
+                        verbose=False, template_dir=template_dir)
+    pb.create_proj_dir()
+    return pb
+
+
+def test_stream_memory_bounded(big_template):
+    tracemalloc = pytest.importorskip('tracemalloc')
+    temp_dict = {'project_name': 'big', 'lines': 50000}
+    tracemalloc.start()
+    try:
+        path = big_template.create_file('big.txt', template=True,
+                                        temp_dict=temp_dict)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    size = path.stat().st_size
+    assert size > 10 * STREAM_BUFFER_SIZE
+    assert peak < size / 2
+    assert path.read_text().splitlines()[-1] == 'line 49999 of big'
+
+
+def test_stream_error_removes_file(big_template):
+    temp_dict = {'project_name': 'big', 'lines': 10, 'fail': lambda: 1 / 0}
+    with pytest.raises(ZeroDivisionError):
+        big_template.create_file('big.txt', template=True,
+                                 temp_dict=temp_dict)
+    assert list(big_template.proj_dir.iterdir()) == []
+
+
+def test_stream_error_keeps_old_file(updatable):
+    todo = updatable.proj_dir / 'TODO.md'
+    before = todo.read_text()
+    (updatable.template_dir / 'TODO.md.template').write_text(
+        'New TODO {{ author_name.missing() }}')
+    from jinja2.exceptions import UndefinedError
+    with pytest.raises(UndefinedError):
+        update_project(updatable.proj_dir, verbose=False,
+                       template_dir=updatable.template_dir)
+    assert todo.read_text() == before
+    assert not list(updatable.proj_dir.glob('.TODO.md.*'))
+
+
+# Test Milestone 30. Static assets.
+@pytest.fixture()
+def asset_layout(tmp_path):
+    assets = tmp_path / 'assets'
+    assets.mkdir()
+    (assets / 'weights.bin').write_bytes(os.urandom(3 * 1024 * 1024 + 7))
+    layout = tmp_path / 'assets.toml'
+    layout.write_text('[[files]]\nname = "README.md"\n'
+                      '[[files]]\nname = "data/weights.bin"\n'
+                      'source = "assets/weights.bin"\n')
+    return layout
+
+
+def test_static_asset_copied(tmp_path, asset_layout):
+    tracer = Tracer(tmp_path / 'trace.jsonl')
+    pb = build_layout(asset_layout, path=tmp_path, proj_name='assets',
+                      author='RaDroid', verbose=False, tracer=tracer)
+    tracer.close()
+
+    source = tmp_path / 'assets' / 'weights.bin'
+    copy = pb.proj_dir / 'data' / 'weights.bin'
+    assert copy.read_bytes() == source.read_bytes()
+    event = next(event for event in read_trace(tmp_path / 'trace.jsonl')
+                 if event['name'] == 'copy_file')
+    assert event['args']['bytes'] == source.stat().st_size
+    assert set(event['args']['syscalls']) & \
+        {'reflink', 'copy_file_range', 'sendfile', 'read'}
+
+
+def test_static_asset_exists(tmp_path, asset_layout):
+    pb = build_layout(asset_layout, path=tmp_path, proj_name='assets',
+                      author='RaDroid', verbose=False)
+    copy = pb.proj_dir / 'data' / 'weights.bin'
+    with pytest.raises(FileExistsError):
+        pb.copy_file('weights.bin', tmp_path / 'assets' / 'weights.bin',
+                     path=copy.parent)
+
+    copy.unlink()
+    status = update_project(pb.proj_dir, layout=asset_layout, verbose=False)
+    assert status['data/weights.bin'] == 'created'
+    assert copy.stat().st_size == 3 * 1024 * 1024 + 7
+
+
+def test_static_asset_layout_errors():
+    with pytest.raises(ValueError):
+        compile_layout({'files': [{'name': 'a.bin', 'source': 'a.bin',
+                                   'template': 'LICENSE.template'}]})
+
+
+def test_static_asset_fallbacks(tmp_path, monkeypatch):
+    import auto_pb
+    source = tmp_path / 'source.bin'
+    source.write_bytes(b'asset' * 10000)
+
+    def unsupported(*args):
+        raise OSError(auto_pb.errno.ENOSYS, 'not supported')
+
+    monkeypatch.setattr(auto_pb, '_reflink', lambda src_fd, dst_fd: False)
+    monkeypatch.setattr(os, 'copy_file_range', unsupported, raising=False)
+    if sys.platform.startswith('linux'):
+        assert auto_pb._copy_asset(source, tmp_path / 'sendfile') == \
+            ('sendfile', 50000)
+    monkeypatch.setattr(os, 'sendfile', unsupported, raising=False)
+    assert auto_pb._copy_asset(source, tmp_path / 'read') == ('read', 50000)
+    assert (tmp_path / 'read').read_bytes() == source.read_bytes()
+
+
+def test_static_asset_short_kernel_copy(tmp_path, monkeypatch):
+    import auto_pb
+    source = tmp_path / 'source.bin'
+    source.write_bytes(b'asset' * 10000)
+
+    def stops_early(src_fd, dst_fd, count):
+        # Copies one block, then returns 0 like some FUSE filesystems.
+        if os.lseek(src_fd, 0, os.SEEK_CUR):
+            return 0
+        data = os.read(src_fd, 4096)
+        return os.write(dst_fd, data)
+
+    monkeypatch.setattr(auto_pb, '_reflink', lambda src_fd, dst_fd: False)
+    monkeypatch.setattr(os, 'copy_file_range', stops_early, raising=False)
+    monkeypatch.setattr(os, 'sendfile', lambda *args: 0, raising=False)
+    assert auto_pb._copy_asset(source, tmp_path / 'copy') == ('read', 50000)
+    assert (tmp_path / 'copy').read_bytes() == source.read_bytes()
+
+    # A source shorter than expected is an error, not a truncated copy.
+    with open(str(source), 'rb', buffering=0) as fsrc, \
+            open(str(tmp_path / 'short'), 'xb', buffering=0) as fdst:
+        with pytest.raises(OSError):
+            auto_pb._copy_data(fsrc, fdst, 60000)
+
+
+# Test Milestone 31. Deduplicated generated files.
+def test_blob_store_shares_files(tmp_path):
+    store = BlobStore(tmp_path / 'blobs', hardlink=True)
+    tracer = Tracer(tmp_path / 'trace.jsonl')
+    first = build_layout('simple', path=tmp_path, proj_name='first',
+                         author='RaDroid', create_env=False, verbose=False,
+                         blob_store=store)
+    second = build_layout('simple', path=tmp_path, proj_name='second',
+                          author='RaDroid', create_env=False, verbose=False,
+                          tracer=tracer, blob_store=store)
+    tracer.close()
+    plain = build_layout('simple', path=tmp_path, proj_name='plain',
+                         author='RaDroid', create_env=False, verbose=False)
+
+    license_first = first.proj_dir / 'LICENSE'
+    license_second = second.proj_dir / 'LICENSE'
+    assert license_first.stat().st_ino == license_second.stat().st_ino
+    assert license_first.read_text() == \
+        (plain.proj_dir / 'LICENSE').read_text()
+    assert license_first.stat().st_mode == \
+        (plain.proj_dir / 'LICENSE').stat().st_mode
+    event = next(event for event in read_trace(tmp_path / 'trace.jsonl')
+                 if event['name'] == 'render' and
+                 event['args']['path'] == str(license_second))
+    assert event['args']['bytes'] == 0
+    assert event['args']['syscalls']['hardlink'] == 1
+
+
+def test_blob_store_gc(tmp_path, monkeypatch):
+    store = BlobStore(tmp_path / 'blobs')
+    # Store copies of the blobs, also where they cannot be reflinked.
+    monkeypatch.setattr(store, 'reflinks', lambda: True)
+    pb = build_layout('simple', path=tmp_path, proj_name='gone',
+                      author='RaDroid', create_env=False, verbose=False,
+                      blob_store=store)
+    assert store.gc() == []
+    count = len(list(store._blobs()))
+    assert count > 0
+
+    rmtree(str(pb.proj_dir))
+    assert len(store.gc()) == count
+    assert list(store._blobs()) == []
+
+
+def test_blob_store_without_reflink(tmp_path, monkeypatch):
+    store = BlobStore(tmp_path / 'blobs')
+    monkeypatch.setattr('auto_pb._reflink', lambda src_fd, dst_fd: False)
+    pb = build_layout('simple', path=tmp_path, proj_name='direct',
+                      author='RaDroid', create_env=False, verbose=False,
+                      blob_store=store)
+    plain = build_layout('simple', path=tmp_path, proj_name='plain',
+                         author='RaDroid', create_env=False, verbose=False)
+    assert (pb.proj_dir / 'LICENSE').read_text() == \
+        (plain.proj_dir / 'LICENSE').read_text()
+    assert store._reflinks is False
+    assert list(store._blobs()) == []
+    assert not (store.store_dir / 'refs').exists()
+    assert os.listdir(str(store.store_dir / 'tmp')) == []
+
+
+def test_blob_store_verify(tmp_path):
+    store = BlobStore(tmp_path / 'blobs', hardlink=True)
+    pb = build_layout('simple', path=tmp_path, proj_name='edited',
+                      author='RaDroid', create_env=False, verbose=False,
+                      blob_store=store)
+    with (pb.proj_dir / 'LICENSE').open('a') as f:
+        f.write('edited in place\n')
+    assert len(store.verify()) == 1
+    assert store.verify() == []
+
+
+# Test Milestone 32. Archive output.
+class Unseekable:
+    """Write-only stream, like a pipe to stdout."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def test_archive_matches_build(tmp_path):
+    import tarfile
+    archive = tmp_path / 'proj.tar.gz'
+    archive_layout('simple', archive, 'archived', author='RaDroid',
+                   verbose=False)
+    (tmp_path / 'disk').mkdir()
+    built = build_layout('simple', path=tmp_path / 'disk',
+                         proj_name='archived', author='RaDroid',
+                         create_env=False, verbose=False)
+
+    with tarfile.open(archive) as tar:
+        assert 'archived/.auto_pb.json' in tar.getnames()
+        for path in built.proj_dir.iterdir():
+            if path.name == '.auto_pb.json':
+                continue
+            member = tar.extractfile(f'archived/{path.name}').read()
+            assert member == path.read_bytes()
+    assert not (tmp_path / 'archived').exists()
+
+
+def test_archive_zip_stream(tmp_path, asset_layout):
+    import io
+    import zipfile
+    out = Unseekable()
+    archive_layout(asset_layout, out, 'zipped', author='RaDroid', fmt='zip',
+                   verbose=False)
+    with zipfile.ZipFile(io.BytesIO(out.getvalue())) as zf:
+        assert zf.read('zipped/data/weights.bin') == \
+            (tmp_path / 'assets' / 'weights.bin').read_bytes()
+        zf.extractall(tmp_path / 'out')
+
+    status = update_project(tmp_path / 'out' / 'zipped', layout=asset_layout,
+                            verbose=False)
+    assert set(status.values()) == {'unchanged', 'untracked'}
+
+
+def test_archive_env_after_extract(tmp_path):
+    import tarfile
+    archive = tmp_path / 'proj.tar'
+    archive_layout('ml', archive, 'with-env', author='RaDroid',
+                   verbose=False)
+    with tarfile.open(archive) as tar:
+        tar.extractall(tmp_path / 'out')
+    proj_dir = tmp_path / 'out' / 'with-env'
+    assert json.loads((proj_dir / '.auto_pb.json').read_text())['env'] == \
+        'conda'
+
+    env_path = create_project_env(proj_dir, verbose=False, root=tmp_path,
+                                  env_job_factory=FakeEnvJob)
+    assert env_path == proj_dir / 'env' and env_path.is_dir()
+    assert 'env' not in json.loads((proj_dir / '.auto_pb.json').read_text())
+    assert create_project_env(proj_dir, verbose=False) is None
+
+
+def test_archive_errors(tmp_path):
+    archive = tmp_path / 'proj.tar.gz'
+    archive.touch()
+    with pytest.raises(FileExistsError):
+        archive_layout('simple', archive, 'exists', verbose=False)
+    with pytest.raises(ValueError):
+        archive_layout('simple', tmp_path / 'proj.rar', 'bad', fmt='rar',
+                       verbose=False)
+    assert not (tmp_path / 'proj.rar').exists()
+
+
+# Test Milestone 33. Concurrent builds.
+def run_async(coroutine):
+    import asyncio
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def tree(proj_dir):
+    here = str(proj_dir).encode()
+    return {path.relative_to(proj_dir).as_posix():
+            None if path.is_dir() else
+            path.read_bytes().replace(here, b'<proj>')
+            for path in proj_dir.rglob('*')}
+
+
+def test_async_build_matches_build(tmp_path):
+    (tmp_path / 'sync').mkdir()
+    (tmp_path / 'async').mkdir()
+    built = build_layout('ml', path=tmp_path / 'sync', proj_name='same',
+                         author='RaDroid', verbose=False,
+                         env_job_factory=FakeEnvJob, root=tmp_path)
+    pb = run_async(build_layout_async('ml', path=tmp_path / 'async',
+                                      proj_name='same', author='RaDroid',
+                                      verbose=False, max_workers=4,
+                                      env_job_factory=FakeEnvJob,
+                                      root=tmp_path))
+    assert isinstance(pb, AsyncProjectBuilder)
+    assert (pb.proj_dir / 'env').is_dir()
+    assert tree(pb.proj_dir) == tree(built.proj_dir)
+
+
+def test_async_many_projects_shared_pool(tmp_path):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    layout = tmp_path / 'deep.toml'
+    layout.write_text('dirs = ["a/b/c/d"]\n'
+                      '[[files]]\nname = "a/b/c/d/README.md"\n'
+                      '[[files]]\nname = "a/LICENSE"\n')
+
+    async def build_all(executor):
+        return await asyncio.gather(*[
+            build_layout_async(layout, path=tmp_path, proj_name=f'p{index}',
+                               author='RaDroid', create_env=False,
+                               verbose=False, executor=executor)
+            for index in range(20)])
+
+    with ThreadPoolExecutor(3) as executor:
+        builders = run_async(build_all(executor))
+    for pb in builders:
+        assert (pb.proj_dir / 'a/b/c/d/README.md').is_file()
+        assert (pb.proj_dir / 'a/LICENSE').is_file()
+
+
+def test_async_gather_conda_builds(tmp_path):
+    import asyncio
+
+    async def build_all():
+        return await asyncio.gather(*[
+            build_layout_async('ml', path=tmp_path, proj_name=f'ml{index}',
+                               author='RaDroid', verbose=False,
+                               root=tmp_path, env_job_factory=FakeEnvJob)
+            for index in range(4)])
+
+    builders = run_async(build_all())
+    assert len(os.listdir(str(tmp_path))) == 4
+    for pb in builders:
+        assert (pb.proj_dir / 'env').is_dir()
+        assert str(pb.proj_dir / 'env') in \
+            (pb.proj_dir / 'environment.yml').read_text()
+
+
+def test_async_build_failure_discards(tmp_path):
+    layout = tmp_path / 'broken.toml'
+    layout.write_text('[[files]]\nname = "sub/README.md"\n'
+                      '[[files]]\nname = "sub/missing.txt"\n')
+    pb = AsyncProjectBuilder(path=tmp_path, proj_name='broken',
+                             author='RaDroid', verbose=False, staged=True)
+    with pytest.raises(FileNotFoundError):
+        run_async(pb.build(layout, create_env=False))
+    assert os.listdir(str(tmp_path)) == ['broken.toml']
+
+
+# Test Milestone 34. Git repository initialisation.
+needs_git = pytest.mark.skipif(which('git') is None,
+                               reason='git is not installed')
+
+
+def git(proj_dir, *args):
+    return subprocess.run(['git', *args], cwd=str(proj_dir), check=True,
+                          stdout=subprocess.PIPE,
+                          universal_newlines=True).stdout
+
+
+@needs_git
+def test_init_git_commit(tmp_path):
+    pb = build_layout('simple', path=tmp_path, proj_name='repo',
+                      author='RaDroid', create_env=False, verbose=False,
+                      staged=True, init_git=True)
+    assert git(pb.proj_dir, 'log', '--format=%an|%s') == \
+        'RaDroid|Initial commit of repo\n'
+    assert git(pb.proj_dir, 'rev-parse', '--abbrev-ref', 'HEAD') == 'main\n'
+    assert git(pb.proj_dir, 'status', '--porcelain') == ''
+    files = set(git(pb.proj_dir, 'ls-files').split())
+    assert files == {path.name for path in pb.proj_dir.iterdir()
+                     if path.name != '.git'}
+    assert git(pb.proj_dir, 'show', 'HEAD:LICENSE') == \
+        (pb.proj_dir / 'LICENSE').read_text()
+
+
+@needs_git
+def test_init_git_exists(tmp_path):
+    pb = run_async(build_layout_async('simple', path=tmp_path,
+                                      proj_name='twice', author='RaDroid',
+                                      create_env=False, verbose=False,
+                                      init_git=True))
+    assert git(pb.proj_dir, 'status', '--porcelain') == ''
+    with pytest.raises(FileExistsError):
+        pb.init_git()
+
+
+@needs_git
+def test_init_git_escaping(tmp_path):
+    layout = compile_layout({'files': [
+        {'name': '"quoted".md', 'template': 'README.md.template'},
+        {'name': 'tab\there\\.md', 'template': 'README.md.template'}]})
+    pb = build_layout(layout, path=tmp_path, proj_name='odd',
+                      author='Ann <ann@x.org>\n', create_env=False,
+                      verbose=False, init_git=True)
+    assert git(pb.proj_dir, 'log', '--format=%an|%ae') == 'Ann ann@x.org|\n'
+    files = git(pb.proj_dir, 'ls-files', '-z').split('\0')
+    assert {'"quoted".md', 'tab\there\\.md'} <= set(files)
+    assert git(pb.proj_dir, 'status', '--porcelain') == ''
+
+
+@needs_git
+def test_init_git_failure(tmp_path, monkeypatch):
+    pb = build_layout('simple', path=tmp_path, proj_name='broken',
+                      author='RaDroid', create_env=False, verbose=False)
+    monkeypatch.setattr('auto_pb.ProjectBuilder._import_git',
+                        lambda *args: git(pb.proj_dir, 'read-tree', 'nope'))
+    with pytest.raises(subprocess.CalledProcessError):
+        pb.init_git()
+    assert not (pb.proj_dir / '.git').exists()
+
+
+# Test Milestone 35. Offline wheelhouse.
+def make_wheel(directory, name='autopb_demo', version='1.0'):
+    import base64
+    import hashlib
+    import zipfile
+    dist = f'{name}-{version}.dist-info'
+    files = {f'{name}.py': 'VALUE = 42\n',
+             f'{dist}/METADATA': 'Metadata-Version: 2.1\n'
+                                 f'Name: {name}\nVersion: {version}\n',
+             f'{dist}/WHEEL': 'Wheel-Version: 1.0\nGenerator: test\n'
+                              'Root-Is-Purelib: true\nTag: py3-none-any\n'}
+    record = []
+    for path, text in files.items():
+        digest = base64.urlsafe_b64encode(
+            hashlib.sha256(text.encode()).digest()).rstrip(b'=').decode()
+        record.append(f'{path},sha256={digest},{len(text)}')
+    files[f'{dist}/RECORD'] = '\n'.join(record + [f'{dist}/RECORD,,']) + '\n'
+    with zipfile.ZipFile(directory / f'{name}-{version}-py3-none-any.whl',
+                         'w') as zf:
+        for path, text in files.items():
+            zf.writestr(path, text)
+
+
+def test_layout_requirements(tmp_path):
+    plan = compile_layout({'env': 'venv', 'requirements': ['b', 'a==1']})
+    assert plan.requirements == ('b', 'a==1')
+    assert compile_layout({}).requirements == ()
+    with pytest.raises(ValueError):
+        compile_layout({'requirements': [1]})
+
+    assert Wheelhouse.key(['b', 'a==1']) == Wheelhouse.key(['a==1', 'b'])
+    assert Wheelhouse.key(['a']) != Wheelhouse.key(['a==1'])
+    assert Wheelhouse.key(['a'], sys.executable) == Wheelhouse.key(['a'])
+
+    wheelhouse = Wheelhouse(tmp_path / 'wheels')
+    pb = build_layout(plan, path=tmp_path, proj_name='reqs', verbose=False,
+                      pipeline=True, env_job_factory=FakeEnvJob,
+                      wheelhouse=wheelhouse)
+    command = pb.env_job.command
+    assert command[2:4] == ['install-wheels', str(pb.proj_dir / 'venv')]
+    assert command[command.index('--cache-dir') + 1] == \
+        str(tmp_path / 'wheels')
+    assert json.loads(command[-1])[1:] == \
+        ['-m', 'venv', str(pb.proj_dir / 'venv')]
+
+
+def test_wheelhouse_offline_install(tmp_path, monkeypatch):
+    links = tmp_path / 'links'
+    links.mkdir()
+    make_wheel(links)
+    monkeypatch.setenv('PIP_NO_INDEX', '1')
+    wheelhouse = Wheelhouse(tmp_path / 'wheels', find_links=[links])
+
+    layout = tmp_path / 'reqs.toml'
+    layout.write_text('env = "venv"\nrequirements = ["autopb_demo"]\n'
+                      '[[files]]\nname = "README.md"\n')
+    pb = build_layout(layout, path=tmp_path, proj_name='reqs',
+                      verbose=False, pipeline=True, wheelhouse=wheelhouse)
+    venv = pb.env_job.result()
+    python = str(venv / 'bin' / 'python')
+    assert subprocess.run([python, '-c', 'import autopb_demo'],
+                          check=True).returncode == 0
+
+    # The wheels are keyed on the interpreter of the environment, and a
+    # second install only reads the cache.
+    rmtree(str(links))
+    assert Wheelhouse.key(['autopb_demo'], python) == \
+        Wheelhouse.key(['autopb_demo'])
+    entry = wheelhouse.populate(['autopb_demo'], python)
+    assert [path.name for path in entry.iterdir()] == \
+        ['autopb_demo-1.0-py3-none-any.whl']
+
+
+# Test Milestone 36. Structured notebooks.
+def test_ml_notebook_matches_template(tmp_path):
+    pb = build_layout('ml', path=tmp_path, proj_name='nb-proj',
+                      author='RaDroid', create_env=False, verbose=False)
+    notebook = json.loads((pb.proj_dir / 'notebooks' /
+                           'nb-proj.ipynb').read_text())
+    expected = json.loads(get_template(TEMPLATE_DIR, 'jupyter.ipynb.template')
+                          .render(project_name='nb-proj',
+                                  author_name='RaDroid'))
+    for cell in notebook['cells'] + expected['cells']:
+        cell['source'] = ''.join(cell['source'])
+    assert notebook == expected
+    assert isinstance(get_template(TEMPLATE_DIR, 'skeleton.ipynb'),
+                      NotebookTemplate)
+
+
+def test_notebook_fan_out(tmp_path):
+    datasets = [f'set{index}' for index in range(30)]
+    plan = compile_layout({'files': [{
+        'name': 'notebooks/{item}.ipynb', 'each': datasets,
+        'cells': [{'markdown': '# {{ item }} by {{ author_name }}'},
+                  {'code': "df = load('{{ item }}')\nprint({'a': 1})"}]}]})
+    author = 'Ra "Droid" \\ O\'Brien\n'
+    pb = build_layout(plan, path=tmp_path, proj_name='fan', author=author,
+                      create_env=False, verbose=False)
+
+    notebooks = sorted((pb.proj_dir / 'notebooks').iterdir())
+    assert [path.stem for path in notebooks] == sorted(datasets)
+    notebook = json.loads((pb.proj_dir / 'notebooks' /
+                           'set7.ipynb').read_text())
+    assert notebook['nbformat'] == 4
+    assert [cell['source'] for cell in notebook['cells']] == \
+        [['# set7 by Ra "Droid" \\ O\'Brien\n'],
+         ["df = load('set7')\n", "print({'a': 1})"]]
+    assert notebook['cells'][1]['outputs'] == []
+
+    status = update_project(pb.proj_dir, layout=plan, verbose=False)
+    assert set(status.values()) == {'unchanged'}
+
+
+def test_notebook_layout_errors():
+    for spec in ({'name': 'a.ipynb', 'cells': [{'python': 'x'}]},
+                 {'name': 'a.ipynb', 'cells': [{'code': 'x', 'raw': 'y'}]},
+                 {'name': 'a.ipynb', 'cells': ['x']},
+                 {'name': 'a.ipynb', 'each': ['x']},
+                 {'name': 'a.ipynb', 'cells': [], 'source': 'a.ipynb'}):
+        with pytest.raises(ValueError):
+            compile_layout({'files': [spec]})
+
+
+# Test Milestone 37. Batch name validation.
+def test_project_name_problem():
+    cases = {'good-name_1': None, 'x': None, '': 'empty', '1st': 'digit_start',
+             'one space': 'space', 'next&warning': 'special_chars',
+             '-test_1': 'bad_start', 'endswith-': 'bad_end', 42: 'type'}
+    for name, code in cases.items():
+        assert project_name_problem(name) == code
+        assert code is None or code in NAME_PROBLEMS
+    with pytest.raises(TypeError):
+        ProjectBuilder.valid_project_name(42)
+    assert not ProjectBuilder.valid_project_name('', verbose=False)
+
+
+def test_name_problem_text_special_chars():
+    text = name_problem_text('next&warn!ng&', 'special_chars')
+    assert text.startswith(NAME_PROBLEMS['special_chars'])
+    assert text.endswith("Not allowed: '!', '&'")
+    assert name_problem_text('1st', 'digit_start') == \
+        NAME_PROBLEMS['digit_start']
+
+    set_keyboard_input(['a$b', 'ab', 'RaDroid'])
+    ProjectBuilder(path=Path.cwd())
+    assert "\n> PROBLEM: {}".format(
+        name_problem_text('a$b', 'special_chars')) in get_display_output()
+
+
+def test_validate_project_names(tmp_path):
+    (tmp_path / 'taken').mkdir()
+    names = ['fine', 'taken', 'fine', 'bad name', None, 'other']
+    assert list(validate_project_names(names)) == \
+        [(3, 'bad name', 'space'), (4, None, 'type')]
+    problems = validate_project_names(names, unique=True, path=tmp_path)
+    assert [(problem.index, problem.code) for problem in problems] == \
+        [(1, 'exists'), (2, 'duplicate'), (3, 'space'), (4, 'type')]
+
+
+def test_validate_manifest_command(tmp_path, capsys):
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text('name,author\nalpha,A\nalpha,B\n_beta,C\n')
+    assert main(['validate', str(manifest)]) == 1
+    assert main(['validate', str(manifest), '--unique']) == 1
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)['code'] for line in lines] == \
+        ['bad_start', 'duplicate', 'bad_start']
+    assert json.loads(lines[0])['message'] == NAME_PROBLEMS['bad_start']
+
+
+# Test Milestone 38. Workspaces.
+def test_workspace_create(tmp_path):
+    packages = [(f'svc-{index}', 'simple') for index in range(5)]
+    workspace = Workspace.create(tmp_path, 'mono', author='RaDroid',
+                                 packages=packages + [('model', 'ml')],
+                                 verbose=False, root=tmp_path,
+                                 env_job_factory=FakeEnvJob)
+    root = tmp_path / 'mono'
+    assert workspace.root == root and workspace.env_dir == root / 'venv'
+    assert sorted(path.name for path in (root / 'packages').iterdir()) == \
+        ['model', 'svc-0', 'svc-1', 'svc-2', 'svc-3', 'svc-4']
+    assert (root / '.gitignore').is_file() and (root / 'LICENSE').is_file()
+    for package in (root / 'packages').iterdir():
+        names = {path.name for path in package.iterdir()}
+        assert not names & {'.gitignore', 'LICENSE', 'venv', 'env'}
+    assert (root / 'packages' / 'model' / 'notebooks').is_dir()
+    assert Workspace(root).packages['model'] == 'ml'
+
+
+def test_workspace_add_incremental(tmp_path, monkeypatch):
+    installs = []
+    monkeypatch.setattr(Wheelhouse, 'install', lambda self, env_dir,
+                        requirements: installs.append(list(requirements)))
+    workspace = Workspace.create(tmp_path, 'mono', author='RaDroid',
+                                 verbose=False, env_job_factory=FakeEnvJob)
+    site_packages = workspace.env_dir / 'lib' / 'python3' / 'site-packages'
+    site_packages.mkdir(parents=True)
+
+    plan = compile_layout({'requirements': ['numpy', 'pandas'],
+                           'files': [{'name': 'README.md'}]})
+    workspace.add('first', plan, verbose=False)
+    workspace.add('second', plan._replace(requirements=('numpy', 'scipy')),
+                  verbose=False)
+    assert installs == [['numpy', 'pandas'], ['scipy']]
+    assert Workspace(workspace.root).requirements == \
+        ['numpy', 'pandas', 'scipy']
+    assert (site_packages / 'auto_pb_workspace.pth').read_text() == \
+        f'{workspace.root}/packages/first\n{workspace.root}/packages/second\n'
+
+    with pytest.raises(FileExistsError):
+        workspace.add('first', verbose=False)
+    with pytest.raises(ValueError):
+        workspace.add('bad name', verbose=False)
+    with pytest.raises(FileNotFoundError):
+        Workspace(tmp_path)
+
+
+def test_workspace_add_failure(tmp_path, monkeypatch):
+    installs = []
+    monkeypatch.setattr(Wheelhouse, 'install', lambda self, env_dir,
+                        requirements: installs.append(list(requirements)))
+    workspace = Workspace.create(tmp_path, 'mono', author='RaDroid',
+                                 verbose=False, env_job_factory=FakeEnvJob)
+    site_packages = workspace.env_dir / 'lib' / 'python3' / 'site-packages'
+    site_packages.mkdir(parents=True)
+
+    plan = compile_layout({'requirements': ['numpy'],
+                           'files': [{'name': 'README.md'}]})
+    bad = compile_layout({'files': [{'name': 'README.md',
+                                     'template': 'missing.template'}]})
+    with pytest.raises(FileNotFoundError):
+        workspace.add_packages([('one', plan), ('two', bad)], verbose=False)
+
+    # The package built before the failure is recorded and linked.
+    assert Workspace(workspace.root).packages == {'one': plan.name}
+    assert installs == [['numpy']]
+    assert (site_packages / 'auto_pb_workspace.pth').read_text() == \
+        f'{workspace.root}/packages/one\n'
+    assert not (workspace.root / 'packages' / 'two').exists()
+    with pytest.raises(FileExistsError):
+        workspace.add('one', verbose=False)
+
+
+# Test Milestone 39. Precompiled templates.
+def precompiled(template):
+    module = template.root_render_func.__module__ or ''
+    return module.startswith('_jinja2_module_templates')
+
+
+def test_precompile_templates(tmp_path, monkeypatch):
+    monkeypatch.setattr('auto_pb.CACHE_DIR', tmp_path / 'cache')
+    template_dir = tmp_path / 'templates'
+    copytree(TEMPLATE_DIR, template_dir)
+    context = {'project_name': 'my-project', 'author_name': 'RaDroid'}
+    configure_template_cache()
+    source = get_template_env(template_dir).get_template('README.md.template')
+    assert not precompiled(source)
+
+    assert main(['precompile', '--template-dir', str(template_dir)]) == 0
+    target, = (tmp_path / 'cache' / 'templates').iterdir()
+    assert not list(target.glob('*ipynb*'))
+    env = get_template_env(template_dir)
+    template = env.get_template('README.md.template')
+    assert precompiled(template)
+    assert template.filename == str(template_dir / 'README.md.template')
+    assert template.render(context) == source.render(context)
+    assert template.is_up_to_date
+
+
+def test_precompiled_template_stale(tmp_path, monkeypatch):
+    monkeypatch.setattr('auto_pb.CACHE_DIR', tmp_path / 'cache')
+    template_dir = tmp_path / 'templates'
+    template_dir.mkdir()
+    path = template_dir / 'README.md.template'
+    path.write_text('{% if author %}Old {{ author }}{% endif %}')
+    configure_template_cache()
+    precompile_templates(template_dir)
+    env = get_template_env(template_dir)
+    assert precompiled(env.get_template('README.md.template'))
+
+    path.write_text('{% if author %}New {{ author }}{% endif %}')
+    stamp = os.stat(path).st_mtime_ns + 10 ** 9
+    os.utime(path, ns=(stamp, stamp))
+    template = env.get_template('README.md.template')
+    assert not precompiled(template)
+    assert template.render(author='RaDroid') == 'New RaDroid'